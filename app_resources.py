@@ -1,27 +1,113 @@
 import os
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
 import pinecone
 import streamlit as st
+from openai import DefaultHttpxClient, OpenAI
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from feedback_writer import BufferedWriter
+from job_queue import JOBS_COLLECTION, JobQueue
+from openai_governor import GovernedOpenAI
+from resilient_index import ResilientIndex
+from semantic_cache import SemanticCache
+from session_store import SPILL_BACKEND, DiskSpill, GridFSSpill, SessionStore
+from shared_weights import load_model
+from single_flight import CoalescingIndex, CoalescingModel
+from tracing import traced_model, traced_mongo, traced_openai, traced_pinecone, start_metrics_exporter
 
 load_dotenv()
 
 @st.cache_resource
 def load_embedding_model():
-    return SentenceTransformer("intfloat/multilingual-e5-large")
+    # Per process; with EMBEDDING_SHARED_WEIGHTS=1 the weights themselves are shared by every process on the host
+    return load_model(os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"))
 
 @st.cache_resource
 def init_pinecone_client():
+    # Local stand-in for benchmarks and load tests
+    if os.getenv("PINECONE_BACKEND") == "memory":
+        from local_backends import InMemoryPinecone
+        return InMemoryPinecone(latency=float(os.getenv("PINECONE_LOCAL_LATENCY", "0")),
+                                failure_rate=float(os.getenv("PINECONE_LOCAL_FAILURE_RATE", "0")))
     pinecone_api_key = os.getenv("PINECONE_API_KEY")
     return pinecone.Pinecone(api_key=pinecone_api_key)
 
 @st.cache_resource
 def get_mongo_client():
     mongo_uri = os.getenv("MONGO_URI")
+    if mongo_uri and mongo_uri.startswith("mongomock://"):
+        import mongomock
+        return mongomock.MongoClient()
     return MongoClient(mongo_uri)
 
-# EXPORT CACHED INSTANCES
-model = load_embedding_model()
-pinecone_client = init_pinecone_client()
-mongo_client = get_mongo_client()
+@st.cache_resource
+def get_openai_client():
+    # One keep-alive connection pool and one set of rate limiters per process
+    http_client = DefaultHttpxClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "64")),
+            max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "32")),
+            keepalive_expiry=60,
+        ),
+        timeout=httpx.Timeout(float(os.getenv("OPENAI_TIMEOUT", "120")), connect=5.0),
+    )
+    return GovernedOpenAI(traced_openai(OpenAI(api_key=os.getenv("OPEN_AI"), http_client=http_client)))
+
+@st.cache_resource
+def get_index(name):
+    # Shared per process so hedging learns from every session's latencies and identical queries coalesce
+    return CoalescingIndex(ResilientIndex(pinecone_client.Index(name)), name)
+
+@st.cache_resource(ttl=600)
+def get_optional_index(name):
+    # None is cached too, so a missing index costs one list_indexes per process every ttl, not one per rerun
+    if name not in pinecone_client.list_indexes().names():
+        return None
+    return get_index(name)
+
+@st.cache_resource
+def get_semantic_cache(name):
+    return SemanticCache()
+
+@st.cache_resource
+def get_explanation_executor():
+    # LLM explanations for every session; the OpenAI governor does the real throttling
+    return ThreadPoolExecutor(max_workers=int(os.getenv("EXPLANATION_WORKERS", "32")),
+                              thread_name_prefix="explanations")
+
+@st.cache_resource
+def get_feedback_writer(collection_name):
+    return BufferedWriter(get_mongo_client()[os.getenv("DATABASE_NAME")][collection_name])
+
+@st.cache_resource
+def get_job_queue():
+    # One set of job workers per process, shared by every session
+    return JobQueue(get_mongo_client()[os.getenv("DATABASE_NAME")][JOBS_COLLECTION])
+
+def streamlit_session_exists(session_id):
+    # Disconnected sessions count until Streamlit gives up on their reconnecting and closes them
+    from streamlit.runtime import Runtime
+    if not Runtime.exists():
+        return True
+    return Runtime.instance()._session_mgr.get_session_info(session_id) is not None
+
+@st.cache_resource
+def get_session_store():
+    # Large per-session values for every session in this process (keyed by Streamlit session id), under one
+    # memory budget; a closed session's values are discarded on the next eviction pass
+    if SPILL_BACKEND == "gridfs":
+        return SessionStore(GridFSSpill(get_mongo_client()[os.getenv("DATABASE_NAME")]),
+                            is_alive=streamlit_session_exists)
+    return SessionStore(DiskSpill(), is_alive=streamlit_session_exists)
+
+@st.cache_resource
+def init_metrics_exporter():
+    start_metrics_exporter()
+
+# EXPORT CACHED INSTANCES (timed by tracing)
+init_metrics_exporter()
+model = traced_model(CoalescingModel(load_embedding_model()))
+pinecone_client = traced_pinecone(init_pinecone_client())
+mongo_client = traced_mongo(get_mongo_client())
+openai_client = get_openai_client()
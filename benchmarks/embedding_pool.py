@@ -0,0 +1,104 @@
+"""Measure bulk embedding throughput of the worker pool against in-process encoding.
+
+Encodes the same synthetic passages in-process and then with 1..N pinned
+workers, and reports passages/sec and the speedup over one worker. Then
+runs jobs.build_index.index_corpus end to end (mongomock and an in-memory
+index) with each pool size, so the numbers include the job's own batching.
+
+    python -m benchmarks.embedding_pool --model intfloat/multilingual-e5-large --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from embedding_pool import EmbeddingPool
+
+WORDS = ("court appeal contract tenant landlord damages negligence employer notice clause "
+         "section law judgment ruling property inheritance permit license tax fine").split()
+
+
+def passages(count, words=60, seed=0):
+    rng = random.Random(seed)
+    return [f"passage: {' '.join(rng.choice(WORDS) for _ in range(words))}" for _ in range(count)]
+
+
+def timed(model, texts, batch_size):
+    started = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False)
+    return embeddings, time.perf_counter() - started
+
+
+def index_corpus_rate(model, documents, batch_size):
+    import mongomock
+
+    from benchmarks.fixtures import make_judgments
+    from indexing import CORPORA
+    from jobs.build_index import index_corpus
+    from local_backends import InMemoryPinecone
+
+    db = mongomock.MongoClient()["embedding_pool_bench"]
+    db["judgments"].insert_many(make_judgments(documents))
+    index = InMemoryPinecone().Index(CORPORA["judgments"]["index"])
+    started = time.perf_counter()
+    indexed = index_corpus(model, db["judgments"], index, db["checkpoints"], "judgments",
+                           encode_batch_size=batch_size, log=lambda message: None)
+    return indexed / (time.perf_counter() - started)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="intfloat/multilingual-e5-large")
+    parser.add_argument("--passages", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--weights", help="Exported weights file (default: a fresh temporary one)")
+    parser.add_argument("--documents", type=int, default=2000, help="Synthetic judgments for the index_corpus run")
+    args = parser.parse_args(argv)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    texts = passages(args.passages)
+    torch.set_num_threads(args.threads_per_worker)
+    reference, elapsed = timed(SentenceTransformer(args.model, device="cpu"), texts, args.batch_size)
+    print(f"in-process ({args.threads_per_worker} threads): {len(texts) / elapsed:8.1f} passages/sec")
+
+    weights = args.weights or os.path.join(tempfile.mkdtemp(), "weights.safetensors")
+    baseline = None
+    try:
+        for workers in args.workers:
+            with EmbeddingPool(args.model, weights, workers=workers,
+                               threads_per_worker=args.threads_per_worker) as pool:
+                timed(pool, texts[:workers * 8], args.batch_size)  # warm up every worker
+                embeddings, elapsed = timed(pool, texts, args.batch_size)
+            rate = len(texts) / elapsed
+            baseline = baseline or rate
+            drift = float(np.abs(embeddings - reference).max())
+            print(f"{workers:3d} workers: {rate:8.1f} passages/sec  speedup x{rate / baseline:.2f}  "
+                  f"max diff {drift:.1e}")
+
+        print(f"\njobs.build_index.index_corpus, {args.documents} judgments:")
+        baseline = None
+        for workers in args.workers:
+            with EmbeddingPool(args.model, weights, workers=workers,
+                               threads_per_worker=args.threads_per_worker) as pool:
+                rate = index_corpus_rate(pool, args.documents, args.batch_size)
+            baseline = baseline or rate
+            print(f"{workers:3d} workers: {rate:8.1f} docs/sec  speedup x{rate / baseline:.2f}")
+    finally:
+        if not args.weights:
+            for path in (weights, f"{weights}.lock"):
+                if os.path.exists(path):
+                    os.unlink(path)
+            os.rmdir(os.path.dirname(weights))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
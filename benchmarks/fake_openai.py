@@ -0,0 +1,89 @@
+"""Minimal OpenAI-compatible HTTP server for benchmarks and load tests.
+
+Answers POST /v1/chat/completions after a configurable delay with a JSON
+payload that the search pages can parse. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = {"advice": "תשובת בדיקה מקומית.", "score": 7}
+
+
+class FakeOpenAIServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.1, reply=DEFAULT_REPLY):
+        self.latency = latency
+        self.jitter = jitter
+        self.reply = json.dumps(reply, ensure_ascii=False)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                with server._lock:
+                    server.requests += 1
+                time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+                payload = json.dumps({
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "gpt-4"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.reply},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Standard deviation of the delay")
+    args = parser.parse_args()
+    fake = FakeOpenAIServer(port=args.port, latency=args.latency, jitter=args.jitter)
+    print(f"Fake OpenAI listening on {fake.base_url}", flush=True)
+    fake._server.serve_forever()
@@ -0,0 +1,121 @@
+"""Synthetic laws/judgments and scenario corpora for the local stand-in backends."""
+import glob
+import os
+import random
+from datetime import datetime, timedelta
+
+from indexing import CORPORA, passage_text, vector_record
+from local_backends import InMemoryPinecone
+
+COURT_TYPES = ["עליון", "מחוזי", "שלום", "עבודה"]
+PROCEDURE_TYPES = ['ע"א', 'בג"ץ', 'ת"א', 'רע"א', 'ע"פ']
+DISTRICTS = ["ירושלים", "תל אביב", "חיפה", "מרכז", "צפון", "דרום"]
+TOPICS = [
+    "שכירות", "פיטורים", "ירושה", "נזיקין", "חוזה מכר", "לשון הרע", "מקרקעין", "הגנת הצרכן",
+    "תאונת דרכים", "זכויות יוצרים", "מזונות", "משמורת", "הלוואה", "ביטוח", "רשלנות רפואית",
+]
+PHRASES = [
+    "הצדדים חלוקים בשאלת", "בית המשפט קבע כי", "התובע טען כי", "הנתבעת הפרה את", "נדחתה הטענה בדבר",
+    "נפסק פיצוי בגין", "הוראות החוק חלות על", "נקבע כי אין תחולה ל", "הערעור התקבל בעניין",
+]
+
+DEFAULT_SCENARIOS = [
+    "בעל הדירה סירב להחזיר לי את הפיקדון אחרי שסיימתי את חוזה השכירות.",
+    "פוטרתי מהעבודה בזמן שהייתי בהיריון ללא שימוע.",
+    "נפגעתי בתאונת דרכים והמבטח מסרב לשלם פיצוי.",
+    "שכן פרסם עליי פוסט שקרי ברשת החברתית שפגע בעסק שלי.",
+    "קניתי רכב משומש והתברר שהיה מעורב בתאונה שהוסתרה ממני.",
+    "אחי מתנגד לצוואה של אבינו וטוען שנחתמה תחת לחץ.",
+]
+
+
+def _description(rng, topic):
+    return " ".join(f"{rng.choice(PHRASES)} {topic}" for _ in range(rng.randint(2, 5))) + "."
+
+
+def make_judgments(count, seed=0):
+    rng = random.Random(seed)
+    judgments = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        case_number = f"{rng.randint(1000, 99999)}-{rng.randint(1, 12):02d}-{rng.randint(10, 24)}-{i}"
+        judgments.append({
+            "CaseNumber": case_number,
+            "Name": f"פלוני נ' אלמוני בעניין {topic} ({i})",
+            "Description": _description(rng, topic),
+            "DecisionDate": datetime(2000, 1, 1) + timedelta(days=rng.randint(0, 9000)),
+            "PublicationDate": datetime(2000, 1, 1) + timedelta(days=rng.randint(0, 9000)),
+            "ProcedureType": rng.choice(PROCEDURE_TYPES),
+            "CourtType": rng.choice(COURT_TYPES),
+            "District": rng.choice(DISTRICTS),
+            "Documents": [{"url": f"https://example.invalid/judgments/{i}.pdf"}],
+        })
+    return judgments
+
+
+def make_laws(count, seed=0):
+    rng = random.Random(seed + 1)
+    laws = []
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        laws.append({
+            "IsraelLawID": 1000 + i,
+            "Name": f"חוק {topic} ({i}), התשנ\"ט",
+            "Description": _description(rng, topic),
+            "PublicationDate": datetime(1950, 1, 1) + timedelta(days=rng.randint(0, 26000)),
+            "IsBasicLaw": rng.random() < 0.05,
+            "IsFavoriteLaw": rng.random() < 0.1,
+            "Segments": [
+                {"SectionNumber": s + 1, "Text": f"סעיף {s + 1}. {_description(rng, topic)}"}
+                for s in range(rng.randint(3, 15))
+            ],
+        })
+    return laws
+
+
+def load_scenarios(path=None):
+    """Scenarios from a Hebrew text file or a directory of them.
+
+    Each file holds one scenario per block of text; blocks are separated by
+    blank lines. Falls back to a built-in list when no path is given.
+    """
+    if not path:
+        return list(DEFAULT_SCENARIOS)
+    files = sorted(glob.glob(os.path.join(path, "*.txt"))) if os.path.isdir(path) else [path]
+    scenarios = []
+    for file_path in files:
+        with open(file_path, encoding="utf-8") as f:
+            blocks = f.read().replace("\r\n", "\n").split("\n\n")
+        scenarios.extend(block.strip() for block in blocks if block.strip())
+    if not scenarios:
+        raise ValueError(f"No scenarios found in {path}")
+    return scenarios
+
+
+def seed_backends(mongo_client, pinecone_client, model, database_name, judgments=200, laws=200, seed=0, cards=True):
+    """Fill Mongo and the vector indexes with synthetic data; returns the documents.
+
+    With cards=False the vectors carry only the document key, as before
+    jobs/sync_card_metadata.py has run. Refuses anything but mongomock and
+    the in-memory vector index, since it empties the judgments and laws collections.
+    """
+    import mongomock
+
+    if not isinstance(mongo_client, mongomock.MongoClient) or not isinstance(pinecone_client, InMemoryPinecone):
+        raise RuntimeError("seed_backends only runs against mongomock and the in-memory vector index")
+    db = mongo_client[database_name]
+    judgment_docs = make_judgments(judgments, seed)
+    law_docs = make_laws(laws, seed)
+    for collection_name, docs in (("judgments", judgment_docs), ("laws", law_docs)):
+        db[collection_name].delete_many({})
+        db[collection_name].insert_many([dict(doc) for doc in docs])
+
+    for corpus, docs in (("judgments", judgment_docs), ("laws", law_docs)):
+        key = CORPORA[corpus]["key"]
+        embeddings = model.encode([passage_text(doc) for doc in docs], normalize_embeddings=True, batch_size=64)
+        records = [vector_record(doc, embedding, corpus) for doc, embedding in zip(docs, embeddings)]
+        if not cards:
+            for record in records:
+                record["metadata"] = {key: record["metadata"][key]}
+        pinecone_client.Index(CORPORA[corpus]["index"]).upsert(vectors=records)
+    return judgment_docs, law_docs
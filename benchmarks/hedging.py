@@ -0,0 +1,92 @@
+"""Compare plain and resilient (retry + hedge) queries against a flaky local index.
+
+The in-memory index sleeps a heavy-tailed latency before every query and
+fails a fraction of them, so the effect of hedging on p95/p99 and of
+retries on the error rate can be measured without Pinecone.
+
+    python -m benchmarks.hedging --queries 500 --slow-rate 0.05 --failure-rate 0.02
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from local_backends import InMemoryIndex
+from resilient_index import QueryFailed, ResilientIndex
+
+
+def heavy_tail_latency(base, slow, slow_rate):
+    def latency():
+        if random.random() < slow_rate:
+            return random.uniform(slow / 2, slow)
+        return random.uniform(base / 2, base * 1.5)
+    return latency
+
+
+def build_index(size, dimension, latency, failure_rate):
+    index = InMemoryIndex("bench", latency=latency, failure_rate=failure_rate)
+    vectors = np.random.default_rng(0).standard_normal((size, dimension)).astype(np.float32)
+    index.upsert([(str(i), vector) for i, vector in enumerate(vectors)])
+    return index, vectors
+
+
+def run(index, vectors, queries, concurrency):
+    def one(i):
+        started = time.perf_counter()
+        try:
+            index.query(vector=vectors[i % len(vectors)].tolist(), top_k=5)
+            return time.perf_counter() - started, None
+        except (QueryFailed, ConnectionError) as e:
+            return time.perf_counter() - started, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one, range(queries)))
+    latencies = sorted(latency * 1000 for latency, error in outcomes if error is None)
+    errors = sum(1 for _, error in outcomes if error)
+
+    def quantile(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else float("nan")
+    return {
+        "median": statistics.median(latencies) if latencies else float("nan"),
+        "p95": quantile(0.95),
+        "p99": quantile(0.99),
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--vectors", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--base-latency", type=float, default=0.03, help="Typical query latency (s)")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Latency of slow outliers (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--deadline", type=float, default=3.0)
+    args = parser.parse_args(argv)
+
+    latency = heavy_tail_latency(args.base_latency, args.slow_latency, args.slow_rate)
+    index, vectors = build_index(args.vectors, args.dimension, latency, args.failure_rate)
+    variants = {
+        "plain": index,
+        "retry": ResilientIndex(index, deadline=args.deadline, hedge=False),
+        "retry+hedge": ResilientIndex(index, deadline=args.deadline),
+    }
+    print(f"{'variant':<12} {'median ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'errors':>7}")
+    for name, variant in variants.items():
+        result = run(variant, vectors, args.queries, args.concurrency)
+        print(f"{name:<12} {result['median']:>10.1f} {result['p95']:>10.1f} {result['p99']:>10.1f} "
+              f"{result['errors']:>7}")
+        if isinstance(variant, ResilientIndex):
+            print(f"{'':<12} {variant.stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,461 @@
+"""Concurrent-session load generator for the Streamlit app.
+
+Starts N `streamlit run main.py` worker processes (as behind a load
+balancer) wired to local stand-in backends: in-memory vector indexes and
+mongomock seeded with synthetic data inside each worker (see
+benchmarks/serve_local.py), plus a fake
+OpenAI server with configurable latency. Simulated users then talk to the
+workers over Streamlit's own websocket protocol, exactly as browsers do.
+Sessions are assigned to workers round robin. Each session repeatedly
+picks an action from a weighted mix, runs it and waits for an
+exponentially distributed think time.
+
+    python -m benchmarks.load_test --sessions 1 2 4 8 16 --workers 2 \\
+        --duration 60 --scenarios corpora/scenarios_he/
+
+Reported per level: throughput, p50/p95/p99 per action, and CPU and RSS
+per worker (read from /proc, Linux only). Per-stage latency is scraped
+from each worker's tracing /metrics endpoint. The run ramps through the
+--sessions levels and reports the level where throughput stops scaling,
+and which stage slowed down the most (model.encode, openai.*, pinecone.*,
+mongo.*).
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fixtures import load_scenarios  # noqa: E402
+
+DEFAULT_MIX = {
+    "judgments_browser": 3,
+    "laws_browser": 2,
+    "find_judgments": 2,
+    "find_laws": 2,
+    "chat": 1,
+}
+PAGE_NAMES = {
+    "judgments_browser": "Judgments",
+    "laws_browser": "Laws",
+    "find_judgments": "Finding_Suitable_Judgments",
+    "find_laws": "Finding_Suitable_Law",
+    "chat": "test_typing_chat",
+}
+SEARCH_BUTTONS = {
+    "find_judgments": "Find Suitable Judgments",
+    "find_laws": "Find Suitable Laws",
+}
+
+# A stage counts as saturated once its mean latency grows this much over the first level
+SATURATION_FACTOR = 2.0
+# ...while throughput grows by less than this fraction of the added sessions
+SCALING_EFFICIENCY = 0.5
+
+_STAGE_SAMPLE = re.compile(r'^mini_lawyer_stage_latency_seconds_(sum|count)\{stage="([^"]+)",request="[^"]*"\} (\S+)$')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown action {name!r}; choose from {sorted(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"{url} did not come up within {timeout}s")
+
+
+# === Worker processes ===
+class Worker:
+    """One `streamlit run` process with local backends and a metrics endpoint."""
+
+    def __init__(self, worker_id, args, openai_base_url):
+        self.worker_id = worker_id
+        self.port = _free_port()
+        self.metrics_port = _free_port()
+        env = dict(
+            os.environ,
+            PINECONE_BACKEND="memory",
+            PINECONE_LOCAL_LATENCY=str(args.pinecone_latency),
+            MONGO_URI=args.mongo_uri,
+            DATABASE_NAME=f"{args.database}_{worker_id}",
+            OPENAI_BASE_URL=openai_base_url,
+            OPEN_AI=os.environ.get("OPEN_AI") or "local-load-test",
+            METRICS_PORT=str(self.metrics_port),
+            TOKENIZERS_PARALLELISM="false",
+        )
+        if args.model:
+            env["EMBEDDING_MODEL_NAME"] = args.model
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.serve_local", "--judgments", str(args.judgments),
+             "--laws", str(args.laws), "--", "--server.port", str(self.port),
+             "--server.headless", "true", "--browser.gatherUsageStats", "false"],
+            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/_stcore/stream"
+
+    def wait_ready(self, timeout=600):
+        _wait_for(f"http://127.0.0.1:{self.port}/_stcore/health", timeout)
+        # The server comes up once seeding is done; the first page run warms the page's resources
+        session = StreamlitSession(self.url)
+        try:
+            session.open(PAGE_NAMES["find_judgments"], timeout=timeout)
+        finally:
+            session.close()
+        _wait_for(f"http://127.0.0.1:{self.metrics_port}/metrics", 30)
+
+    def cpu_seconds(self):
+        with open(f"/proc/{self.process.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def rss_mb(self):
+        with open(f"/proc/{self.process.pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+    def stage_totals(self):
+        """{stage: [count, seconds]} from the worker's Prometheus endpoint."""
+        with urllib.request.urlopen(f"http://127.0.0.1:{self.metrics_port}/metrics", timeout=10) as response:
+            text = response.read().decode("utf-8")
+        totals = {}
+        for line in text.splitlines():
+            match = _STAGE_SAMPLE.match(line)
+            if match:
+                kind, stage, value = match.groups()
+                entry = totals.setdefault(stage, [0, 0.0])
+                entry[0 if kind == "count" else 1] += float(value)
+        return totals
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=20)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# === Simulated browser session ===
+class StreamlitSession:
+    """Minimal Streamlit websocket client: reruns pages with widget values."""
+
+    def __init__(self, url):
+        from websockets.sync.client import connect
+
+        self.ws = connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=30)
+        self.page_hash = ""
+        self.elements = []
+        self.chat_ready = False
+
+    def close(self):
+        self.ws.close()
+
+    def rerun(self, page_name="", widgets=(), timeout=300):
+        """Send a rerun and block until the script (and any st.rerun chain) finishes."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.page_name = page_name
+        message.rerun_script.page_script_hash = "" if page_name else self.page_hash
+        message.rerun_script.widget_states.widgets.extend(widgets)
+        self.ws.send(message.SerializeToString())
+
+        elements = []
+        deadline = time.monotonic() + timeout
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv(timeout=max(0.1, deadline - time.monotonic())))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                self.page_hash = forward.new_session.page_script_hash
+                elements = []
+            elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                elements.append((element.WhichOneof("type"), element))
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    self.elements = elements
+                    return elements
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("Script failed to compile")
+                elements = []
+            elif kind == "page_not_found":
+                raise RuntimeError(f"Page not found: {page_name}")
+
+    def open(self, page_name, timeout=300):
+        return self.rerun(page_name=page_name, timeout=timeout)
+
+    def widget(self, kind, label=None):
+        for element_kind, element in self.elements:
+            if element_kind == kind:
+                widget = getattr(element, kind)
+                if label is None or widget.label == label:
+                    return widget
+        raise LookupError(f"No {kind} {label or ''} on the page")
+
+    def error(self):
+        for kind, element in self.elements:
+            if kind == "exception":
+                return element.exception.message
+        return None
+
+
+def _widget_state(**kwargs):
+    from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+    return WidgetState(**kwargs)
+
+
+def run_action(session, action, scenario, user_name):
+    """Run one user action; returns the seconds the measured script run took."""
+    page = PAGE_NAMES[action]
+    if action in SEARCH_BUTTONS:
+        session.open(page)
+        text_area = session.widget("text_area")
+        button = session.widget("button", SEARCH_BUTTONS[action])
+        started = time.perf_counter()
+        session.rerun(widgets=[_widget_state(id=text_area.id, string_value=scenario),
+                               _widget_state(id=button.id, trigger_value=True)])
+        return time.perf_counter() - started
+
+    if action == "chat":
+        if not session.chat_ready:
+            session.open(page)
+            # Answer the localStorage lookup that streamlit_js would get from the browser
+            component = session.widget("component_instance")
+            session.rerun(widgets=[_widget_state(id=component.id, json_value="[null]")])
+            name_input = session.widget("text_input")
+            start_button = session.widget("button")
+            session.rerun(widgets=[_widget_state(id=name_input.id, string_value=user_name),
+                                   _widget_state(id=start_button.id, trigger_value=True)])
+            session.chat_ready = True
+        else:
+            session.open(page)
+        question = session.widget("text_area", "הכנס שאלה משפטית")
+        send = session.widget("button", "שלח שאלה")
+        started = time.perf_counter()
+        session.rerun(widgets=[_widget_state(id=question.id, string_value=scenario),
+                               _widget_state(id=send.id, trigger_value=True)])
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    session.open(page)
+    return time.perf_counter() - started
+
+
+def _run_session(url, stop_at, mix, scenarios, think_time, seed, latencies, errors, lock):
+    rng = random.Random(seed)
+    names, weights = zip(*mix.items())
+    session = None
+    try:
+        session = StreamlitSession(url)
+        while time.monotonic() < stop_at:
+            action = rng.choices(names, weights)[0]
+            try:
+                elapsed = run_action(session, action, rng.choice(scenarios), f"user{seed}")
+                error = session.error()
+                if error:
+                    raise RuntimeError(error)
+            except Exception as e:
+                with lock:
+                    errors.append(f"{action}: {e}")
+            else:
+                with lock:
+                    latencies.setdefault(action, []).append(elapsed)
+            remaining = stop_at - time.monotonic()
+            if think_time and remaining > 0:
+                time.sleep(min(rng.expovariate(1 / think_time), remaining))
+    except Exception as e:
+        with lock:
+            errors.append(f"session: {e}")
+    finally:
+        if session:
+            session.close()
+
+
+# === Coordinator ===
+def run_level(workers, sessions, args, scenarios):
+    latencies, errors, lock = {}, [], threading.Lock()
+    stages_before = {worker.worker_id: worker.stage_totals() for worker in workers}
+    cpu_before = {worker.worker_id: worker.cpu_seconds() for worker in workers}
+    started = time.perf_counter()
+    stop_at = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(
+            target=_run_session,
+            args=(workers[i % len(workers)].url, stop_at, args.mix, scenarios, args.think_time,
+                  sessions * 1000 + i, latencies, errors, lock),
+            daemon=True,
+        )
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stages = {}
+    worker_stats = {}
+    for worker in workers:
+        before = stages_before[worker.worker_id]
+        for stage, (count, total) in worker.stage_totals().items():
+            previous_count, previous_total = before.get(stage, (0, 0.0))
+            if count > previous_count:
+                entry = stages.setdefault(stage, [0, 0.0])
+                entry[0] += count - previous_count
+                entry[1] += total - previous_total
+        cpu = worker.cpu_seconds() - cpu_before[worker.worker_id]
+        worker_stats[str(worker.worker_id)] = {
+            "cpu_percent": 100 * cpu / elapsed,
+            "rss_mb": worker.rss_mb(),
+        }
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        "sessions": sessions,
+        "throughput_per_s": completed / elapsed,
+        "completed": completed,
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:20],
+        "pages": {
+            action: {
+                "count": len(values),
+                "p50_ms": _percentile(values, 0.5) * 1000,
+                "p95_ms": _percentile(values, 0.95) * 1000,
+                "p99_ms": _percentile(values, 0.99) * 1000,
+            }
+            for action, values in sorted(latencies.items())
+        },
+        "stage_mean_ms": {stage: 1000 * total / count for stage, (count, total) in sorted(stages.items())},
+        "workers": worker_stats,
+    }
+
+
+def find_bottleneck(levels):
+    """First level where throughput stops scaling, and the stage that slowed down most."""
+    if len(levels) < 2:
+        return None
+    base = levels[0]
+    for previous, current in zip(levels, levels[1:]):
+        added = current["sessions"] / previous["sessions"] - 1
+        gained = current["throughput_per_s"] / previous["throughput_per_s"] - 1 if previous["throughput_per_s"] else 0
+        slowdowns = {
+            stage: mean / base["stage_mean_ms"][stage]
+            for stage, mean in current["stage_mean_ms"].items()
+            if base["stage_mean_ms"].get(stage)
+        }
+        saturated = {stage: factor for stage, factor in slowdowns.items() if factor >= SATURATION_FACTOR}
+        if saturated and gained < SCALING_EFFICIENCY * added:
+            stage = max(saturated, key=saturated.get)
+            return {
+                "sessions": current["sessions"],
+                "stage": stage,
+                "slowdown": saturated[stage],
+                "throughput_gain": gained,
+                "session_gain": added,
+            }
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Concurrent sessions per level (ramped in order)")
+    parser.add_argument("--workers", type=int, default=1, help="Streamlit worker processes")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per level")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean pause between actions, in seconds")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="Weighted actions, e.g. find_judgments=3,chat=1")
+    parser.add_argument("--scenarios", help="Hebrew scenario file or directory of .txt files")
+    parser.add_argument("--judgments", type=int, default=500)
+    parser.add_argument("--laws", type=int, default=500)
+    parser.add_argument("--mongo-uri", default="mongomock://local", help="mongomock://... (seeding refuses real servers)")
+    parser.add_argument("--database", default="mini_lawyer_load")
+    parser.add_argument("--model", help="Override the embedding model")
+    parser.add_argument("--openai-latency", type=float, default=1.0)
+    parser.add_argument("--openai-jitter", type=float, default=0.3)
+    parser.add_argument("--pinecone-latency", type=float, default=0.05)
+    parser.add_argument("--output", default="load_results.json")
+    args = parser.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios)
+    openai_port = _free_port()
+    fake_openai = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai", "--port", str(openai_port),
+         "--latency", str(args.openai_latency), "--jitter", str(args.openai_jitter)],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL,
+    )
+    workers = [Worker(i, args, f"http://127.0.0.1:{openai_port}/v1") for i in range(args.workers)]
+    try:
+        for worker in workers:
+            worker.wait_ready()
+        print(f"{len(workers)} worker(s) ready", flush=True)
+
+        levels = []
+        for sessions in args.sessions:
+            level = run_level(workers, sessions, args, scenarios)
+            levels.append(level)
+            print(f"sessions={sessions:<4} throughput={level['throughput_per_s']:.2f}/s errors={level['errors']}",
+                  flush=True)
+            for action, page in level["pages"].items():
+                print(f"    {action:<18} p50={page['p50_ms']:.0f}ms p95={page['p95_ms']:.0f}ms "
+                      f"p99={page['p99_ms']:.0f}ms")
+            for worker_id, stats in level["workers"].items():
+                print(f"    worker {worker_id}: cpu={stats['cpu_percent']:.0f}% rss={stats['rss_mb']:.0f}MB")
+    finally:
+        for worker in workers:
+            worker.stop()
+        fake_openai.terminate()
+
+    bottleneck = find_bottleneck(levels)
+    if bottleneck:
+        print(f"Throughput stops scaling at {bottleneck['sessions']} sessions; "
+              f"{bottleneck['stage']} is {bottleneck['slowdown']:.1f}x slower than at {levels[0]['sessions']}.")
+    else:
+        print("No saturation detected at the tested levels.")
+
+    config = {key: value for key, value in vars(args).items() if key != "output"}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": config, "levels": levels, "bottleneck": bottleneck}, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Recall and memory of compressed vector search against exact search.
+
+Loads the stored vectors of one index (or a .npy file, or a synthetic
+clustered set), holds out some of them as queries, and for every
+quantizer / re-scoring setting reports bytes per vector, resident memory,
+recall@k against exact top-k and mean query time.
+
+    python -m benchmarks.quantization --index judgments --quantizers int8 pq64 pq128 --rerank 0 50 200
+    python -m benchmarks.quantization --synthetic 50000 --dimension 1024
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from quantization import CompressedIndex, make_quantizer
+
+
+def synthetic_vectors(count, dimension, clusters=200, seed=0):
+    # Embeddings are far from isotropic; clustered data gives realistic recall numbers
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.6 * rng.standard_normal((count, dimension)).astype(
+        np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_vectors(args):
+    if args.vectors:
+        vectors = np.load(args.vectors).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    if args.index:
+        from indexing import CORPORA
+        from jobs.connections import get_pinecone
+        from law_segments import SEGMENTS_INDEX
+        from neighbor_graph import load_index_vectors
+
+        if args.index == "segments":
+            name, key = SEGMENTS_INDEX, "IsraelLawID"
+        else:
+            name, key = CORPORA[args.index]["index"], CORPORA[args.index]["key"]
+        return load_index_vectors(get_pinecone().Index(name), key)[2]
+    return synthetic_vectors(args.synthetic, args.dimension)
+
+
+def recall_at_k(found, expected):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, expected)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--index", choices=["judgments", "laws", "segments"])
+    source.add_argument("--vectors", help=".npy matrix of embeddings")
+    source.add_argument("--synthetic", type=int, default=20000)
+    parser.add_argument("--dimension", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--quantizers", nargs="+", default=["int8", "pq32", "pq64", "pq128"])
+    parser.add_argument("--rerank", type=int, nargs="+", default=[0, 50, 200],
+                        help="Candidates re-scored exactly (0: codes only)")
+    args = parser.parse_args(argv)
+
+    vectors = load_vectors(args)
+    rng = np.random.default_rng(1)
+    order = rng.permutation(len(vectors))
+    queries, corpus = vectors[order[:args.queries]], vectors[order[args.queries:]]
+    expected = np.argsort(-(queries @ corpus.T), axis=1)[:, :args.k]
+    exact_bytes = corpus.nbytes
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, exact float32: {exact_bytes / 2**20:.1f} MB, "
+          f"{args.queries} held-out queries, recall@{args.k}")
+    print(f"{'setting':>16} {'B/vector':>9} {'RAM MB':>8} {'ratio':>6} {'recall':>7} {'ms/query':>9}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for spec in args.quantizers:
+            started = time.perf_counter()
+            try:
+                index = CompressedIndex.build(range(len(corpus)), corpus, make_quantizer(spec),
+                                              vectors_path=os.path.join(directory, f"{spec}.f32"))
+            except ValueError as e:
+                print(f"{spec:>16} skipped: {e}")
+                continue
+            print(f"{spec:>16} trained and encoded in {time.perf_counter() - started:.1f}s")
+            for rerank in args.rerank:
+                started = time.perf_counter()
+                found = [index.search(query, args.k, rerank)[0] for query in queries]
+                elapsed = (time.perf_counter() - started) / len(queries)
+                setting = f"{spec}+{rerank}" if rerank else spec
+                print(f"{setting:>16} {index.quantizer.bytes_per_vector(corpus.shape[1]):>9} "
+                      f"{index.memory_bytes / 2**20:>8.1f} {exact_bytes / index.memory_bytes:>5.0f}x "
+                      f"{recall_at_k(found, expected):>7.3f} {elapsed * 1000:>9.2f}")
+            del index
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
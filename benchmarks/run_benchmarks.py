@@ -0,0 +1,209 @@
+"""Offline page benchmarks against local stand-ins for Mongo, Pinecone and OpenAI.
+
+Runs each Streamlit page through AppTest with mongomock, in-memory vector
+indexes and a fake OpenAI server, and
+writes wall-clock, per-stage and memory figures as JSON.
+
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --baseline bench.json --tolerance 0.2
+
+The chat pages are not covered: they block on browser localStorage through
+streamlit_js, which AppTest cannot answer.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    "judgments_browser": {"script": "pages/1_Judgments.py"},
+    "laws_browser": {"script": "pages/3_Laws.py"},
+    "statistics": {"script": "pages/6_Statistics.py"},
+    "find_judgments": {"script": "pages/2_Finding_Suitable_Judgments.py", "button": "Find Suitable Judgments"},
+    "find_laws": {"script": "pages/4_Finding_Suitable_Law.py", "button": "Find Suitable Laws"},
+}
+
+
+def configure_local_backends(mongo_uri, openai_base_url, database_name, pinecone_latency=0.0, model_name=None):
+    """Point app_resources at the local stand-ins; must run before it is imported."""
+    os.environ["PINECONE_BACKEND"] = "memory"
+    os.environ["PINECONE_LOCAL_LATENCY"] = str(pinecone_latency)
+    os.environ["MONGO_URI"] = mongo_uri
+    os.environ["DATABASE_NAME"] = database_name
+    os.environ["OPENAI_BASE_URL"] = openai_base_url
+    os.environ["OPEN_AI"] = os.environ.get("OPEN_AI") or "local-benchmark"
+    if model_name:
+        os.environ["EMBEDDING_MODEL_NAME"] = model_name
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+
+
+def current_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # ru_maxrss is KB on Linux, bytes on macOS
+        scale = 1 if platform.system() == "Darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_page(page, scenario=None, timeout=120):
+    """Render one page the way a user would; returns the AppTest for inspection."""
+    from streamlit.testing.v1 import AppTest
+
+    spec = PAGES[page]
+    app = AppTest.from_file(os.path.join(REPO_ROOT, spec["script"]), default_timeout=timeout)
+    app.run()
+    if spec.get("button") and not app.exception:
+        app.text_area[0].input(scenario)
+        next(button for button in app.button if button.label == spec["button"]).click()
+        app.run()
+    return app
+
+
+def _stage_delta(before, after):
+    delta = {}
+    for stage, (count, total) in after.items():
+        previous_count, previous_total = before.get(stage, (0, 0.0))
+        if count > previous_count:
+            delta[stage] = (count - previous_count, total - previous_total)
+    return delta
+
+
+def benchmark_page(page, scenarios, repeats, warmup, timeout):
+    import tracing
+
+    for i in range(warmup):
+        run_page(page, scenarios[i % len(scenarios)], timeout)
+
+    walls, peaks, errors = [], [], []
+    stage_ms = {}
+    stage_calls = {}
+    rss_before = current_rss_bytes()
+    for i in range(repeats):
+        before = tracing.stage_totals()
+        tracemalloc.start()
+        started = time.perf_counter()
+        app = run_page(page, scenarios[i % len(scenarios)], timeout)
+        walls.append((time.perf_counter() - started) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        errors.extend(str(e.message) for e in app.exception)
+        for stage, (count, total) in _stage_delta(before, tracing.stage_totals()).items():
+            stage_ms[stage] = stage_ms.get(stage, 0.0) + total * 1000
+            stage_calls[stage] = stage_calls.get(stage, 0) + count
+
+    ordered = sorted(walls)
+    return {
+        "runs": repeats,
+        "wall_ms": {
+            "median": statistics.median(walls),
+            "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))],
+            "min": ordered[0],
+            "max": ordered[-1],
+        },
+        "stages_ms_per_run": {stage: total / repeats for stage, total in sorted(stage_ms.items())},
+        "stage_calls_per_run": {stage: count / repeats for stage, count in sorted(stage_calls.items())},
+        "peak_python_alloc_mb": max(peaks) / 2 ** 20,
+        "rss_mb": current_rss_bytes() / 2 ** 20,
+        "rss_growth_mb": (current_rss_bytes() - rss_before) / 2 ** 20,
+        "errors": sorted(set(errors)),
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    regressions = []
+    for page, current in results["pages"].items():
+        previous = baseline.get("pages", {}).get(page)
+        if not previous:
+            continue
+        limit = previous["wall_ms"]["median"] * (1 + tolerance)
+        if current["wall_ms"]["median"] > limit:
+            regressions.append(
+                f"{page}: median {current['wall_ms']['median']:.0f} ms vs baseline "
+                f"{previous['wall_ms']['median']:.0f} ms (limit {limit:.0f} ms)"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", nargs="+", choices=sorted(PAGES), default=sorted(PAGES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--judgments", type=int, default=200, help="Synthetic judgments to seed")
+    parser.add_argument("--laws", type=int, default=200, help="Synthetic laws to seed")
+    parser.add_argument("--scenarios", help="Hebrew scenario file or directory of .txt files")
+    parser.add_argument("--mongo-uri", default="mongomock://local", help="mongomock://... (seeding refuses real servers)")
+    parser.add_argument("--database", default="mini_lawyer_bench")
+    parser.add_argument("--model", help="Override the embedding model (e.g. a smaller e5 for quick runs)")
+    parser.add_argument("--openai-latency", type=float, default=0.5)
+    parser.add_argument("--openai-jitter", type=float, default=0.1)
+    parser.add_argument("--pinecone-latency", type=float, default=0.05)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed median slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    from benchmarks.fake_openai import FakeOpenAIServer
+    from benchmarks.fixtures import load_scenarios, seed_backends
+
+    fake_openai = FakeOpenAIServer(latency=args.openai_latency, jitter=args.openai_jitter).start()
+    configure_local_backends(args.mongo_uri, fake_openai.base_url, args.database, args.pinecone_latency, args.model)
+
+    import app_resources
+
+    started = time.perf_counter()
+    seed_backends(app_resources.get_mongo_client(), app_resources.init_pinecone_client(),
+                  app_resources.load_embedding_model(), args.database, args.judgments, args.laws)
+    seed_seconds = time.perf_counter() - started
+    scenarios = load_scenarios(args.scenarios)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "model": os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"),
+            "mongo": args.mongo_uri.split("@")[-1],
+            "judgments": args.judgments,
+            "laws": args.laws,
+            "openai_latency_s": args.openai_latency,
+            "pinecone_latency_s": args.pinecone_latency,
+            "seed_seconds": seed_seconds,
+        },
+        "pages": {},
+    }
+    for page in args.pages:
+        print(f"Benchmarking {page}...", flush=True)
+        results["pages"][page] = benchmark_page(page, scenarios, args.repeats, args.warmup, args.timeout)
+        wall = results["pages"][page]["wall_ms"]
+        print(f"  median {wall['median']:.0f} ms, p95 {wall['p95']:.0f} ms", flush=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {args.output}")
+    fake_openai.stop()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Run the Streamlit app on seeded local stand-in backends, for load tests.
+
+The in-memory vector indexes and mongomock live inside the server process,
+so this seeds them with synthetic data in-process and then starts the
+Streamlit server in the same process; the app's cached clients are the
+seeded ones. Requires PINECONE_BACKEND=memory and a mongomock:// MONGO_URI.
+
+    PINECONE_BACKEND=memory MONGO_URI=mongomock://local DATABASE_NAME=load \\
+        python -m benchmarks.serve_local --judgments 500 --laws 500 -- --server.port 8501
+"""
+import argparse
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--judgments", type=int, default=500)
+    parser.add_argument("--laws", type=int, default=500)
+    parser.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="Passed on to `streamlit run main.py`")
+    args = parser.parse_args(argv)
+
+    if os.getenv("PINECONE_BACKEND") != "memory" or not os.getenv("MONGO_URI", "").startswith("mongomock://"):
+        print("Refusing to seed: set PINECONE_BACKEND=memory and a mongomock:// MONGO_URI")
+        return 1
+    os.chdir(REPO_ROOT)
+
+    import app_resources
+    from benchmarks.fixtures import seed_backends
+
+    seed_backends(app_resources.get_mongo_client(), app_resources.init_pinecone_client(),
+                  app_resources.load_embedding_model(), os.getenv("DATABASE_NAME"), args.judgments, args.laws)
+
+    from streamlit.web import cli
+
+    streamlit_args = args.streamlit_args[1:] if args.streamlit_args[:1] == ["--"] else args.streamlit_args
+    sys.argv = ["streamlit", "run", os.path.join(REPO_ROOT, "main.py"), *streamlit_args]
+    return cli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""Resident and shared memory of processes holding the embedding model.
+
+Starts N workers that load the model the way app_resources does (privately,
+or from the shared weights mapping with EMBEDDING_SHARED_WEIGHTS=1), encodes
+a few passages in each so every weight page is touched, and reports per
+worker RSS, PSS, shared and private memory from /proc/<pid>/smaps_rollup,
+plus the resident part of the weights mapping. PSS splits shared pages
+between the processes that map them, so the PSS total is what the workers
+really cost the host.
+
+With --pids or --match it measures running processes instead, e.g.
+Streamlit servers started behind the load balancer.
+
+    python -m benchmarks.worker_memory --model intfloat/multilingual-e5-large --workers 4 --modes private shared
+    python -m benchmarks.worker_memory --match "streamlit run" --weights ~/.cache/mini-lawyer/model.safetensors
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+from benchmarks.embedding_pool import passages
+from shared_weights import default_weights_path, load_model
+
+START_TIMEOUT = 600
+MAPPING_HEADER = re.compile(r"^[0-9a-f]+-[0-9a-f]+ ")
+
+
+# === /proc readers (Linux only) ===
+def read_rollup(pid):
+    """{field: kB} from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields
+
+
+def mapping_usage(pid, path):
+    """{"Rss": kB, "Pss": kB} summed over the mappings of `path` in /proc/<pid>/smaps."""
+    path = os.path.realpath(path)
+    usage = {"Rss": 0, "Pss": 0}
+    inside = False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            if MAPPING_HEADER.match(line):
+                parts = line.split(maxsplit=5)
+                inside = len(parts) == 6 and parts[5].strip() == path
+            elif inside:
+                key, _, value = line.partition(":")
+                if key in usage:
+                    usage[key] += int(value.split()[0])
+    return usage
+
+
+def find_pids(pattern):
+    pids = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit() or int(name) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{name}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            pids.append(int(name))
+    return sorted(pids)
+
+
+def measure(pids, weights_path=None):
+    rows = []
+    for pid in pids:
+        rollup = read_rollup(pid)
+        row = {
+            "pid": pid,
+            "rss": rollup.get("Rss", 0),
+            "pss": rollup.get("Pss", 0),
+            "shared": rollup.get("Shared_Clean", 0) + rollup.get("Shared_Dirty", 0),
+            "private": rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0),
+            "weights": None,
+        }
+        if weights_path and os.path.exists(weights_path):
+            row["weights"] = mapping_usage(pid, weights_path)["Rss"]
+        rows.append(row)
+    return rows
+
+
+def print_report(label, rows):
+    mb = 1024
+    print(f"\n{label}")
+    print(f"{'pid':>8} {'RSS MB':>9} {'PSS MB':>9} {'shared MB':>10} {'private MB':>11} {'weights RSS MB':>15}")
+    for row in rows:
+        weights = f"{row['weights'] / mb:15.1f}" if row["weights"] is not None else f"{'-':>15}"
+        print(f"{row['pid']:>8} {row['rss'] / mb:9.1f} {row['pss'] / mb:9.1f} {row['shared'] / mb:10.1f} "
+              f"{row['private'] / mb:11.1f} {weights}")
+    print(f"{'total':>8} {sum(r['rss'] for r in rows) / mb:9.1f} {sum(r['pss'] for r in rows) / mb:9.1f}"
+          f"   (PSS total = host memory actually used)")
+
+
+# === Spawned workers ===
+def _worker(model_name, shared, weights_path, threads, ready, stop):
+    import torch
+
+    torch.set_num_threads(threads)
+    model = load_model(model_name, shared=shared, weights_path=weights_path)
+    model.encode(passages(8), normalize_embeddings=True, show_progress_bar=False)
+    ready.put(os.getpid())
+    stop.wait()
+
+
+def run_workers(model_name, shared, weights_path, workers, threads):
+    context = multiprocessing.get_context("spawn")
+    ready, stop = context.Queue(), context.Event()
+    processes = [context.Process(target=_worker, args=(model_name, shared, weights_path, threads, ready, stop),
+                                 daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        pids = [ready.get(timeout=START_TIMEOUT) for _ in processes]
+        time.sleep(1.0)  # let freed startup memory settle
+        return measure(pids, weights_path if shared else None)
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"))
+    parser.add_argument("--weights", help="Shared weights file (default: the one app_resources would use)")
+    running = parser.add_mutually_exclusive_group()
+    running.add_argument("--pids", type=int, nargs="+", help="Measure these running processes")
+    running.add_argument("--match", help="Measure running processes whose command line contains this")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=["private", "shared"], default=["private", "shared"])
+    parser.add_argument("--threads", type=int, default=1, help="Torch threads per worker")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        print("Needs Linux 4.14+ (/proc/<pid>/smaps_rollup)")
+        return 1
+    weights_path = args.weights or os.getenv("EMBEDDING_WEIGHTS_PATH") or default_weights_path(args.model)
+
+    if args.pids or args.match:
+        pids = args.pids or find_pids(args.match)
+        if not pids:
+            print(f"No processes match {args.match!r}")
+            return 1
+        print_report(f"{len(pids)} running processes", measure(pids, weights_path))
+        return 0
+
+    for mode in args.modes:
+        rows = run_workers(args.model, mode == "shared", weights_path, args.workers, args.threads)
+        print_report(f"{args.workers} workers, {mode} weights ({args.model})", rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
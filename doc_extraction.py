@@ -0,0 +1,171 @@
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import docx
+import fitz
+
+# Limits for uploaded documents
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+MAX_PAGES = int(os.getenv("MAX_UPLOAD_PAGES", "600"))
+MAX_TEXT_CHARS = int(os.getenv("MAX_UPLOAD_CHARS", "2000000"))
+
+# Page ranges handed to each worker process
+PAGES_PER_TASK = 16
+DOCX_PARAGRAPHS_PER_BLOCK = 50
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+
+_pool = None
+
+
+class DocumentTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class ExtractedDocument:
+    """Full document text plus the start offset of every page inside it."""
+    text: str
+    page_offsets: list = field(default_factory=list)
+
+    @classmethod
+    def from_pages(cls, pages):
+        offsets = []
+        position = 0
+        for page in pages:
+            offsets.append(position)
+            position += len(page)
+        return cls(text="".join(pages), page_offsets=offsets)
+
+    @property
+    def page_count(self):
+        return len(self.page_offsets)
+
+    def page_span(self, page_number):
+        """(start, end) offsets of a page inside `text`."""
+        start = self.page_offsets[page_number]
+        end = self.page_offsets[page_number + 1] if page_number + 1 < self.page_count else len(self.text)
+        return start, end
+
+    def page_at(self, offset):
+        """Index of the page containing a text offset."""
+        low, high = 0, self.page_count - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.page_offsets[middle] <= offset:
+                low = middle
+            else:
+                high = middle - 1
+        return low
+
+
+def _get_pool():
+    # Spawned (not forked) workers so they don't inherit torch/streamlit state
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACTION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def _extract_page_range(path, start, stop):
+    with fitz.open(path) as pdf:
+        return [pdf[i].get_text() for i in range(start, stop)]
+
+
+def _read_upload(file):
+    size = getattr(file, "size", None)
+    if size is not None and size > MAX_UPLOAD_BYTES:
+        raise DocumentTooLarge(f"הקובץ גדול מדי ({size // (1024 * 1024)}MB). המגבלה היא {MAX_UPLOAD_BYTES // (1024 * 1024)}MB.")
+    data = file.getvalue() if hasattr(file, "getvalue") else file.read()
+    if len(data) > MAX_UPLOAD_BYTES:
+        raise DocumentTooLarge(f"הקובץ גדול מדי. המגבלה היא {MAX_UPLOAD_BYTES // (1024 * 1024)}MB.")
+    return data
+
+
+def _check_text_budget(total_chars):
+    if total_chars > MAX_TEXT_CHARS:
+        raise DocumentTooLarge(f"המסמך ארוך מדי (מעל {MAX_TEXT_CHARS} תווים).")
+
+
+def iter_pdf_pages(file):
+    """Yield (page_number, page_count, text) for every page, in order.
+
+    Small documents are read inline; larger ones are split into page ranges
+    that are extracted in parallel by a process pool.
+    """
+    data = _read_upload(file)
+    with fitz.open(stream=data, filetype="pdf") as pdf:
+        page_count = pdf.page_count
+        if page_count > MAX_PAGES:
+            raise DocumentTooLarge(f"המסמך ארוך מדי ({page_count} עמודים). המגבלה היא {MAX_PAGES} עמודים.")
+        if page_count <= PAGES_PER_TASK * 2 or EXTRACTION_WORKERS <= 1:
+            total_chars = 0
+            for i in range(page_count):
+                text = pdf[i].get_text()
+                total_chars += len(text)
+                _check_text_budget(total_chars)
+                yield i, page_count, text
+            return
+
+    # Workers open the file from disk instead of receiving the bytes per task
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        path = tmp.name
+    del data
+    futures = []
+    try:
+        pool = _get_pool()
+        futures = [
+            pool.submit(_extract_page_range, path, start, min(start + PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PAGES_PER_TASK)
+        ]
+        page_number = 0
+        total_chars = 0
+        for future in futures:
+            for text in future.result():
+                total_chars += len(text)
+                _check_text_budget(total_chars)
+                yield page_number, page_count, text
+                page_number += 1
+    finally:
+        for future in futures:
+            future.cancel()
+        os.unlink(path)
+
+
+def iter_docx_blocks(file):
+    """Yield (block_number, block_count, text) for blocks of paragraphs, in order."""
+    _read_upload(file)
+    file.seek(0)
+    paragraphs = docx.Document(file).paragraphs
+    block_count = max(1, -(-len(paragraphs) // DOCX_PARAGRAPHS_PER_BLOCK))
+    total_chars = 0
+    for block in range(block_count):
+        chunk = paragraphs[block * DOCX_PARAGRAPHS_PER_BLOCK:(block + 1) * DOCX_PARAGRAPHS_PER_BLOCK]
+        text = "\n".join(p.text for p in chunk)
+        if block + 1 < block_count:
+            text += "\n"
+        total_chars += len(text)
+        _check_text_budget(total_chars)
+        yield block, block_count, text
+
+
+def iter_document_pages(file):
+    if file.type == "application/pdf":
+        return iter_pdf_pages(file)
+    return iter_docx_blocks(file)
+
+
+def extract_document(file, on_progress=None):
+    """Extract an uploaded PDF/DOCX page by page into an ExtractedDocument."""
+    pages = []
+    for page_number, page_count, text in iter_document_pages(file):
+        pages.append(text)
+        if on_progress:
+            on_progress(page_number + 1, page_count)
+    return ExtractedDocument.from_pages(pages)
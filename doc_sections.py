@@ -0,0 +1,97 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from indexing import query_text
+
+SECTION_HEADING = re.compile(r'סעיף\s+\d+|פרק\s+\d+|\d+\.\d+|\d+\)')
+MIN_SECTION_CHARS = 30
+
+# Section text sent to the embedding model (e5 truncates at 512 tokens anyway)
+MAX_EMBED_CHARS = 2000
+MAX_CONCURRENT_QUERIES = 16
+
+
+def _append_span(spans, text, start, end, heading):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if end - start > MIN_SECTION_CHARS:
+        spans.append((start, end, heading))
+
+
+def section_spans(text):
+    """Split text on section headings in one pass.
+
+    Returns (start, end, heading) offsets into `text`; the span before the
+    first heading has heading None. Sections of 30 characters or less are
+    dropped.
+    """
+    spans = []
+    start, heading = 0, None
+    for match in SECTION_HEADING.finditer(text):
+        _append_span(spans, text, start, match.start(), heading)
+        start, heading = match.start(), match.group()
+    _append_span(spans, text, start, len(text), heading)
+    return spans
+
+
+def split_into_sections(text):
+    return [text[start:end] for start, end, _ in section_spans(text)]
+
+
+def _hydrate_names(collection, key_field, keys):
+    if not keys:
+        return {}
+    cursor = collection.find({key_field: {"$in": list(keys)}}, {key_field: 1, "Name": 1})
+    return {doc[key_field]: doc.get("Name", "") for doc in cursor}
+
+
+def _citations(matches, key_field, names):
+    citations = []
+    for match in matches:
+        key = match.get("metadata", {}).get(key_field)
+        if key in names:
+            citations.append({key_field: key, "Name": names[key], "score": match.get("score")})
+    return citations
+
+
+def retrieve_for_sections(text, spans, model, law_index, judgment_index,
+                          law_collection, judgment_collection, top_k=3):
+    """Find the closest laws and judgments for every section of a document.
+
+    All sections are embedded in one batched encode call, the per-section
+    queries against both indexes run concurrently, and names are hydrated
+    with one `$in` query per collection.
+    """
+    if not spans:
+        return []
+    embeddings = model.encode(
+        [query_text(text[start:min(end, start + MAX_EMBED_CHARS)]) for start, end, _ in spans],
+        normalize_embeddings=True,
+    )
+
+    def query(index, vector):
+        return index.query(vector=vector.tolist(), top_k=top_k, include_metadata=True).get("matches", [])
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES) as executor:
+        law_futures = [executor.submit(query, law_index, vector) for vector in embeddings]
+        judgment_futures = [executor.submit(query, judgment_index, vector) for vector in embeddings]
+        law_matches = [future.result() for future in law_futures]
+        judgment_matches = [future.result() for future in judgment_futures]
+
+    law_names = _hydrate_names(law_collection, "IsraelLawID", {
+        m.get("metadata", {}).get("IsraelLawID") for matches in law_matches for m in matches
+    } - {None})
+    judgment_names = _hydrate_names(judgment_collection, "CaseNumber", {
+        m.get("metadata", {}).get("CaseNumber") for matches in judgment_matches for m in matches
+    } - {None})
+
+    return [
+        {
+            "span": span,
+            "laws": _citations(laws, "IsraelLawID", law_names),
+            "judgments": _citations(judgments, "CaseNumber", judgment_names),
+        }
+        for span, laws, judgments in zip(spans, law_matches, judgment_matches)
+    ]
@@ -0,0 +1,147 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cachetools import LRUCache
+
+from doc_sections import split_into_sections
+from openai_governor import PRIORITY_BULK
+
+SUMMARY_MODEL = "gpt-4"
+# Roughly 3k GPT-4 tokens of Hebrew text per map request
+CHUNK_CHARS = 6000
+# Chunks close after a breakpoint section once they hold this much, about 1 section in BREAKPOINT_EVERY
+MIN_CHUNK_CHARS = CHUNK_CHARS // 3
+BREAKPOINT_EVERY = 4
+# Reduce rounds before the partial summaries are truncated to fit one final request
+MAX_REDUCE_ROUNDS = 3
+MAX_CONCURRENT_SUMMARIES = 4
+
+SUMMARY_PROMPT = """סכם את המסמך המשפטי הבא בקצרה:
+---
+{text}
+"""
+
+CHUNK_PROMPT = """להלן קטע {index} מתוך {total} של מסמך משפטי ארוך.
+סכם את הקטע בקצרה, ושמור על שמות הצדדים, סכומים, תאריכים, התחייבויות וסעדים:
+---
+{text}
+"""
+
+REDUCE_PROMPT = """להלן סיכומים חלקיים של קטעים עוקבים מאותו מסמך משפטי.
+אחד אותם לסיכום קצר אחד של המסמך כולו:
+---
+{text}
+"""
+
+# Chunk summaries keyed by content hash, shared by all sessions
+_chunk_cache = LRUCache(maxsize=2048)
+_cache_lock = threading.Lock()
+
+
+def _content_key(kind, text):
+    return hashlib.sha256(f"{SUMMARY_MODEL}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _is_breakpoint(section):
+    digest = hashlib.sha1(section.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % BREAKPOINT_EVERY == 0
+
+
+def chunk_sections(sections, max_chars=CHUNK_CHARS, min_chars=MIN_CHUNK_CHARS):
+    """Group consecutive sections into chunks of at most max_chars.
+
+    A chunk ends after a section whose content hash marks it as a breakpoint
+    (once the chunk holds min_chars), so boundaries depend on the sections
+    themselves rather than on everything before them: an edit changes its own
+    chunk and at most the chunks up to the next breakpoint, and the chunks
+    after that keep their text and their cached summaries.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for section in sections:
+        while len(section) > max_chars:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(section[:max_chars])
+            section = section[max_chars:]
+        if current and size + len(section) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(section)
+        size += len(section) + 1
+        if size >= min_chars and _is_breakpoint(section):
+            chunks.append("\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _complete(client, prompt):
+    response = client.chat.completions.create(
+        model=SUMMARY_MODEL, messages=[{"role": "user", "content": prompt}], temperature=0.5,
+        # Background job: live chat turns go ahead of its map and reduce calls
+        priority=PRIORITY_BULK,
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _cached_complete(client, kind, text, prompt):
+    key = _content_key(kind, text)
+    with _cache_lock:
+        cached = _chunk_cache.get(key)
+    if cached is not None:
+        return cached
+    result = _complete(client, prompt)
+    with _cache_lock:
+        _chunk_cache[key] = result
+    return result
+
+
+def _summarize_chunks(client, chunks, kind, prompt_template, on_progress=None):
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_SUMMARIES) as executor:
+        futures = [
+            executor.submit(
+                _cached_complete, client, kind, chunk,
+                prompt_template.format(index=i + 1, total=len(chunks), text=chunk),
+            )
+            for i, chunk in enumerate(chunks)
+        ]
+        if on_progress:
+            for done, _ in enumerate(as_completed(futures), start=1):
+                on_progress(done, len(chunks))
+        return [future.result() for future in futures]
+
+
+def summarize_document(client, text, on_progress=None):
+    """Summarize a document of any length.
+
+    Short documents are summarized in one request. Longer ones are split on
+    section boundaries, the chunks are summarized in parallel (map), and the
+    partial summaries are merged until a single summary remains (reduce),
+    for at most MAX_REDUCE_ROUNDS rounds before they are truncated to fit.
+    Chunk summaries are cached by content hash, so only edited chunks are
+    sent again. `on_progress(done, total)` is called on the calling thread
+    as map chunks complete.
+    """
+    if len(text) <= CHUNK_CHARS:
+        return _cached_complete(client, "document", text, SUMMARY_PROMPT.format(text=text))
+
+    chunks = chunk_sections(split_into_sections(text) or [text])
+    partials = _summarize_chunks(client, chunks, "chunk", CHUNK_PROMPT, on_progress)
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if len(partials) == 1:
+            return partials[0]
+        combined = "\n\n".join(partials)
+        if len(combined) <= CHUNK_CHARS:
+            return _cached_complete(client, "reduce", combined, REDUCE_PROMPT.format(text=combined))
+        partials = _summarize_chunks(client, chunk_sections(partials), "reduce", REDUCE_PROMPT)
+    if len(partials) == 1:
+        return partials[0]
+    # Summaries that stopped shrinking: give each an equal share of one last request
+    share = max(CHUNK_CHARS // len(partials) - 2, 1)
+    combined = "\n\n".join(partial[:share] for partial in partials)
+    return _cached_complete(client, "reduce", combined, REDUCE_PROMPT.format(text=combined))
@@ -0,0 +1,65 @@
+import sys
+
+import numpy as np
+
+from doc_sections import section_spans
+from indexing import E5_PASSAGE_PREFIX, E5_QUERY_PREFIX
+
+# Long sections are split into windows so each passage stays a bounded prompt size
+PASSAGE_CHARS = 1200
+PASSAGE_OVERLAP = 200
+
+
+def passage_spans(text):
+    """(start, end) offsets of the passages to index, derived from section spans."""
+    spans = [(start, end) for start, end, _ in section_spans(text)] or [(0, len(text))]
+    passages = []
+    step = PASSAGE_CHARS - PASSAGE_OVERLAP
+    for start, end in spans:
+        position = start
+        while True:
+            passages.append((position, min(position + PASSAGE_CHARS, end)))
+            if position + PASSAGE_CHARS >= end:
+                break
+            position += step
+    return [(start, end) for start, end in passages if text[start:end].strip()]
+
+
+class DocumentVectorStore:
+    """In-memory vector index over the passages of one uploaded document.
+
+    Passages are kept as offsets into the document text; the store lives in
+    the owning session's state and is dropped with it.
+    """
+
+    def __init__(self, model, doc_id, text):
+        self.model = model
+        self.doc_id = doc_id
+        self.text = text
+        self.spans = passage_spans(text)
+        if self.spans:
+            # Embedded and searched only here, so always e5's prefixes whatever INDEX_TEXT_FORMAT the indexes use
+            self.embeddings = model.encode(
+                [E5_PASSAGE_PREFIX + text[start:end] for start, end in self.spans], normalize_embeddings=True
+            ).astype(np.float32)
+        else:
+            self.embeddings = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.spans)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held, excluding the shared model."""
+        return self.embeddings.nbytes + sys.getsizeof(self.text) + 64 * len(self.spans)
+
+    def search(self, query, top_k=4):
+        """Return [(score, start, end)] for the passages closest to query."""
+        if not self.spans:
+            return []
+        query_embedding = self.model.encode([E5_QUERY_PREFIX + query], normalize_embeddings=True)[0].astype(np.float32)
+        scores = self.embeddings @ query_embedding
+        top_k = min(top_k, len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), *self.spans[i]) for i in best]
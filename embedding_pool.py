@@ -0,0 +1,173 @@
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import uuid
+
+import numpy as np
+
+from shared_weights import default_weights_path
+
+# Upper bound on rows per task; each encode() call is otherwise split evenly across the workers
+CHUNK_SIZE = 256
+THREADS_PER_WORKER = int(os.getenv("EMBEDDING_THREADS_PER_WORKER", 1))
+START_TIMEOUT = 600
+# Result buffers live on tmpfs where available, so workers write straight into shared memory
+BUFFER_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _pin_worker(threads, cpus):
+    # Must run before torch spins up its thread pools
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[name] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+def _worker(worker_id, model_name, weights_path, threads, cpus, tasks, results):
+    try:
+        _pin_worker(threads, cpus)
+        import torch
+
+        from shared_weights import load_shared_model
+
+        torch.set_num_threads(threads)
+        model = load_shared_model(model_name, weights_path)
+        results.put(("ready", worker_id, model.get_sentence_embedding_dimension()))
+    except Exception as e:
+        results.put(("failed", worker_id, repr(e)))
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, path, shape, offset, texts, normalize, batch_size = task
+        try:
+            embeddings = model.encode(texts, batch_size=batch_size, normalize_embeddings=normalize,
+                                      show_progress_bar=False, convert_to_numpy=True)
+            out = np.memmap(path, dtype=np.float32, mode="r+", shape=shape)
+            out[offset:offset + len(texts)] = embeddings
+            out.flush()
+            del out
+            results.put(("done", task_id, len(texts)))
+        except Exception as e:
+            results.put(("error", task_id, repr(e)))
+
+
+class EmbeddingPool:
+    """Encodes with N worker processes that share one memory-mapped copy of the weights.
+
+    Each worker is pinned to its own cores with a fixed thread count, so
+    workers don't oversubscribe the machine. `encode` splits the input into
+    one chunk per worker (at most `chunk_size` rows), and workers write their rows straight into a shared result
+    array; only small status messages go back through the queue. It is a
+    drop-in for SentenceTransformer.encode in the bulk jobs.
+    """
+
+    def __init__(self, model_name, weights_path=None, workers=None, threads_per_worker=THREADS_PER_WORKER,
+                 chunk_size=CHUNK_SIZE, pin=True):
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.workers = workers or max(1, len(cpus) // self.threads_per_worker)
+        self.chunk_size = chunk_size
+        self.dimension = None
+        self._lock = threading.Lock()
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = []
+        weights_path = weights_path or default_weights_path(model_name)
+        for worker_id in range(self.workers):
+            worker_cpus = None
+            if pin and len(cpus) >= self.workers * self.threads_per_worker:
+                start = worker_id * self.threads_per_worker
+                worker_cpus = cpus[start:start + self.threads_per_worker]
+            process = context.Process(
+                target=_worker, daemon=True,
+                args=(worker_id, model_name, weights_path, self.threads_per_worker, worker_cpus, self._tasks,
+                      self._results),
+            )
+            process.start()
+            self._processes.append(process)
+        try:
+            self._wait_ready()
+        except Exception:
+            self.close()
+            raise
+
+    def _wait_ready(self):
+        ready = 0
+        while ready < self.workers:
+            status, worker_id, value = self._next_result(START_TIMEOUT)
+            if status == "failed":
+                raise RuntimeError(f"Embedding worker {worker_id} failed to start: {value}")
+            self.dimension = value
+            ready += 1
+
+    def _next_result(self, timeout=None):
+        waited = 0.0
+        while True:
+            try:
+                return self._results.get(timeout=1.0)
+            except queue.Empty:
+                waited += 1.0
+                dead = [process.pid for process in self._processes if not process.is_alive()]
+                if dead:
+                    raise RuntimeError(f"Embedding worker(s) {dead} exited unexpectedly")
+                if timeout is not None and waited >= timeout:
+                    raise TimeoutError("Timed out waiting for embedding workers")
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, show_progress_bar=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        shape = (len(texts), self.dimension)
+        path = os.path.join(BUFFER_DIR, f"embedding-pool-{os.getpid()}-{uuid.uuid4().hex}.f32")
+        out = np.memmap(path, dtype=np.float32, mode="w+", shape=shape)
+        try:
+            with self._lock:
+                task_id = uuid.uuid4().hex
+                # The jobs encode a few hundred texts per call; fixed-size chunks would leave most workers idle
+                chunk_size = min(self.chunk_size, -(-len(texts) // self.workers))
+                chunks = 0
+                for offset in range(0, len(texts), chunk_size):
+                    self._tasks.put((task_id, path, shape, offset, texts[offset:offset + chunk_size],
+                                     normalize_embeddings, batch_size))
+                    chunks += 1
+                errors = []
+                while chunks:
+                    status, result_task, value = self._next_result()
+                    if result_task != task_id:
+                        continue
+                    chunks -= 1
+                    if status == "error":
+                        errors.append(value)
+                if errors:
+                    raise RuntimeError(f"Embedding failed: {errors[0]}")
+            embeddings = np.array(out)
+        finally:
+            del out
+            os.unlink(path)
+        return embeddings[0] if single else embeddings
+
+    def close(self):
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,171 @@
+import atexit
+import glob
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+SPOOL_DIR = os.getenv("FEEDBACK_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "mini_lawyer_feedback"))
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class BufferedWriter:
+    """Non-blocking event writer for one Mongo collection.
+
+    `write` appends the event to a local spool file and an in-memory batch,
+    and returns immediately. A background thread seals the current spool
+    segment and `insert_many`s it when the batch is full, every
+    `flush_interval` seconds, and at shutdown. Failed inserts are retried
+    with exponential backoff; a segment is deleted only after it has been
+    written to Mongo, so events survive an outage or a crash and are replayed
+    by the next process that starts. Events get client-side `_id`s, which
+    makes replays idempotent.
+    """
+
+    def __init__(self, collection, spool_dir=SPOOL_DIR, batch_size=100, flush_interval=2.0,
+                 max_retries=5, backoff=0.5):
+        self.collection = collection
+        self.spool_dir = os.path.join(spool_dir, collection.name)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff = backoff
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._pending = []
+        self._segment_path = None
+        self._segment = None
+        # Sealed segments waiting to be written: [(path, events)]
+        self._backlog = self._recover_spool()
+
+        self._thread = threading.Thread(target=self._run, name=f"feedback-writer-{collection.name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # === Spool files ===
+    def _recover_spool(self):
+        backlog = []
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "*.jsonl"))):
+            pid = int(os.path.basename(path).split("-", 1)[0])
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            # Claim the dead process's segment by renaming it to ours; another process recovering
+            # at the same time loses the rename (or finds the file gone) and skips it
+            claimed = os.path.join(self.spool_dir, f"{os.getpid()}-{os.path.basename(path).split('-', 1)[1]}")
+            try:
+                if claimed != path:
+                    os.rename(path, claimed)
+                with open(claimed, encoding="utf-8") as f:
+                    events = [json_util.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                continue
+            backlog.append((claimed, events))
+        return backlog
+
+    def _open_segment(self):
+        name = f"{os.getpid()}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl"
+        self._segment_path = os.path.join(self.spool_dir, name)
+        self._segment = open(self._segment_path, "a", encoding="utf-8")
+
+    def _seal_segment(self):
+        """Detach the pending batch and its spool file; caller holds the lock."""
+        if not self._pending:
+            return None
+        self._segment.close()
+        sealed = (self._segment_path, self._pending)
+        self._segment = None
+        self._segment_path = None
+        self._pending = []
+        return sealed
+
+    # === Public API ===
+    def write(self, event):
+        event = dict(event, _id=ObjectId())
+        with self._lock:
+            if self._segment is None:
+                self._open_segment()
+            self._segment.write(json_util.dumps(event) + "\n")
+            self._segment.flush()
+            self._pending.append(event)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def flush(self):
+        """Write everything buffered so far; returns True if nothing is left over."""
+        with self._flush_lock:
+            with self._lock:
+                sealed = self._seal_segment()
+            if sealed:
+                self._backlog.append(sealed)
+            while self._backlog:
+                path, events = self._backlog[0]
+                if not self._insert_with_retry(events):
+                    return False
+                self._backlog.pop(0)
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            return True
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    # === Background flusher ===
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Feedback writer for {self.collection.name} failed to flush: {e}")
+
+    def _insert(self, events):
+        for start in range(0, len(events), self.batch_size):
+            try:
+                self.collection.insert_many(events[start:start + self.batch_size], ordered=False)
+            except BulkWriteError as e:
+                # Events already written by an earlier, interrupted attempt
+                errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                    raise
+
+    def _insert_with_retry(self, events):
+        for attempt in range(self.max_retries):
+            try:
+                self._insert(events)
+                return True
+            except PyMongoError as e:
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                print(f"Feedback insert into {self.collection.name} failed ({e}); retrying in {delay:.1f}s")
+                if self._closed:
+                    return False
+                time.sleep(delay)
+        return False
@@ -0,0 +1,186 @@
+import calendar
+import hashlib
+import os
+from datetime import date, datetime
+
+# Pinecone caps metadata at 40 KB per vector; cards stay far below that.
+# Limits are in UTF-8 bytes, and Hebrew takes two bytes per letter.
+CARD_FIELD_BYTES = {
+    "Name": 600,
+    "Description": 4000,
+    "ProcedureType": 200,
+    "CourtType": 200,
+    "District": 200,
+}
+
+
+def truncate_utf8(text, max_bytes):
+    """Cut text to at most max_bytes of UTF-8 without splitting a character."""
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes - len("…".encode("utf-8"))].decode("utf-8", errors="ignore").rstrip() + "…"
+
+
+def _card_value(field, value):
+    # Pinecone metadata only holds strings, numbers, booleans and lists of strings
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float)):
+        return value
+    return truncate_utf8(str(value), CARD_FIELD_BYTES.get(field, 200))
+
+
+def timestamp(value):
+    """Seconds since the epoch (UTC) for a date, datetime or ISO date string; None otherwise."""
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple())
+    if isinstance(value, date):
+        return calendar.timegm(value.timetuple())
+    if isinstance(value, str):
+        try:
+            return timestamp(datetime.fromisoformat(value[:10]))
+        except ValueError:
+            return None
+    return None
+
+
+def build_card(doc, key, fields, date_field=None):
+    """Display and filter fields of a Mongo document as vector metadata; missing values are left out.
+
+    Pinecone range filters only work on numbers, so `date_field` is also
+    stored as a `<field>Timestamp` in epoch seconds.
+    """
+    card = {key: doc[key]}
+    for field in fields:
+        value = doc.get(field)
+        if value not in (None, ""):
+            card[field] = _card_value(field, value)
+    if date_field and timestamp(doc.get(date_field)) is not None:
+        card[f"{date_field}Timestamp"] = timestamp(doc[date_field])
+    return card
+
+
+def judgment_card(doc):
+    return build_card(doc, "CaseNumber", CORPORA["judgments"]["fields"], "DecisionDate")
+
+
+def law_card(doc):
+    return build_card(doc, "IsraelLawID", CORPORA["laws"]["fields"], "PublicationDate")
+
+
+# e5 was trained with these prefixes; indexed text and search text must each carry theirs
+# Text format of the vectors in the Pinecone indexes, shared by the index jobs and the search pages.
+# "plain" is what the existing indexes were built with; "e5" adds the "passage: " / "query: " prefixes e5 was
+# trained with. Switching means rebuilding every index with the new value first (jobs.build_index and
+# jobs.index_law_segments start over by themselves), and only then running the app with it.
+INDEX_TEXT_FORMAT = os.getenv("INDEX_TEXT_FORMAT", "plain")
+E5_PASSAGE_PREFIX = "passage: "
+E5_QUERY_PREFIX = "query: "
+TEXT_PREFIXES = {"plain": ("", ""), "e5": (E5_PASSAGE_PREFIX, E5_QUERY_PREFIX)}
+if INDEX_TEXT_FORMAT not in TEXT_PREFIXES:
+    raise ValueError(f"INDEX_TEXT_FORMAT must be one of {sorted(TEXT_PREFIXES)}, not {INDEX_TEXT_FORMAT!r}")
+PASSAGE_PREFIX, QUERY_PREFIX = TEXT_PREFIXES[INDEX_TEXT_FORMAT]
+
+
+def passage_text(doc):
+    return f"{PASSAGE_PREFIX}{doc.get('Name', '')}. {doc.get('Description', '')}"
+
+
+def query_text(text):
+    """Search-side text for the vector indexes; use for every encode whose vector queries indexed passages."""
+    return f"{QUERY_PREFIX}{text}"
+
+
+def text_hash(doc):
+    """Short digest of the embedded text, stored as TextHash so unchanged documents are not re-embedded."""
+    return hashlib.sha1(passage_text(doc).encode("utf-8")).hexdigest()[:16]
+
+
+def vector_record(doc, embedding, corpus):
+    """Upsert payload for one document: id is the string key, metadata its card plus TextHash."""
+    key = CORPORA[corpus]["key"]
+    metadata = dict(CORPORA[corpus]["card"](doc), TextHash=text_hash(doc))
+    return {"id": str(doc[key]), "values": embedding.tolist(), "metadata": metadata}
+
+
+def normalize_key(key):
+    # Pinecone returns numeric metadata as floats; Mongo keeps IsraelLawID as an int
+    return int(key) if isinstance(key, float) and key.is_integer() else key
+
+
+def has_card(metadata):
+    return bool(metadata and metadata.get("Name"))
+
+
+# Searchable corpora: vector index, Mongo collection, shared key, card builder, card fields,
+# fields offered as search filters and the date field behind the date-range filter
+CORPORA = {
+    "judgments": {"index": "judgments-names", "collection": "judgments", "key": "CaseNumber",
+                  "card": judgment_card,
+                  "fields": ("Name", "Description", "DecisionDate", "ProcedureType", "CourtType", "District"),
+                  "filters": ("CourtType", "ProcedureType", "District"), "date": "DecisionDate"},
+    "laws": {"index": "laws-names", "collection": "laws", "key": "IsraelLawID", "card": law_card,
+             "fields": ("Name", "Description", "PublicationDate"), "filters": (), "date": "PublicationDate"},
+}
+
+
+def vector_filter(corpus, selections=None, date_range=None):
+    """Pinecone metadata filter for a search, or None when nothing is selected.
+
+    `selections` maps filter fields to the accepted values; `date_range` is
+    an inclusive (start, end) pair of dates, either of which may be None.
+    """
+    clauses = [{field: {"$in": list(values)}} for field, values in (selections or {}).items() if values]
+    start, end = date_range or (None, None)
+    bounds = {}
+    if start is not None:
+        bounds["$gte"] = timestamp(start)
+    if end is not None:
+        # Inclusive of the whole end day
+        bounds["$lt"] = timestamp(end) + 24 * 60 * 60
+    if bounds:
+        clauses.append({f"{CORPORA[corpus]['date']}Timestamp": bounds})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _compare(op):
+    def check(value, operand):
+        return value is not None and not isinstance(value, (list, str)) and op(value, operand)
+    return check
+
+
+_OPERATORS = {
+    "$eq": lambda value, operand: operand in value if isinstance(value, list) else value == operand,
+    "$ne": lambda value, operand: operand not in value if isinstance(value, list) else value != operand,
+    "$in": lambda value, operand: (any(v in operand for v in value) if isinstance(value, list)
+                                   else value in operand),
+    "$nin": lambda value, operand: (not any(v in operand for v in value) if isinstance(value, list)
+                                    else value not in operand),
+    "$gt": _compare(lambda value, operand: value > operand),
+    "$gte": _compare(lambda value, operand: value >= operand),
+    "$lt": _compare(lambda value, operand: value < operand),
+    "$lte": _compare(lambda value, operand: value <= operand),
+    "$exists": lambda value, operand: (value is not None) == operand,
+}
+
+
+def matches_filter(metadata, condition):
+    """Whether one vector's metadata satisfies a Pinecone metadata filter."""
+    for field, expected in condition.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, clause) for clause in expected):
+                return False
+        elif field == "$or":
+            if not any(matches_filter(metadata, clause) for clause in expected):
+                return False
+        else:
+            value = metadata.get(field)
+            for op, operand in (expected if isinstance(expected, dict) else {"$eq": expected}).items():
+                if not _OPERATORS[op](value, operand):
+                    return False
+    return True
@@ -0,0 +1,144 @@
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+JOBS_COLLECTION = "analysis_jobs"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# A queued or running job nobody has touched for this long is assumed lost with its process
+STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "120"))
+HEARTBEAT_INTERVAL = 10.0
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+def job_id(chat_id, kind, doc_key):
+    return f"{chat_id}:{kind}:{doc_key}"
+
+
+def in_progress(job):
+    """Queued or running, and its owner is still heartbeating."""
+    return job["status"] in (QUEUED, RUNNING) and time.time() - job.get("heartbeat", 0) < STALE_AFTER
+
+
+class JobQueue:
+    """Local worker threads for long document analyses, with job state kept in Mongo.
+
+    One job per (chat_id, kind, document): submitting a job that is already
+    done, or still in progress anywhere, returns the existing one. The job
+    document is claimed with a single conditional upsert, so of several
+    processes submitting the same job only one runs it. Workers
+    write status, progress and partial results to the job document as they
+    go, so any script run (or a reloaded page) can poll it; running jobs
+    heartbeat, and a job whose process died is run again on the next submit.
+    """
+
+    def __init__(self, collection, workers=JOB_WORKERS):
+        self.collection = collection
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._active = set()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True).start()
+
+    # === Public API ===
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def finished(self, chat_id, doc_key=None):
+        """{kind: job} of the completed jobs for one document of a chat (default: its latest document)."""
+        query = {"chat_id": chat_id, "status": DONE}
+        if doc_key is None:
+            latest = self.collection.find_one(query, sort=[("updated_at", -1)])
+            if latest is None:
+                return {}
+            doc_key = latest["doc_key"]
+        return {job["kind"]: job for job in self.collection.find(dict(query, doc_key=doc_key))}
+
+    def submit(self, chat_id, kind, doc_key, fn, *args, **kwargs):
+        """Queue fn(*args, report=..., **kwargs) and return the job id.
+
+        `report(progress=None, partial=None)` persists a 0..1 progress value
+        and/or a partial result. fn's return value is stored as the result.
+        """
+        _id = job_id(chat_id, kind, doc_key)
+        with self._lock:
+            if _id in self._active:
+                return _id
+            self._active.add(_id)
+        if not self._claim(_id, chat_id, kind, doc_key):
+            # Done, or in progress in another process
+            with self._lock:
+                self._active.discard(_id)
+            return _id
+        self._queue.put((_id, fn, args, kwargs))
+        return _id
+
+    def _claim(self, _id, chat_id, kind, doc_key):
+        """Atomically take over the job document unless it is done or still in progress; True if we did."""
+        now = datetime.now(timezone.utc)
+        # Only a failed or stale job matches; a missing one is inserted, a live one makes the upsert collide
+        claimable = {"_id": _id, "$or": [
+            {"status": FAILED},
+            {"status": {"$in": [QUEUED, RUNNING]}, "heartbeat": {"$lt": time.time() - STALE_AFTER}},
+        ]}
+        try:
+            self.collection.replace_one(claimable, {
+                "chat_id": chat_id, "kind": kind, "doc_key": doc_key, "status": QUEUED, "owner": self.owner,
+                "progress": 0.0, "partial": None, "result": None, "error": None,
+                "created_at": now, "updated_at": now, "heartbeat": time.time(),
+            }, upsert=True)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    # === Workers ===
+    def _update(self, _id, **fields):
+        fields.update(updated_at=datetime.now(timezone.utc), heartbeat=time.time())
+        # Scoped to this owner, so a job taken over after a stall is not overwritten by the old run
+        self.collection.update_one({"_id": _id, "owner": self.owner}, {"$set": fields})
+
+    def _run(self):
+        while True:
+            _id, fn, args, kwargs = self._queue.get()
+
+            def report(progress=None, partial=None):
+                fields = {}
+                if progress is not None:
+                    fields["progress"] = progress
+                if partial is not None:
+                    fields["partial"] = partial
+                self._update(_id, **fields)
+
+            try:
+                self._update(_id, status=RUNNING)
+                result = fn(*args, report=report, **kwargs)
+                self._update(_id, status=DONE, result=result, progress=1.0)
+            except Exception as e:
+                print(f"Job {_id} failed: {e}")
+                try:
+                    self._update(_id, status=FAILED, error=str(e))
+                except Exception:
+                    pass
+            finally:
+                with self._lock:
+                    self._active.discard(_id)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                continue
+            try:
+                self.collection.update_many({"_id": {"$in": active}, "owner": self.owner},
+                                            {"$set": {"heartbeat": time.time()}})
+            except Exception as e:
+                print(f"Job heartbeat failed: {e}")
@@ -0,0 +1,143 @@
+"""Build the vector indexes from the Mongo `laws` and `judgments` collections.
+
+Documents are read in `_id` order through a server-side cursor, embedded in
+batches as passages, and upserted (with their search cards as metadata)
+by a pool of workers while the next batch is being encoded. After every
+batch lands, the last `_id` is checkpointed in `index_checkpoints`, so an
+interrupted run picks up where it stopped. Use --restart to rebuild.
+
+Passages are embedded in INDEX_TEXT_FORMAT (see indexing.py), and the app
+must query with the same format. To switch, run this job and
+jobs.index_law_segments with the new INDEX_TEXT_FORMAT (a checkpoint in
+the old format makes them start over), then restart the app with it.
+
+    python -m jobs.build_index --corpus laws judgments --encode-batch-size 64
+    python -m jobs.build_index --embedding-workers 8   # encode in 8 processes
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from indexing import CORPORA, INDEX_TEXT_FORMAT, passage_text, vector_record
+
+CHECKPOINT_COLLECTION = "index_checkpoints"
+READ_BATCH = 1000
+DOCS_PER_BATCH = 512
+ENCODE_BATCH_SIZE = 64
+UPSERT_BATCH = 100
+UPSERT_WORKERS = 4
+
+
+def checkpoint_id(corpus):
+    return f"build:{corpus}"
+
+
+def read_batches(collection, corpus, after=None, read_batch=READ_BATCH, docs_per_batch=DOCS_PER_BATCH):
+    """Documents after `after` in `_id` order, in lists of docs_per_batch."""
+    spec = CORPORA[corpus]
+    query = {spec["key"]: {"$exists": True}}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    projection = {field: 1 for field in (spec["key"],) + spec["fields"]}
+    cursor = collection.find(query, projection, batch_size=read_batch).sort("_id", 1)
+    batch = []
+    try:
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) == docs_per_batch:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        cursor.close()
+
+
+def index_corpus(model, collection, index, checkpoints, corpus, encode_batch_size=ENCODE_BATCH_SIZE,
+                 upsert_batch=UPSERT_BATCH, workers=UPSERT_WORKERS, docs_per_batch=DOCS_PER_BATCH, restart=False,
+                 log=print):
+    if restart:
+        checkpoints.delete_one({"_id": checkpoint_id(corpus)})
+    checkpoint = checkpoints.find_one({"_id": checkpoint_id(corpus)}) or {}
+    # Checkpoints from before INDEX_TEXT_FORMAT were written with e5 prefixes
+    if checkpoint and checkpoint.get("text_format", "e5") != INDEX_TEXT_FORMAT:
+        log(f"{corpus} was indexed as {checkpoint.get('text_format', 'e5')!r} text, now {INDEX_TEXT_FORMAT!r}; "
+            f"rebuilding from the start")
+        checkpoint = {}
+    done = checkpoint.get("indexed", 0)
+    if checkpoint:
+        log(f"Resuming {corpus} after _id {checkpoint['last_id']} ({done} already indexed)")
+
+    started = time.perf_counter()
+    indexed = 0
+    pending = None
+
+    def finish(futures, last_id, count):
+        nonlocal indexed
+        for future in futures:
+            future.result()
+        indexed += count
+        checkpoints.update_one(
+            {"_id": checkpoint_id(corpus)},
+            {"$set": {"last_id": last_id, "indexed": done + indexed, "text_format": INDEX_TEXT_FORMAT,
+                      "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        elapsed = time.perf_counter() - started
+        log(f"  {corpus}: {done + indexed} indexed, {indexed / elapsed:.1f} docs/sec")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in read_batches(collection, corpus, checkpoint.get("last_id"), docs_per_batch=docs_per_batch):
+            # Encoding this batch overlaps with the previous batch's upserts
+            embeddings = model.encode([passage_text(doc) for doc in batch], batch_size=encode_batch_size,
+                                      normalize_embeddings=True, show_progress_bar=False)
+            records = [vector_record(doc, embedding, corpus) for doc, embedding in zip(batch, embeddings)]
+            futures = [executor.submit(index.upsert, vectors=records[start:start + upsert_batch])
+                       for start in range(0, len(records), upsert_batch)]
+            if pending:
+                finish(*pending)
+            pending = (futures, batch[-1]["_id"], len(batch))
+        if pending:
+            finish(*pending)
+
+    elapsed = time.perf_counter() - started
+    log(f"Indexed {indexed} {corpus} in {elapsed:.1f}s ({indexed / elapsed if elapsed else 0:.1f} docs/sec)")
+    return indexed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", nargs="+", choices=sorted(CORPORA), default=sorted(CORPORA))
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"))
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--upsert-batch", type=int, default=UPSERT_BATCH)
+    parser.add_argument("--upsert-workers", type=int, default=UPSERT_WORKERS)
+    parser.add_argument("--docs-per-batch", type=int, default=DOCS_PER_BATCH, help="Documents per checkpoint")
+    parser.add_argument("--embedding-workers", type=int, default=0,
+                        help="Encode in this many worker processes sharing one copy of the weights (0: in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--restart", action="store_true", help="Ignore checkpoints and index everything")
+    args = parser.parse_args(argv)
+
+    from jobs.connections import get_database, get_encoder, get_pinecone
+
+    db = get_database()
+    pinecone_client = get_pinecone()
+    model = get_encoder(args.model, args.embedding_workers, args.threads_per_worker)
+    try:
+        for corpus in args.corpus:
+            spec = CORPORA[corpus]
+            index_corpus(model, db[spec["collection"]], pinecone_client.Index(spec["index"]),
+                         db[CHECKPOINT_COLLECTION], corpus, args.encode_batch_size, args.upsert_batch,
+                         args.upsert_workers, args.docs_per_batch, args.restart)
+    finally:
+        if hasattr(model, "close"):
+            model.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
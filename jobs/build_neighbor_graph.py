@@ -0,0 +1,75 @@
+"""Precompute the law/judgment nearest-neighbor graph.
+
+Reads the stored e5 vectors of both indexes, finds the top-k neighbors of
+every item within its own corpus and in the other one, and writes one
+adjacency document per item to the `neighbors` collection:
+
+    {"_id": "laws:1000", "corpus": "laws", "key": 1000,
+     "laws": [{"key", "name", "score"}, ...], "judgments": [...], "run": ...}
+
+The browser pages read it with a single `_id` lookup per page of results.
+
+    python -m jobs.build_neighbor_graph --k 10
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timezone
+
+from pymongo import ReplaceOne
+
+from indexing import CORPORA
+from neighbor_graph import NEIGHBORS_COLLECTION, NEIGHBORS_K, adjacency, blocked_topk, load_index_vectors, node_id
+
+WRITE_BATCH = 1000
+
+
+def build_graph(pinecone_client, neighbors, k=NEIGHBORS_K, workers=None, log=print):
+    run = datetime.now(timezone.utc)
+    vectors = {}
+    for name, corpus in CORPORA.items():
+        started = time.perf_counter()
+        vectors[name] = load_index_vectors(pinecone_client.Index(corpus["index"]), corpus["key"])
+        log(f"Loaded {len(vectors[name][0])} {name} vectors in {time.perf_counter() - started:.1f}s")
+
+    written = 0
+    for source, (source_keys, _, source_matrix) in vectors.items():
+        edges = {}
+        for target, (target_keys, target_names, target_matrix) in vectors.items():
+            started = time.perf_counter()
+            ids, scores = blocked_topk(source_matrix, target_matrix, k, exclude_self=source == target,
+                                       workers=workers)
+            edges[target] = adjacency(source_keys, target_keys, target_names, ids, scores)
+            log(f"{source} -> {target}: {len(source_keys)} x {len(target_keys)} in "
+                f"{time.perf_counter() - started:.1f}s")
+
+        operations = [
+            ReplaceOne({"_id": node_id(source, key)}, {
+                "corpus": source, "key": key, **{target: edges[target][key] for target in edges}, "run": run,
+            }, upsert=True)
+            for key in source_keys
+        ]
+        for start in range(0, len(operations), WRITE_BATCH):
+            neighbors.bulk_write(operations[start:start + WRITE_BATCH], ordered=False)
+        written += len(operations)
+
+    # Items no longer in either index keep an older run stamp
+    removed = neighbors.delete_many({"run": {"$ne": run}}).deleted_count
+    log(f"Wrote {written} adjacency documents, removed {removed} stale ones")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=NEIGHBORS_K, help="Neighbors per item and corpus")
+    parser.add_argument("--workers", type=int, help="Parallel row blocks (default: all cores)")
+    args = parser.parse_args(argv)
+
+    from jobs.connections import get_database, get_pinecone
+
+    build_graph(get_pinecone(), get_database()[NEIGHBORS_COLLECTION], args.k, args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""Backend clients for offline jobs, built without importing the Streamlit app."""
+import os
+
+import pinecone
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+load_dotenv()
+
+
+def get_database(uri=None, name=None):
+    return MongoClient(uri or os.getenv("MONGO_URI"))[name or os.getenv("DATABASE_NAME")]
+
+
+def get_pinecone(api_key=None):
+    return pinecone.Pinecone(api_key=api_key or os.getenv("PINECONE_API_KEY"))
+
+
+def get_encoder(model_name, workers=0, threads_per_worker=1):
+    """SentenceTransformer in-process, or a pool of embedding worker processes when workers > 0."""
+    if workers:
+        from embedding_pool import EmbeddingPool
+
+        return EmbeddingPool(model_name, workers=workers, threads_per_worker=threads_per_worker)
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
@@ -0,0 +1,125 @@
+"""Index law Segments as passages in the `laws-segments` vector index.
+
+Segments are streamed one at a time from a server-side `$unwind`, split
+into windows, embedded in batches and upserted in parallel. Each vector
+carries IsraelLawID, segment index, chunk offsets and the clause text for
+highlighting. Progress is checkpointed as (law _id, segment index) in
+`index_checkpoints`, so an interrupted run resumes mid-law.
+
+Passages are embedded in INDEX_TEXT_FORMAT (see indexing.py); a checkpoint
+written in another format makes the run start over, so switching formats
+always rebuilds the whole index.
+
+    python -m jobs.index_law_segments --encode-batch-size 64 --embedding-workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from indexing import CORPORA, INDEX_TEXT_FORMAT
+from law_segments import SEGMENTS_INDEX, segment_records, stream_segments
+
+CHECKPOINT_COLLECTION = "index_checkpoints"
+CHECKPOINT_ID = "build:law_segments"
+PASSAGES_PER_BATCH = 512
+ENCODE_BATCH_SIZE = 64
+UPSERT_BATCH = 100
+UPSERT_WORKERS = 4
+
+
+def index_segments(model, collection, index, checkpoints, encode_batch_size=ENCODE_BATCH_SIZE,
+                   upsert_batch=UPSERT_BATCH, workers=UPSERT_WORKERS, passages_per_batch=PASSAGES_PER_BATCH,
+                   restart=False, log=print):
+    if restart:
+        checkpoints.delete_one({"_id": CHECKPOINT_ID})
+    checkpoint = checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+    # Checkpoints from before INDEX_TEXT_FORMAT were written with e5 prefixes
+    if checkpoint and checkpoint.get("text_format", "e5") != INDEX_TEXT_FORMAT:
+        log(f"Segments were indexed as {checkpoint.get('text_format', 'e5')!r} text, now {INDEX_TEXT_FORMAT!r}; "
+            f"rebuilding from the start")
+        checkpoint = {}
+    after = (checkpoint["law_id"], checkpoint["segment_index"]) if checkpoint else None
+    done = checkpoint.get("indexed", 0)
+    if after:
+        log(f"Resuming after law _id {after[0]}, segment {after[1]} ({done} passages already indexed)")
+
+    started = time.perf_counter()
+    indexed = 0
+    pending = None
+
+    def finish(futures, position, count):
+        nonlocal indexed
+        for future in futures:
+            future.result()
+        indexed += count
+        checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"law_id": position[0], "segment_index": position[1], "indexed": done + indexed,
+                      "text_format": INDEX_TEXT_FORMAT, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        log(f"  {done + indexed} passages indexed, {indexed / (time.perf_counter() - started):.1f} passages/sec")
+
+    def flush(batch, position):
+        nonlocal pending
+        embeddings = model.encode([text for _, text, _ in batch], batch_size=encode_batch_size,
+                                  normalize_embeddings=True, show_progress_bar=False)
+        records = [{"id": vector_id, "values": embedding.tolist(), "metadata": metadata}
+                   for (vector_id, _, metadata), embedding in zip(batch, embeddings)]
+        futures = [executor.submit(index.upsert, vectors=records[start:start + upsert_batch])
+                   for start in range(0, len(records), upsert_batch)]
+        if pending:
+            finish(*pending)
+        pending = (futures, position, len(batch))
+
+    batch, position = [], None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for row in stream_segments(collection, after):
+            batch.extend(segment_records(row))
+            position = (row["_id"], row["SegmentIndex"])
+            # Only cut batches on segment boundaries so the checkpoint never splits a segment
+            if len(batch) >= passages_per_batch:
+                flush(batch, position)
+                batch = []
+        if batch:
+            flush(batch, position)
+        if pending:
+            finish(*pending)
+
+    elapsed = time.perf_counter() - started
+    log(f"Indexed {indexed} passages in {elapsed:.1f}s ({indexed / elapsed if elapsed else 0:.1f} passages/sec)")
+    return indexed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"))
+    parser.add_argument("--encode-batch-size", type=int, default=ENCODE_BATCH_SIZE)
+    parser.add_argument("--upsert-batch", type=int, default=UPSERT_BATCH)
+    parser.add_argument("--upsert-workers", type=int, default=UPSERT_WORKERS)
+    parser.add_argument("--passages-per-batch", type=int, default=PASSAGES_PER_BATCH)
+    parser.add_argument("--embedding-workers", type=int, default=0,
+                        help="Encode in this many worker processes sharing one copy of the weights (0: in-process)")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and index everything")
+    args = parser.parse_args(argv)
+
+    from jobs.connections import get_database, get_encoder, get_pinecone
+
+    db = get_database()
+    model = get_encoder(args.model, args.embedding_workers, args.threads_per_worker)
+    try:
+        index_segments(model, db[CORPORA["laws"]["collection"]], get_pinecone().Index(SEGMENTS_INDEX),
+                       db[CHECKPOINT_COLLECTION], args.encode_batch_size, args.upsert_batch, args.upsert_workers,
+                       args.passages_per_batch, args.restart)
+    finally:
+        if hasattr(model, "close"):
+            model.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""Copy the search-card fields from Mongo into the vector index metadata.
+
+The finding pages render result cards straight from query metadata, so
+this job must run after new vectors are upserted (and whenever card fields
+change in Mongo). The same metadata carries the search filter fields
+(indexing.CORPORA "filters" and the date timestamp), so running it also
+backfills them onto older vectors. Vectors whose metadata already matches
+are skipped, so re-runs are cheap.
+
+    python -m jobs.sync_card_metadata --corpus judgments laws
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from indexing import CORPORA
+
+LIST_PAGE_SIZE = 100
+UPDATE_WORKERS = 8
+
+
+def _needs_update(metadata, card):
+    return any(metadata.get(field) != value for field, value in card.items())
+
+
+def sync_batch(index, collection, key, build_card, ids, executor):
+    """Refresh cards for one page of vector ids; returns (updated, missing)."""
+    metadata = {vector_id: vector["metadata"] or {} for vector_id, vector in index.fetch(ids=ids).vectors.items()}
+    keys = {vector_id: meta[key] for vector_id, meta in metadata.items() if key in meta}
+    docs = {doc[key]: doc for doc in collection.find({key: {"$in": list(set(keys.values()))}})}
+
+    updates, missing = [], 0
+    for vector_id, doc_key in keys.items():
+        doc = docs.get(doc_key)
+        if doc is None:
+            missing += 1
+            continue
+        card = build_card(doc)
+        if _needs_update(metadata[vector_id], card):
+            updates.append((vector_id, card))
+    list(executor.map(lambda update: index.update(id=update[0], set_metadata=update[1]), updates))
+    return len(updates), missing
+
+
+def sync_corpus(index, collection, key, build_card, workers=UPDATE_WORKERS, page_size=LIST_PAGE_SIZE, log=print):
+    seen = updated = missing = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for ids in index.list(limit=page_size):
+            batch_updated, batch_missing = sync_batch(index, collection, key, build_card, list(ids), executor)
+            seen += len(ids)
+            updated += batch_updated
+            missing += batch_missing
+            log(f"  {seen} vectors checked, {updated} updated, {missing} without a Mongo document")
+    log(f"  done in {time.perf_counter() - started:.1f}s")
+    return {"seen": seen, "updated": updated, "missing": missing}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", nargs="+", choices=sorted(CORPORA), default=sorted(CORPORA))
+    parser.add_argument("--workers", type=int, default=UPDATE_WORKERS)
+    args = parser.parse_args(argv)
+
+    from jobs.connections import get_database, get_pinecone
+
+    db = get_database()
+    pinecone_client = get_pinecone()
+    for name in args.corpus:
+        corpus = CORPORA[name]
+        print(f"Syncing {name} cards into {corpus['index']}...", flush=True)
+        sync_corpus(pinecone_client.Index(corpus["index"]), db[corpus["collection"]], corpus["key"],
+                    corpus["card"], workers=args.workers)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
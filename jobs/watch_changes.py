@@ -0,0 +1,186 @@
+"""Keep the vector indexes in step with Mongo by tailing its change stream.
+
+One database-level change stream covers `judgments` and `laws`. Events are
+gathered into micro-batches, and for each batch:
+
+* a document whose embedded text changed (by TextHash) is re-encoded and upserted;
+* a document where only card fields changed gets a metadata update, with no encoding;
+* a deleted document (or one whose key changed) has its vector removed.
+
+Updates that touch none of the indexed fields are dropped before any
+lookup. After each batch the resume token is saved to `index_checkpoints`,
+so a restart continues from the last applied change. Deletes need
+pre-images, which the job tries to enable on both collections.
+
+    python -m jobs.watch_changes --batch-size 64 --flush-interval 1
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import OperationFailure
+
+from indexing import CORPORA, passage_text, text_hash, vector_record
+
+CHECKPOINT_COLLECTION = "index_checkpoints"
+CHECKPOINT_ID = "changes"
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 1.0
+MAX_AWAIT_MS = 1000
+TOKEN_SAVE_INTERVAL = 60.0
+
+
+def enable_pre_images(db, log=print):
+    for corpus in CORPORA.values():
+        try:
+            db.command("collMod", corpus["collection"], changeStreamPreAndPostImages={"enabled": True})
+        except OperationFailure as e:
+            log(f"Could not enable pre-images on {corpus['collection']} ({e}); deletes may be missed")
+
+
+class ChangeIndexer:
+    """Collects change events and applies them to the vector indexes in micro-batches."""
+
+    def __init__(self, model, pinecone_client, checkpoints, batch_size=BATCH_SIZE, log=print):
+        self.model = model
+        self.checkpoints = checkpoints
+        self.batch_size = batch_size
+        self.log = log
+        self.indexes = {name: pinecone_client.Index(spec["index"]) for name, spec in CORPORA.items()}
+        self._corpus_by_collection = {spec["collection"]: name for name, spec in CORPORA.items()}
+        # (corpus, Mongo _id) -> latest change; later events replace earlier ones
+        self._pending = {}
+        self.stats = {"embedded": 0, "metadata_updates": 0, "deleted": 0, "skipped": 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def load_resume_token(self):
+        checkpoint = self.checkpoints.find_one({"_id": CHECKPOINT_ID}) or {}
+        return checkpoint.get("resume_token")
+
+    def save_resume_token(self, token):
+        self.checkpoints.update_one(
+            {"_id": CHECKPOINT_ID},
+            {"$set": {"resume_token": token, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    def add(self, change):
+        corpus = self._corpus_by_collection.get(change["ns"]["coll"])
+        if corpus is None:
+            return
+        if change["operationType"] == "update":
+            touched = set(change.get("updateDescription", {}).get("updatedFields", {}))
+            touched |= set(change.get("updateDescription", {}).get("removedFields", []))
+            indexed = {CORPORA[corpus]["key"], *CORPORA[corpus]["fields"]}
+            if not any(field.split(".")[0] in indexed for field in touched):
+                self.stats["skipped"] += 1
+                return
+        previous = self._pending.get((corpus, change["documentKey"]["_id"]))
+        if previous is not None:
+            # Keep the oldest pre-image (None after an insert) so a key change across several events is still seen
+            change = dict(change, fullDocumentBeforeChange=previous.get("fullDocumentBeforeChange"))
+        self._pending[(corpus, change["documentKey"]["_id"])] = change
+
+    def flush(self):
+        if not self._pending:
+            return
+        changes, self._pending = list(self._pending.items()), {}
+        for corpus, index in self.indexes.items():
+            key = CORPORA[corpus]["key"]
+            upserts, deletes = {}, set()
+            for (change_corpus, _), change in changes:
+                if change_corpus != corpus:
+                    continue
+                before = change.get("fullDocumentBeforeChange") or {}
+                after = change.get("fullDocument")
+                if before.get(key) is not None and (after is None or after.get(key) != before[key]):
+                    deletes.add(str(before[key]))
+                if after is not None and after.get(key) is not None:
+                    upserts[str(after[key])] = after
+            deletes -= set(upserts)
+            if deletes:
+                index.delete(ids=sorted(deletes))
+                self.stats["deleted"] += len(deletes)
+            if upserts:
+                self._apply_upserts(corpus, index, upserts)
+
+    def _apply_upserts(self, corpus, index, docs):
+        existing = {vector_id: vector["metadata"] or {}
+                    for vector_id, vector in index.fetch(ids=list(docs)).vectors.items()}
+        to_embed = []
+        for vector_id, doc in docs.items():
+            metadata = existing.get(vector_id)
+            if metadata is None or metadata.get("TextHash") != text_hash(doc):
+                to_embed.append(doc)
+                continue
+            card = CORPORA[corpus]["card"](doc)
+            if any(metadata.get(field) != value for field, value in card.items()):
+                index.update(id=vector_id, set_metadata=card)
+                self.stats["metadata_updates"] += 1
+            else:
+                self.stats["skipped"] += 1
+        if to_embed:
+            embeddings = self.model.encode([passage_text(doc) for doc in to_embed], normalize_embeddings=True,
+                                           show_progress_bar=False)
+            index.upsert(vectors=[vector_record(doc, embedding, corpus)
+                                  for doc, embedding in zip(to_embed, embeddings)])
+            self.stats["embedded"] += len(to_embed)
+
+    def run(self, db, flush_interval=FLUSH_INTERVAL):
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": list(self._corpus_by_collection)},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]},
+        }}]
+        token = self.load_resume_token()
+        self.log("Resuming change stream from saved token" if token else "Starting change stream from now")
+        with db.watch(pipeline, full_document="updateLookup", full_document_before_change="whenAvailable",
+                      resume_after=token, max_await_time_ms=MAX_AWAIT_MS) as stream:
+            first_pending = None
+            last_saved = time.monotonic()
+            while stream.alive:
+                # Blocks server-side for up to MAX_AWAIT_MS, so an idle stream costs one getMore per second
+                change = stream.try_next()
+                if change is not None:
+                    self.add(change)
+                    first_pending = first_pending or time.monotonic()
+                overdue = first_pending and time.monotonic() - first_pending >= flush_interval
+                if len(self) >= self.batch_size or overdue:
+                    started = time.perf_counter()
+                    count = len(self)
+                    self.flush()
+                    self.save_resume_token(stream.resume_token)
+                    last_saved = time.monotonic()
+                    first_pending = None
+                    self.log(f"Applied {count} changes in {time.perf_counter() - started:.2f}s {self.stats}")
+                elif change is None and time.monotonic() - last_saved > TOKEN_SAVE_INTERVAL:
+                    # Keep the saved token recent even when nothing changes
+                    self.save_resume_token(stream.resume_token)
+                    last_saved = time.monotonic()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL_NAME", "intfloat/multilingual-e5-large"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL,
+                        help="Max seconds a change waits before its batch is applied")
+    args = parser.parse_args(argv)
+
+    from sentence_transformers import SentenceTransformer
+
+    from jobs.connections import get_database, get_pinecone
+
+    db = get_database()
+    enable_pre_images(db)
+    indexer = ChangeIndexer(SentenceTransformer(args.model), get_pinecone(), db[CHECKPOINT_COLLECTION],
+                            args.batch_size)
+    indexer.run(db, args.flush_interval)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+from indexing import PASSAGE_PREFIX, normalize_key, timestamp, truncate_utf8
+
+SEGMENTS_INDEX = "laws-segments"
+# Long segments are split into overlapping windows; most clauses fit in one
+SEGMENT_CHARS = 1000
+SEGMENT_OVERLAP = 150
+SEGMENT_TEXT_BYTES = 2400
+NAME_BYTES = 600
+TEXT_FIELDS = ("Text", "Content", "Body", "text", "content")
+NUMBER_FIELDS = ("SectionNumber", "Number", "Title", "Header")
+
+
+def segment_text(segment):
+    """Plain text of one law segment; segments are strings or dicts with a text field."""
+    if isinstance(segment, str):
+        return segment
+    if isinstance(segment, dict):
+        for field in TEXT_FIELDS:
+            if isinstance(segment.get(field), str):
+                return segment[field]
+    return ""
+
+
+def segment_number(segment):
+    if isinstance(segment, dict):
+        for field in NUMBER_FIELDS:
+            if segment.get(field) not in (None, ""):
+                return str(segment[field])
+    return None
+
+
+def segment_windows(text):
+    """(start, end) offsets of the windows embedded for one segment."""
+    windows = []
+    position, step = 0, SEGMENT_CHARS - SEGMENT_OVERLAP
+    while position < len(text):
+        end = min(position + SEGMENT_CHARS, len(text))
+        if text[position:end].strip():
+            windows.append((position, end))
+        if end == len(text):
+            break
+        position += step
+    return windows
+
+
+def segment_records(row):
+    """Passages for one row of the `$unwind` stream as (vector id, text to embed, metadata)."""
+    law_id, segment_index, segment = row["IsraelLawID"], row["SegmentIndex"], row.get("Segments")
+    text = segment_text(segment)
+    number = segment_number(segment)
+    for start, end in segment_windows(text):
+        metadata = {
+            "IsraelLawID": law_id,
+            "LawName": truncate_utf8(str(row.get("Name", "")), NAME_BYTES),
+            "SegmentIndex": segment_index,
+            "ChunkStart": start,
+            "ChunkEnd": end,
+            "Text": truncate_utf8(text[start:end], SEGMENT_TEXT_BYTES),
+        }
+        if number:
+            metadata["SectionNumber"] = number
+        if timestamp(row.get("PublicationDate")) is not None:
+            # Lets the law search's date filter apply to clauses too
+            metadata["PublicationDateTimestamp"] = timestamp(row["PublicationDate"])
+        yield f"{law_id}:{segment_index}:{start}", f"{PASSAGE_PREFIX}{row.get('Name', '')}. {text[start:end]}", metadata
+
+
+def stream_segments(collection, after=None, batch_size=500):
+    """One row per law segment via a server-side `$unwind`, in (law _id, segment index) order.
+
+    The client never holds a whole law's Segments array; `after` is the
+    (law _id, segment index) of the last row already processed.
+    """
+    pipeline = []
+    if after is not None:
+        pipeline.append({"$match": {"_id": {"$gte": after[0]}}})
+    pipeline += [
+        {"$match": {"IsraelLawID": {"$exists": True}, "Segments.0": {"$exists": True}}},
+        {"$sort": {"_id": 1}},
+        {"$project": {"IsraelLawID": 1, "Name": 1, "PublicationDate": 1, "Segments": 1}},
+        {"$unwind": {"path": "$Segments", "includeArrayIndex": "SegmentIndex"}},
+    ]
+    if after is not None:
+        pipeline.append({"$match": {"$or": [
+            {"_id": {"$gt": after[0]}},
+            {"_id": after[0], "SegmentIndex": {"$gt": after[1]}},
+        ]}})
+    return collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+
+
+def aggregate_by_law(matches, max_laws=5, segments_per_law=3):
+    """Group segment matches into laws ranked by their best segment.
+
+    Returns [{"IsraelLawID", "Name", "score", "segments": [metadata + score]}].
+    """
+    laws = {}
+    for match in matches:
+        metadata = match.get("metadata") or {}
+        law_id = normalize_key(metadata.get("IsraelLawID"))
+        if law_id is None:
+            continue
+        law = laws.setdefault(law_id, {"IsraelLawID": law_id, "Name": metadata.get("LawName", ""),
+                                       "score": match["score"], "segments": []})
+        law["score"] = max(law["score"], match["score"])
+        if len(law["segments"]) < segments_per_law:
+            law["segments"].append(dict(metadata, score=match["score"]))
+    return sorted(laws.values(), key=lambda law: -law["score"])[:max_laws]
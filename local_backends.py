@@ -0,0 +1,158 @@
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from indexing import matches_filter
+
+
+class InMemoryIndex:
+    """Exact cosine-similarity index with the subset of Pinecone's Index API the app uses.
+
+    `latency` (seconds, or a zero-argument callable returning seconds) is
+    slept before every query, to stand in for network time in benchmarks;
+    `failure_rate` makes that fraction of queries raise ConnectionError.
+    Query `filter`s take Pinecone's metadata operators ($eq, $in, $gte, $and, ...).
+    """
+
+    def __init__(self, name, latency=0.0, failure_rate=0.0):
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._lock = threading.Lock()
+        self._ids = []
+        self._positions = {}
+        self._metadata = []
+        self._vectors = None
+
+    def _sleep(self):
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise ConnectionError(f"Injected failure querying {self.name}")
+
+    def upsert(self, vectors, namespace=None, **kwargs):
+        with self._lock:
+            existing = len(self._ids)
+            rows = []  # new vectors, stacked once at the end
+            for item in vectors:
+                if isinstance(item, dict):
+                    vector_id, values, metadata = item["id"], item["values"], item.get("metadata", {})
+                else:
+                    vector_id, values, metadata = (tuple(item) + ({},))[:3]
+                values = np.asarray(values, dtype=np.float32)
+                norm = np.linalg.norm(values)
+                values = values / norm if norm else values
+                if vector_id in self._positions:
+                    position = self._positions[vector_id]
+                    if position < existing:
+                        self._vectors[position] = values
+                    else:
+                        rows[position - existing] = values
+                    self._metadata[position] = dict(metadata)
+                    continue
+                self._positions[vector_id] = len(self._ids)
+                self._ids.append(vector_id)
+                self._metadata.append(dict(metadata))
+                rows.append(values)
+            if rows:
+                self._vectors = np.vstack(rows if self._vectors is None else [self._vectors, *rows])
+        return {"upserted_count": len(vectors)}
+
+    def update(self, id, set_metadata=None, values=None, namespace=None, **kwargs):
+        with self._lock:
+            position = self._positions[id]
+            if set_metadata:
+                self._metadata[position].update(set_metadata)
+            if values is not None:
+                values = np.asarray(values, dtype=np.float32)
+                self._vectors[position] = values / (np.linalg.norm(values) or 1.0)
+
+    def delete(self, ids=None, delete_all=False, namespace=None, **kwargs):
+        with self._lock:
+            if delete_all:
+                keep = []
+            else:
+                removed = set(ids or [])
+                keep = [i for i, vector_id in enumerate(self._ids) if vector_id not in removed]
+            self._ids = [self._ids[i] for i in keep]
+            self._metadata = [self._metadata[i] for i in keep]
+            self._vectors = self._vectors[keep] if keep and self._vectors is not None else None
+            self._positions = {vector_id: i for i, vector_id in enumerate(self._ids)}
+
+    def fetch(self, ids, namespace=None, **kwargs):
+        # Like Pinecone's FetchResponse: an object whose `vectors` maps id to a dict-like vector
+        with self._lock:
+            return SimpleNamespace(vectors={
+                vector_id: {
+                    "id": vector_id,
+                    "values": self._vectors[self._positions[vector_id]].tolist(),
+                    "metadata": dict(self._metadata[self._positions[vector_id]]),
+                }
+                for vector_id in ids if vector_id in self._positions
+            })
+
+    def list(self, prefix=None, limit=100, namespace=None, **kwargs):
+        with self._lock:
+            ids = [vector_id for vector_id in self._ids if not prefix or vector_id.startswith(prefix)]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def describe_index_stats(self, **kwargs):
+        with self._lock:
+            dimension = 0 if self._vectors is None else self._vectors.shape[1]
+            return {"dimension": dimension, "total_vector_count": len(self._ids)}
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None,
+              namespace=None, **kwargs):
+        self._sleep()
+        with self._lock:
+            if self._vectors is None:
+                return {"matches": []}
+            vectors, ids, metadata = self._vectors, list(self._ids), list(self._metadata)
+        if filter:
+            # Applied before ranking, like Pinecone, so a narrow filter still fills top_k
+            keep = [i for i, item in enumerate(metadata) if matches_filter(item, filter)]
+            vectors, ids, metadata = vectors[keep], [ids[i] for i in keep], [metadata[i] for i in keep]
+        scores = vectors @ np.asarray(vector, dtype=np.float32)
+        order = np.argsort(-scores)
+        matches = []
+        for position in order:
+            if len(matches) >= top_k:
+                break
+            match = {"id": ids[position], "score": float(scores[position])}
+            if include_metadata:
+                match["metadata"] = dict(metadata[position])
+            if include_values:
+                match["values"] = vectors[position].tolist()
+            matches.append(match)
+        return {"matches": matches}
+
+
+class _IndexList(list):
+    def names(self):
+        return list(self)
+
+
+class InMemoryPinecone:
+    """Stand-in for pinecone.Pinecone that hands out InMemoryIndex instances by name."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def Index(self, name, **kwargs):
+        with self._lock:
+            if name not in self._indexes:
+                self._indexes[name] = InMemoryIndex(name, latency=self.latency, failure_rate=self.failure_rate)
+            return self._indexes[name]
+
+    def list_indexes(self):
+        """Indexes that have been opened so far (an index exists here once anything touches it)."""
+        with self._lock:
+            return _IndexList(self._indexes)
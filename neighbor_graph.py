@@ -0,0 +1,103 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+from indexing import normalize_key, truncate_utf8
+
+NEIGHBORS_COLLECTION = "neighbors"
+NEIGHBORS_K = 10
+ROW_BLOCK = 512
+COLUMN_BLOCK = 16384
+FETCH_BATCH = 100
+NAME_BYTES = 300
+
+
+def node_id(corpus, key):
+    return f"{corpus}:{normalize_key(key)}"
+
+
+def load_index_vectors(index, key, batch_size=FETCH_BATCH):
+    """All (keys, names, normalized float32 matrix) stored in a vector index."""
+    keys, names, rows = [], [], []
+    for ids in index.list(limit=batch_size):
+        for vector in index.fetch(ids=list(ids)).vectors.values():
+            metadata = vector["metadata"] or {}
+            if key not in metadata:
+                continue
+            keys.append(normalize_key(metadata[key]))
+            names.append(metadata.get("Name", str(metadata[key])))
+            rows.append(vector["values"])
+    matrix = np.asarray(rows, dtype=np.float32).reshape(len(rows), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return keys, names, matrix / np.where(norms == 0, 1.0, norms)
+
+
+def _block_topk(queries, corpus, k, start, exclude_self, column_block):
+    rows = queries.shape[0]
+    best_scores = np.full((rows, 0), -np.inf, dtype=np.float32)
+    best_ids = np.empty((rows, 0), dtype=np.int64)
+    for column in range(0, corpus.shape[0], column_block):
+        scores = queries @ corpus[column:column + column_block].T
+        if exclude_self:
+            # Same corpus: row i of this block is item start + i
+            own = np.arange(start, start + rows) - column
+            inside = (own >= 0) & (own < scores.shape[1])
+            scores[np.nonzero(inside)[0], own[inside]] = -np.inf
+        ids = np.broadcast_to(np.arange(column, column + scores.shape[1]), scores.shape)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_ids = np.concatenate([best_ids, ids], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_ids = np.take_along_axis(best_ids, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def blocked_topk(queries, corpus, k=NEIGHBORS_K, exclude_self=False, row_block=ROW_BLOCK,
+                 column_block=COLUMN_BLOCK, workers=None):
+    """Top-k cosine neighbors in `corpus` for every row of `queries`.
+
+    Both matrices must be L2-normalized. Similarities are computed one
+    (row_block x column_block) tile at a time so memory stays bounded, and
+    row blocks run in parallel threads (NumPy releases the GIL in matmul).
+    Returns (ids, scores), each of shape (len(queries), min(k, candidates)).
+    """
+    k = min(k, corpus.shape[0] - (1 if exclude_self else 0))
+    if k <= 0 or not len(queries):
+        return np.empty((len(queries), 0), dtype=np.int64), np.empty((len(queries), 0), dtype=np.float32)
+    starts = range(0, queries.shape[0], row_block)
+    workers = workers or os.cpu_count() or 1
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        threadpool_limits = None
+    # One BLAS thread per worker instead of every worker fanning out to all cores
+    with threadpool_limits(1) if threadpool_limits else nullcontext():
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            blocks = list(executor.map(
+                lambda start: _block_topk(queries[start:start + row_block], corpus, k, start, exclude_self,
+                                          column_block),
+                starts,
+            ))
+    return np.vstack([ids for ids, _ in blocks]), np.vstack([scores for _, scores in blocks])
+
+
+def adjacency(source_keys, target_keys, target_names, ids, scores):
+    """Per source key, its neighbors as compact [{"key", "name", "score"}] lists."""
+    return {
+        source_key: [
+            {"key": target_keys[j], "name": truncate_utf8(target_names[j], NAME_BYTES), "score": round(float(s), 4)}
+            for j, s in zip(row_ids, row_scores)
+        ]
+        for source_key, row_ids, row_scores in zip(source_keys, ids, scores)
+    }
+
+
+def get_related(collection, corpus, keys):
+    """{key: {"laws": [...], "judgments": [...]}} for one page of items, in a single `$in` lookup."""
+    ids = [node_id(corpus, key) for key in keys]
+    related = {doc["key"]: doc for doc in collection.find({"_id": {"$in": ids}})}
+    return {key: related.get(key, {}) for key in keys}
@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+
+from tracing import span
+
+# Lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Per-model request/token rates and concurrent request caps for the whole process.
+# Override with OPENAI_LIMITS='{"gpt-4": {"rpm": 200, "tpm": 40000, "concurrency": 8}}'
+DEFAULT_LIMITS = {
+    "gpt-4": {"rpm": 500, "tpm": 300000, "concurrency": 16},
+    "gpt-3.5-turbo": {"rpm": 3500, "tpm": 1000000, "concurrency": 32},
+}
+FALLBACK_LIMITS = {"rpm": 500, "tpm": 200000, "concurrency": 16}
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+def load_limits():
+    limits = {model: dict(values) for model, values in DEFAULT_LIMITS.items()}
+    for model, values in json.loads(os.getenv("OPENAI_LIMITS", "{}")).items():
+        limits.setdefault(model, dict(FALLBACK_LIMITS)).update(values)
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, burst_seconds=10):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount):
+        """Seconds until `amount` tokens are available."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class ModelLimiter:
+    """Token buckets (requests and tokens per minute) plus a concurrency cap.
+
+    Waiters are served strictly in (priority, arrival) order, so interactive
+    requests overtake queued bulk work.
+    """
+
+    def __init__(self, rpm, tpm, concurrency):
+        self.concurrency = concurrency
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._active = 0
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def acquire(self, priority, cost):
+        entry = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    if self._waiters[0] == entry and self._active < self.concurrency:
+                        wait = max(self._requests.delay(1), self._tokens.delay(cost))
+                        if wait <= 0:
+                            self._requests.take(1)
+                            self._tokens.take(cost)
+                            heapq.heappop(self._waiters)
+                            self._active += 1
+                            self._condition.notify_all()
+                            return
+                        self._condition.wait(wait)
+                    else:
+                        self._condition.wait()
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+                raise
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+
+def estimate_tokens(kwargs):
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in kwargs.get("messages", []))
+    # Hebrew averages roughly 3 characters per token
+    return prompt_chars // 3 + (kwargs.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class _GovernedCompletions:
+    def __init__(self, governor, completions):
+        self._governor = governor
+        self._completions = completions
+
+    def create(self, *args, priority=PRIORITY_INTERACTIVE, **kwargs):
+        model = kwargs.get("model", "default")
+        limiter = self._governor.limiter(model)
+        with span(f"openai.queue_wait.{model}"):
+            limiter.acquire(priority, estimate_tokens(kwargs))
+        try:
+            return self._completions.create(*args, **kwargs)
+        finally:
+            limiter.release()
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _GovernedChat:
+    def __init__(self, governor, chat):
+        self.completions = _GovernedCompletions(governor, chat.completions)
+        self._chat = chat
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class GovernedOpenAI:
+    """Process-wide OpenAI client whose chat completions go through per-model limiters.
+
+    `chat.completions.create` accepts an extra `priority` argument
+    (PRIORITY_INTERACTIVE or PRIORITY_BULK); time spent queued is recorded
+    as the `openai.queue_wait.<model>` tracing stage.
+    """
+
+    def __init__(self, client, limits=None):
+        self._client = client
+        self._limits = limits or load_limits()
+        self._limiters = {}
+        self._lock = threading.Lock()
+        self.chat = _GovernedChat(self, client.chat)
+
+    def limiter(self, model):
+        with self._lock:
+            if model not in self._limiters:
+                self._limiters[model] = ModelLimiter(**self._limits.get(model, FALLBACK_LIMITS))
+            return self._limiters[model]
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
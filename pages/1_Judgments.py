@@ -3,6 +3,7 @@ import streamlit as st
 st.set_page_config(page_title="Mini Lawyer - Judgments", page_icon="📜", layout="wide")
 
 from app_resources import mongo_client
+from neighbor_graph import NEIGHBORS_COLLECTION, get_related
 from dotenv import load_dotenv
 import os
 from datetime import datetime
@@ -14,6 +15,8 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI')
 DATABASE_NAME = os.getenv('DATABASE_NAME')
 COLLECTION_NAME = "judgments"
+CORPUS = "judgments"
+RELATED_SECTIONS = [("Related laws", "laws"), ("Similar judgments", "judgments")]
 
 
 # Custom CSS for Styling
@@ -109,6 +112,26 @@ def count_judgments(client, filters=None):
         return 0
 
 
+# Precomputed related items (jobs/build_neighbor_graph.py), one lookup per page
+def load_related(client, keys):
+    try:
+        return get_related(client[DATABASE_NAME][NEIGHBORS_COLLECTION], CORPUS, keys)
+    except Exception as e:
+        st.error(f"Error loading related items: {str(e)}")
+        return {}
+
+
+def show_related(related):
+    sections = [(label, related.get(corpus)) for label, corpus in RELATED_SECTIONS if related.get(corpus)]
+    if not sections:
+        return
+    with st.expander("Related laws and judgments"):
+        for label, items in sections:
+            st.markdown(f"**{label}**")
+            st.markdown("\n".join(f"- {item['name']} (ID: {item['key']}, similarity {item['score']:.2f})"
+                                  for item in items))
+
+
 def main():
     st.title("📜 Judgments Searching")
 
@@ -158,6 +181,7 @@ def main():
 
     if judgments:
         st.markdown(f"### Page {page} (Showing {len(judgments)} of {total_judgments} judgments)")
+        related = load_related(client, [judgment["CaseNumber"] for judgment in judgments])
         for judgment in judgments:
             judgment_description = judgment.get("Description", "").strip() or "אין תיאור לפסק הדין זה"
             with st.container():
@@ -169,6 +193,7 @@ def main():
                         <div class="law-meta">Procedure Type: {judgment.get('ProcedureType', 'N/A')}</div>
                     </div>
                 """, unsafe_allow_html=True)
+                show_related(related.get(judgment["CaseNumber"], {}))
 
                 col1, col2 = st.columns([1, 1])
                 with col1:
@@ -8,9 +8,14 @@ import torch
 # Fix for torch.classes error
 torch.classes.__path__ = []
 
-from app_resources import model, mongo_client, pinecone_client
-from openai import OpenAI
+from app_resources import model, mongo_client, openai_client, get_explanation_executor, get_index, get_semantic_cache
 import json
+from indexing import CORPORA, has_card, judgment_card, query_text, vector_filter
+from openai_governor import PRIORITY_BULK
+from progressive import explain_results
+from resilient_index import QueryFailed
+from single_flight import coalesced, flights, normalize_text, options_key
+from tracing import trace_request, show_waterfall
 
 # Set page config
 
@@ -20,13 +25,15 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 # Constants
 INDEX_NAME = "judgments-names"
 COLLECTION_NAME = "judgments"
-OPENAI_API_KEY = os.getenv("OPEN_AI")
-
-# OpenAI Client
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 # Pinecone Index
-index = pinecone_client.Index(INDEX_NAME)
+index = get_index(INDEX_NAME)
+
+# Results of earlier, near-identical scenarios
+semantic_cache = get_semantic_cache(INDEX_NAME)
+
+# Explanations run here while the cards are already on screen
+explanation_executor = get_explanation_executor()
 
 # MongoDB Collection
 db = mongo_client[os.getenv("DATABASE_NAME")]
@@ -83,6 +90,11 @@ def load_full_judgment_details(case_number):
 
 
 # === Get GPT Explanation for Why the Judgment Helps ===
+# Identical scenarios explaining the same judgment at the same moment share one GPT call
+@coalesced(lambda scenario, judgment_doc: (
+    "openai.explanation", "judgment", normalize_text(scenario),
+    judgment_doc.get("Name", ""), judgment_doc.get("Description", ""),
+))
 def get_judgment_explanation(scenario, judgment_doc):
     judgment_name = judgment_doc.get("Name", "")
     judgment_desc = judgment_doc.get("Description", "")
@@ -105,64 +117,163 @@ def get_judgment_explanation(scenario, judgment_doc):
         response = openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+            temperature=0.7,
+            priority=PRIORITY_BULK,
         )
         output = response.choices[0].message.content.strip()
         return json.loads(output)
     except Exception as e:
-        st.error(f"Error getting judgment explanation: {e}")
-        return {"advice": "לא ניתן לקבל הסבר בשלב זה.", "score": "N/A"}
+        # Reported by render_judgment; this may run on a cache refresh thread
+        return {"advice": "לא ניתן לקבל הסבר בשלב זה.", "score": "N/A", "error": str(e)}
+
+
+# === Filter options (values stored as vector metadata; see indexing.judgment_card) ===
+@st.cache_data(show_spinner=False, ttl=3600)
+def load_filter_options():
+    return {field: sorted(value for value in collection.distinct(field) if isinstance(value, str) and value.strip())
+            for field in CORPORA["judgments"]["filters"]}
+
+
+# === Search pipeline (no Streamlit calls, so cached results can be refreshed in the background) ===
+def find_judgment_cards(query_embedding, search_filter=None):
+    """Ranked judgment cards, with explanations still to come.
+
+    The filter is applied inside the vector query, so narrow searches still return a full top_k.
+    """
+    query_response = index.query(
+        vector=query_embedding.tolist(),
+        top_k=5,
+        include_metadata=True,
+        filter=search_filter
+    )
+    results = []
+    for match in (query_response.get("matches") or []) if query_response else []:
+        metadata = match.get("metadata", {})
+        case_number = metadata.get("CaseNumber")
+        if case_number is None:
+            continue
+        # Cards come from vector metadata (jobs/sync_card_metadata.py); Mongo only for unsynced vectors
+        if has_card(metadata):
+            card = metadata
+        else:
+            judgment_doc = flights.do(("mongo.hydrate", COLLECTION_NAME, case_number),
+                                      collection.find_one, {"CaseNumber": case_number})
+            card = judgment_card(judgment_doc) if judgment_doc else None
+        results.append({"id": case_number, "card": card, "explanation": None})
+    return results
+
+
+def find_suitable_judgments(scenario, query_embedding, search_filter=None):
+    """Ranked judgment cards with explanations, as (results, cacheable)."""
+    results = find_judgment_cards(query_embedding, search_filter)
+    return results, explain_results(explanation_executor, get_judgment_explanation, scenario, results)
+
+
+def count_llm_calls(results):
+    return sum(1 for r in results if r["explanation"])
+
+
+def render_explanation(slot, explanation):
+    with slot.container():
+        if explanation.get("error"):
+            st.error(f"Error getting judgment explanation: {explanation['error']}")
+        advice = explanation.get("advice", "")
+        score = explanation.get("score", "N/A")
+        st.markdown(f"""
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <span style="color: red;">עצת האתר: {advice}</span>
+                <span style="font-size: 24px; font-weight: bold; color: red;">{score}/10</span>
+            </div>
+        """, unsafe_allow_html=True)
+
+
+def render_judgment(result):
+    """Render one result; returns the placeholder its explanation goes into."""
+    case_number, judgment_doc, explanation = result["id"], result["card"], result["explanation"]
+    if not judgment_doc:
+        st.warning(f"No document found for CaseNumber: {case_number}")
+        return None
+    name = judgment_doc.get("Name", "No Name")
+    description = judgment_doc.get("Description", "אין תיאור לפסק הדין זה")
+    decision_date = judgment_doc.get("DecisionDate", "N/A")
+    procedure_type = judgment_doc.get("ProcedureType", "N/A")
+    st.markdown(f"""
+        <div class="law-card">
+            <div class="law-title">{name} (ID: {case_number})</div>
+            <div class="law-description">{description}</div>
+            <div class="law-meta">Decision Date: {decision_date}</div>
+            <div class="law-meta">Procedure Type: {procedure_type}</div>
+        </div>
+    """, unsafe_allow_html=True)
+    slot = st.empty()
+    if explanation:
+        render_explanation(slot, explanation)
+    else:
+        slot.markdown("""
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <span style="color: #999;">עצת האתר: ⏳ מכין הסבר...</span>
+                <span style="font-size: 24px; font-weight: bold; color: #999;">…/10</span>
+            </div>
+        """, unsafe_allow_html=True)
+    if st.button(f"View Full Details for {case_number}", key=f"details_{case_number}"):
+        with st.spinner("Loading full details..."):
+            st.json(load_full_judgment_details(case_number))
+    return slot
 
 
 # === Main Interface ===
 st.title("Finding Suitable Judgments")
 scenario = st.text_area("Describe your scenario (what you plan to do, your situation, etc.):")
+with st.expander("Filters"):
+    filter_options = load_filter_options()
+    selections = {
+        "CourtType": st.multiselect("Court Type", filter_options["CourtType"]),
+        "ProcedureType": st.multiselect("Procedure Type", filter_options["ProcedureType"]),
+        "District": st.multiselect("District", filter_options["District"]),
+    }
+    date_range = st.date_input("Decision Date Range", [])
+search_filter = vector_filter("judgments", selections, tuple(date_range) if len(date_range) == 2 else None)
+# Filtered and unfiltered searches never share cache entries
+cache_namespace = options_key(search_filter) if search_filter else None
 
 if st.button("Find Suitable Judgments") and scenario:
-    with st.spinner("Generating query embedding..."):
-        query_embedding = model.encode([scenario], normalize_embeddings=True)[0]
-    with st.spinner("Querying Pinecone for similar judgments..."):
-        query_response = index.query(
-            vector=query_embedding.tolist(),
-            top_k=5,
-            include_metadata=True
-        )
+    with trace_request("find_suitable_judgments") as trace:
+        with st.spinner("Generating query embedding..."):
+            query_embedding = model.encode([query_text(scenario)], normalize_embeddings=True)[0]
+        with st.spinner("Finding similar judgments..."):
+            try:
+                cache_hit = semantic_cache.lookup(query_embedding, cache_namespace)
+                if cache_hit:
+                    results = cache_hit.value
+                    semantic_cache.refresh_if_stale(
+                        cache_hit, query_embedding,
+                        lambda: find_suitable_judgments(scenario, query_embedding, search_filter),
+                        scenario=scenario, llm_calls=count_llm_calls, namespace=cache_namespace,
+                    )
+                else:
+                    results = find_judgment_cards(query_embedding, search_filter)
+            except QueryFailed as e:
+                results, cache_hit = None, None
+                st.error(f"Search is temporarily unavailable, please try again in a moment. ({e})")
 
-    if query_response and query_response.get("matches"):
-        st.markdown("### Suitable Judgments Found:")
-        for match in query_response["matches"]:
-            metadata = match.get("metadata", {})
-            case_number = metadata.get("CaseNumber")
-            if case_number is None:
-                continue
-            judgment_doc = load_full_judgment_details(case_number)
-            if judgment_doc:
-                name = judgment_doc.get("Name", "No Name")
-                description = judgment_doc.get("Description", "אין תיאור לפסק הדין זה")
-                decision_date = judgment_doc.get("DecisionDate", "N/A")
-                procedure_type = judgment_doc.get("ProcedureType", "N/A")
-                st.markdown(f"""
-                    <div class="law-card">
-                        <div class="law-title">{name} (ID: {case_number})</div>
-                        <div class="law-description">{description}</div>
-                        <div class="law-meta">Decision Date: {decision_date}</div>
-                        <div class="law-meta">Procedure Type: {procedure_type}</div>
-                    </div>
-                """, unsafe_allow_html=True)
-                with st.spinner("Getting site advice..."):
-                    result = get_judgment_explanation(scenario, judgment_doc)
-                    advice = result.get("advice", "")
-                    score = result.get("score", "N/A")
-                st.markdown(f"""
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <span style="color: red;">עצת האתר: {advice}</span>
-                        <span style="font-size: 24px; font-weight: bold; color: red;">{score}/10</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                if st.button(f"View Full Details for {case_number}", key=f"details_{case_number}"):
-                    with st.spinner("Loading full details..."):
-                        st.json(judgment_doc)
-            else:
-                st.warning(f"No document found for CaseNumber: {case_number}")
-    else:
-        st.info("No similar judgments found.")
+        if cache_hit:
+            st.caption(f"Results from a very similar earlier search ({cache_hit.similarity:.0%} match).")
+        slots = []
+        if results:
+            st.markdown("### Suitable Judgments Found:")
+            # Cards go up first; each explanation fills its slot as soon as it is ready
+            slots = [render_judgment(result) for result in results]
+        elif results is not None:
+            st.info("No similar judgments found." if not search_filter else
+                    "No similar judgments match these filters.")
+        if results is not None and not cache_hit:
+            cacheable = explain_results(explanation_executor, get_judgment_explanation, scenario, results,
+                                        on_ready=lambda i, result: render_explanation(slots[i], result["explanation"]))
+            if cacheable:
+                semantic_cache.store(query_embedding, results, scenario, count_llm_calls(results), cache_namespace)
+    show_waterfall(trace, force=st.query_params.get("debug") == "trace")
+    if st.query_params.get("debug") == "trace":
+        st.sidebar.markdown("**Semantic cache**")
+        st.sidebar.json(semantic_cache.stats())
+        st.sidebar.markdown("**Single-flight**")
+        st.sidebar.json(flights.stats())
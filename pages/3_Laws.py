@@ -3,6 +3,7 @@ st.set_page_config(page_title="Mini Lawyer - Laws", page_icon="📜", layout="wi
 
 
 from app_resources import mongo_client
+from neighbor_graph import NEIGHBORS_COLLECTION, get_related
 from dotenv import load_dotenv
 import os
 from datetime import datetime
@@ -14,6 +15,8 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI')
 DATABASE_NAME = os.getenv('DATABASE_NAME')
 COLLECTION_NAME = "laws"
+CORPUS = "laws"
+RELATED_SECTIONS = [("Related judgments", "judgments"), ("Similar laws", "laws")]
 
 
 # Custom CSS for Styling
@@ -115,6 +118,24 @@ def load_full_law_details(client, law_id):
         st.error(f"Error fetching full details for law ID {law_id}: {str(e)}")
         return None
 
+# Precomputed related items (jobs/build_neighbor_graph.py), one lookup per page
+def load_related(client, keys):
+    try:
+        return get_related(client[DATABASE_NAME][NEIGHBORS_COLLECTION], CORPUS, keys)
+    except Exception as e:
+        st.error(f"Error loading related items: {str(e)}")
+        return {}
+
+def show_related(related):
+    sections = [(label, related.get(corpus)) for label, corpus in RELATED_SECTIONS if related.get(corpus)]
+    if not sections:
+        return
+    with st.expander("Related laws and judgments"):
+        for label, items in sections:
+            st.markdown(f"**{label}**")
+            st.markdown("\n".join(f"- {item['name']} (ID: {item['key']}, similarity {item['score']:.2f})"
+                                  for item in items))
+
 # Function to reset page to 1
 def reset_page():
     st.session_state["page"] = 1
@@ -175,6 +196,7 @@ def main():
 
     if laws:
         st.markdown(f"### Page {page} (Showing {len(laws)} of {total_laws} laws)")
+        related = load_related(client, [law["IsraelLawID"] for law in laws])
         for law in laws:
             law_description = law.get("Description", "").strip() or "אין תיאור לחוק זה"
             with st.container():
@@ -185,6 +207,7 @@ def main():
                         <div class="law-meta">Publication Date: {law.get('PublicationDate', 'N/A')}</div>
                     </div>
                 """, unsafe_allow_html=True)
+                show_related(related.get(law["IsraelLawID"], {}))
 
                 if st.button(f"View Full Details for {law['IsraelLawID']}", key=f"details_{law['IsraelLawID']}"):
                     with st.spinner("Loading full details..."):
@@ -6,9 +6,17 @@ import torch
 
 torch.classes.__path__ = []
 
-from app_resources import model, pinecone_client, mongo_client
-from openai import OpenAI
+from app_resources import (model, get_explanation_executor, get_index, get_optional_index, get_semantic_cache,
+                           mongo_client, openai_client)
+import html
 import json
+from indexing import has_card, law_card, normalize_key, query_text, vector_filter
+from law_segments import SEGMENTS_INDEX, aggregate_by_law
+from openai_governor import PRIORITY_BULK
+from progressive import explain_results
+from resilient_index import QueryFailed
+from single_flight import coalesced, flights, normalize_text, options_key
+from tracing import trace_request, show_waterfall
 
 # Set page config
 
@@ -18,17 +26,23 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 # Constants
 INDEX_NAME = "laws-names"
 COLLECTION_NAME = "laws"
-OPENAI_API_KEY = os.getenv("OPEN_AI")
-
-# OpenAI Client
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
+TOP_LAWS = 5
+SEGMENT_CANDIDATES = 30
 
 # MongoDB Collection
 db = mongo_client[os.getenv("DATABASE_NAME")]
 collection = db[COLLECTION_NAME]
 
 # Pinecone Index
-index = pinecone_client.Index(INDEX_NAME)
+index = get_index(INDEX_NAME)
+# None until jobs/index_law_segments.py has built it; search stays law-level
+segment_index = get_optional_index(SEGMENTS_INDEX)
+
+# Results of earlier, near-identical scenarios
+semantic_cache = get_semantic_cache(INDEX_NAME)
+
+# Explanations run here while the cards are already on screen
+explanation_executor = get_explanation_executor()
 
 # === Styling ===
 st.markdown("""
@@ -55,6 +69,13 @@ st.markdown("""
             font-size: 14px;
             color: #555;
         }
+        .law-segment {
+            font-size: 14px;
+            color: #333;
+            border-right: 3px solid #7ce38b;
+            padding: 4px 10px;
+            margin: 6px 0;
+        }
         .stButton>button {
             background-color: #7ce38b;
             color: white;
@@ -79,6 +100,11 @@ def load_full_law_details(law_id):
         return None
 
 # === Get GPT Explanation for Why the Law Helps ===
+# Identical scenarios explaining the same law at the same moment share one GPT call
+@coalesced(lambda scenario, law_doc: (
+    "openai.explanation", "law", normalize_text(scenario),
+    law_doc.get("Name", ""), law_doc.get("Description", ""),
+))
 def get_law_explanation(scenario, law_doc):
     law_name = law_doc.get("Name", "")
     law_desc = law_doc.get("Description", "")
@@ -101,60 +127,181 @@ def get_law_explanation(scenario, law_doc):
         response = openai_client.chat.completions.create(
             model="gpt-3.5-turbo",
             messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
+            temperature=0.7,
+            priority=PRIORITY_BULK,
         )
         output = response.choices[0].message.content.strip()
         return json.loads(output)
     except Exception as e:
-        st.error(f"Error getting law explanation: {e}")
-        return {"advice": "לא ניתן לקבל הסבר בשלב זה.", "score": "N/A"}
+        # Reported by render_law; this may run on a cache refresh thread
+        return {"advice": "לא ניתן לקבל הסבר בשלב זה.", "score": "N/A", "error": str(e)}
+
+# === Search pipeline (no Streamlit calls, so cached results can be refreshed in the background) ===
+def find_relevant_segments(query_embedding, search_filter=None):
+    """Laws ranked by their best-matching Segments passages."""
+    if segment_index is None:
+        return []
+    try:
+        response = segment_index.query(
+            vector=query_embedding.tolist(),
+            top_k=SEGMENT_CANDIDATES,
+            include_metadata=True,
+            filter=search_filter
+        )
+    except QueryFailed:
+        # The passage index is optional (jobs/index_law_segments.py); fall back to law-level results
+        return []
+    return aggregate_by_law(response.get("matches") or [], max_laws=TOP_LAWS)
+
+def find_law_cards(query_embedding, search_filter=None):
+    """Ranked law cards with their matching clauses, with explanations still to come.
+
+    The filter is applied inside both vector queries, so narrow searches still return a full TOP_LAWS.
+    """
+    query_response = index.query(
+        vector=query_embedding.tolist(),
+        top_k=TOP_LAWS,
+        include_metadata=True,
+        filter=search_filter
+    )
+    # Merge law-level and clause-level matches; a law ranks by whichever matched better
+    candidates = {}
+    for match in (query_response.get("matches") or []) if query_response else []:
+        metadata = match.get("metadata", {})
+        israel_law_id = normalize_key(metadata.get("IsraelLawID"))
+        if israel_law_id is None:
+            continue
+        candidates[israel_law_id] = {"score": match["score"], "metadata": metadata, "segments": []}
+    for law in find_relevant_segments(query_embedding, search_filter):
+        candidate = candidates.setdefault(law["IsraelLawID"], {"score": law["score"], "metadata": None})
+        candidate["score"] = max(candidate["score"], law["score"])
+        candidate["segments"] = law["segments"]
+    ranked = sorted(candidates.items(), key=lambda item: -item[1]["score"])[:TOP_LAWS]
+
+    # Laws found only through their clauses take their card from the law-level index
+    missing = [str(law_id) for law_id, candidate in ranked if candidate["metadata"] is None]
+    fetched = index.fetch(ids=missing).vectors if missing else {}
+
+    results = []
+    for israel_law_id, candidate in ranked:
+        metadata = candidate["metadata"]
+        if metadata is None and str(israel_law_id) in fetched:
+            metadata = fetched[str(israel_law_id)]["metadata"]
+        # Cards come from vector metadata (jobs/sync_card_metadata.py); Mongo only for unsynced vectors
+        if has_card(metadata):
+            card = metadata
+        else:
+            law_doc = flights.do(("mongo.hydrate", COLLECTION_NAME, israel_law_id),
+                                 collection.find_one, {"IsraelLawID": israel_law_id})
+            card = law_card(law_doc) if law_doc else None
+        results.append({"id": israel_law_id, "card": card, "explanation": None, "segments": candidate["segments"]})
+    return results
+
+def find_suitable_laws(scenario, query_embedding, search_filter=None):
+    """Ranked law cards with matching clauses and explanations, as (results, cacheable)."""
+    results = find_law_cards(query_embedding, search_filter)
+    return results, explain_results(explanation_executor, get_law_explanation, scenario, results)
+
+def count_llm_calls(results):
+    return sum(1 for r in results if r["explanation"])
+
+def render_explanation(slot, explanation):
+    with slot.container():
+        if explanation.get("error"):
+            st.error(f"Error getting law explanation: {explanation['error']}")
+        advice = explanation.get("advice", "")
+        score = explanation.get("score", "N/A")
+        st.markdown(f"""
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <span style="color: red;">עצת האתר: {advice}</span>
+                <span style="font-size: 24px; font-weight: bold; color: red;">{score}/10</span>
+            </div>
+        """, unsafe_allow_html=True)
+
+def render_law(result):
+    """Render one result; returns the placeholder its explanation goes into."""
+    israel_law_id, law_doc, explanation = result["id"], result["card"], result["explanation"]
+    if not law_doc:
+        st.warning(f"No document found for IsraelLawID: {israel_law_id}")
+        return None
+    name = law_doc.get("Name", "No Name")
+    description = law_doc.get("Description", "אין תיאור לחוק זה")
+    publication_date = law_doc.get("PublicationDate", "N/A")
+    st.markdown(f"""
+        <div class="law-card">
+            <div class="law-title">{name} (ID: {israel_law_id})</div>
+            <div class="law-description">{description}</div>
+            <div class="law-meta">Publication Date: {publication_date}</div>
+        </div>
+    """, unsafe_allow_html=True)
+    if result.get("segments"):
+        clauses = "".join(
+            f'<div class="law-segment"><mark>{segment.get("SectionNumber", "")}</mark> '
+            f'{html.escape(segment["Text"])}</div>'
+            for segment in result["segments"]
+        )
+        st.markdown(f'<div class="law-meta">Best matching clauses:</div>{clauses}', unsafe_allow_html=True)
+    slot = st.empty()
+    if explanation:
+        render_explanation(slot, explanation)
+    else:
+        slot.markdown("""
+            <div style="display: flex; justify-content: space-between; align-items: center;">
+                <span style="color: #999;">עצת האתר: ⏳ מכין הסבר...</span>
+                <span style="font-size: 24px; font-weight: bold; color: #999;">…/10</span>
+            </div>
+        """, unsafe_allow_html=True)
+    if st.button(f"View Full Details for {israel_law_id}", key=f"details_{israel_law_id}"):
+        with st.spinner("Loading full details..."):
+            st.json(load_full_law_details(israel_law_id))
+    return slot
 
 # === Main Interface ===
 st.title("Finding Suitable Law")
 scenario = st.text_area("Describe your scenario (what you plan to do, your situation, etc.):")
+with st.expander("Filters"):
+    date_range = st.date_input("Publication Date Range", [])
+search_filter = vector_filter("laws", date_range=tuple(date_range) if len(date_range) == 2 else None)
+# Filtered and unfiltered searches never share cache entries
+cache_namespace = options_key(search_filter) if search_filter else None
 
 if st.button("Find Suitable Laws") and scenario:
-    with st.spinner("Generating query embedding..."):
-        query_embedding = model.encode([scenario], normalize_embeddings=True)[0]
-    with st.spinner("Querying Pinecone for similar laws..."):
-        query_response = index.query(
-            vector=query_embedding.tolist(),
-            top_k=5,
-            include_metadata=True
-        )
-    if query_response and query_response.get("matches"):
-        st.markdown("### Suitable Laws Found:")
-        for match in query_response["matches"]:
-            metadata = match.get("metadata", {})
-            israel_law_id = metadata.get("IsraelLawID")
-            if israel_law_id is None:
-                continue
-            law_doc = load_full_law_details(israel_law_id)
-            if law_doc:
-                name = law_doc.get("Name", "No Name")
-                description = law_doc.get("Description", "אין תיאור לחוק זה")
-                publication_date = law_doc.get("PublicationDate", "N/A")
-                st.markdown(f"""
-                    <div class="law-card">
-                        <div class="law-title">{name} (ID: {israel_law_id})</div>
-                        <div class="law-description">{description}</div>
-                        <div class="law-meta">Publication Date: {publication_date}</div>
-                    </div>
-                """, unsafe_allow_html=True)
-                with st.spinner("Getting site advice..."):
-                    result = get_law_explanation(scenario, law_doc)
-                    advice = result.get("advice", "")
-                    score = result.get("score", "N/A")
-                st.markdown(f"""
-                    <div style="display: flex; justify-content: space-between; align-items: center;">
-                        <span style="color: red;">עצת האתר: {advice}</span>
-                        <span style="font-size: 24px; font-weight: bold; color: red;">{score}/10</span>
-                    </div>
-                """, unsafe_allow_html=True)
-                if st.button(f"View Full Details for {israel_law_id}", key=f"details_{israel_law_id}"):
-                    with st.spinner("Loading full details..."):
-                        st.json(law_doc)
-            else:
-                st.warning(f"No document found for IsraelLawID: {israel_law_id}")
-    else:
-        st.info("No similar laws found.")
+    with trace_request("find_suitable_laws") as trace:
+        with st.spinner("Generating query embedding..."):
+            query_embedding = model.encode([query_text(scenario)], normalize_embeddings=True)[0]
+        with st.spinner("Finding similar laws..."):
+            try:
+                cache_hit = semantic_cache.lookup(query_embedding, cache_namespace)
+                if cache_hit:
+                    results = cache_hit.value
+                    semantic_cache.refresh_if_stale(
+                        cache_hit, query_embedding,
+                        lambda: find_suitable_laws(scenario, query_embedding, search_filter),
+                        scenario=scenario, llm_calls=count_llm_calls, namespace=cache_namespace,
+                    )
+                else:
+                    results = find_law_cards(query_embedding, search_filter)
+            except QueryFailed as e:
+                results, cache_hit = None, None
+                st.error(f"Search is temporarily unavailable, please try again in a moment. ({e})")
+
+        if cache_hit:
+            st.caption(f"Results from a very similar earlier search ({cache_hit.similarity:.0%} match).")
+        slots = []
+        if results:
+            st.markdown("### Suitable Laws Found:")
+            # Cards go up first; each explanation fills its slot as soon as it is ready
+            slots = [render_law(result) for result in results]
+        elif results is not None:
+            st.info("No similar laws found." if not search_filter else "No similar laws match these filters.")
+        if results is not None and not cache_hit:
+            cacheable = explain_results(explanation_executor, get_law_explanation, scenario, results,
+                                        on_ready=lambda i, result: render_explanation(slots[i], result["explanation"]))
+            if cacheable:
+                semantic_cache.store(query_embedding, results, scenario, count_llm_calls(results), cache_namespace)
+    show_waterfall(trace, force=st.query_params.get("debug") == "trace")
+    if st.query_params.get("debug") == "trace":
+        st.sidebar.markdown("**Semantic cache**")
+        st.sidebar.json(semantic_cache.stats())
+        st.sidebar.markdown("**Single-flight**")
+        st.sidebar.json(flights.stats())
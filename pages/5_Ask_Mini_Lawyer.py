@@ -1,10 +1,12 @@
 import os
 import streamlit as st
+
+st.set_page_config(page_title="Ask Mini Lawyer", page_icon="💬", layout="wide")
+
 import torch
-from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime
-from app_resources import mongo_client
+from app_resources import mongo_client, openai_client
 import uuid
 from streamlit_js import st_js, st_js_blocking
 
@@ -18,11 +20,8 @@ load_dotenv()
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 collection = mongo_client[DATABASE_NAME]["conversations"]
 
-# OpenAI API setup
-client_openai = OpenAI(api_key=os.getenv("OPEN_AI"))
-
-# Set page configuration
-st.set_page_config(page_title="Ask Mini Lawyer", page_icon="💬", layout="wide")
+# OpenAI API setup (shared, rate-governed client)
+client_openai = openai_client
 
 # Custom CSS styling
 st.markdown("""
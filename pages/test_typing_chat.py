@@ -1,38 +1,57 @@
 # ✅ Full updated code for Ask Mini Lawyer — 2025 Edition
 import os
 import streamlit as st
+
+st.set_page_config(page_title="Ask Mini Lawyer", page_icon="💬", layout="wide")
+
 import torch
-from openai import OpenAI
 from dotenv import load_dotenv
 from datetime import datetime
-from app_resources import mongo_client, pinecone_client, model
+from app_resources import (mongo_client, get_index, model, openai_client, get_feedback_writer, get_job_queue,
+                           get_session_store)
+from doc_extraction import extract_document, DocumentTooLarge
+from doc_sections import section_spans, retrieve_for_sections
+from doc_summarizer import summarize_document
+from doc_vector_store import DocumentVectorStore
+from indexing import query_text
+from job_queue import DONE, FAILED, in_progress, job_id
+from pdf_export import build_export_payload, payload_hash, render_pdf
 import uuid
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from streamlit_js import st_js, st_js_blocking
+from openai_governor import PRIORITY_BULK
+from tracing import trace_request
 import json
-import fitz
-import docx
-from fpdf import FPDF
+import bisect
+import hashlib
 import sys
-import re
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # Load environment variables
 load_dotenv()
 DATABASE_NAME = os.getenv("DATABASE_NAME")
-client_openai = OpenAI(api_key=os.getenv("OPEN_AI"))
+client_openai = openai_client
 
 # External sources
-judgment_index = pinecone_client.Index("judgments-names")
-law_index = pinecone_client.Index("laws-names")
+judgment_index = get_index("judgments-names")
+law_index = get_index("laws-names")
 judgment_collection = mongo_client[DATABASE_NAME]["judgments"]
 law_collection = mongo_client[DATABASE_NAME]["laws"]
 conversation_collection = mongo_client[DATABASE_NAME]["conversations"]
-document_feedback_collection = mongo_client[DATABASE_NAME]["document_feedback"]
-chat_feedback_collection = mongo_client[DATABASE_NAME]["chat_feedback"]
+document_feedback_writer = get_feedback_writer("document_feedback")
+chat_feedback_writer = get_feedback_writer("chat_feedback")
+job_queue = get_job_queue()
+JOB_POLL_SECONDS = 2
+
+# The document, its analyses and the message history live in the session store rather than st.session_state,
+# so they count against the memory budgets and can spill to disk; small flags stay in st.session_state
+session_values = get_session_store().session(get_script_run_ctx().session_id)
+DOCUMENT_KEYS = ("uploaded_doc_id", "uploaded_doc_text", "uploaded_doc_page_offsets", "detected_doc_type",
+                 "doc_vector_store", "export_pdf")
+ANALYSIS_KEYS = ("doc_summary", "doc_judgments", "doc_laws", "doc_section_results")
 
 torch.classes.__path__ = []
-st.set_page_config(page_title="Ask Mini Lawyer", page_icon="💬", layout="wide")
 
 # ===== UI Style =====
 st.markdown("""
@@ -75,11 +94,14 @@ def delete_conversation(chat_id):
     st_js("localStorage.clear();")
     st.session_state.current_chat_id = None
 
-def read_pdf(file):
-    return "".join([page.get_text() for page in fitz.open(stream=file.read(), filetype="pdf")])
-
-def read_docx(file):
-    return "\n".join([p.text for p in docx.Document(file).paragraphs])
+def read_uploaded_document(file):
+    progress = st.progress(0.0, text="קורא את המסמך...")
+    def on_progress(done, total):
+        progress.progress(done / total, text=f"קורא את המסמך... עמוד {done} מתוך {total}")
+    try:
+        return extract_document(file, on_progress=on_progress)
+    finally:
+        progress.empty()
 
 def show_typing_realtime(msg="🤖 הבוט מקליד..."):
     ph = st.empty()
@@ -87,12 +109,13 @@ def show_typing_realtime(msg="🤖 הבוט מקליד..."):
     return ph
 
 def add_message(role, content):
-    st.session_state['messages'].append({
+    # Set again rather than appended in place, so the store re-measures the history
+    session_values["messages"] = session_values["messages"] + [{
         "role": role, "content": content, "timestamp": datetime.now().strftime("%H:%M:%S")
-    })
+    }]
 
 def save_document_feedback(chat_id, document_type, feedback):
-    document_feedback_collection.insert_one({
+    document_feedback_writer.write({
         "chat_id": chat_id,
         "document_type": document_type,
         "feedback": feedback,
@@ -100,7 +123,7 @@ def save_document_feedback(chat_id, document_type, feedback):
     })
 
 def save_chat_feedback(chat_id, message_index, feedback):
-    chat_feedback_collection.insert_one({
+    chat_feedback_writer.write({
         "chat_id": chat_id,
         "message_index": message_index,
         "feedback": feedback,
@@ -117,25 +140,9 @@ def detect_document_type(text):
     )
     return response.choices[0].message.content.strip()
 
-def split_into_sections(text):
-    pattern = r'(סעיף\s+\d+|פרק\s+\d+|[\d]+\.\d+|[\d]+\))'
-    parts = re.split(pattern, text)
-    sections = []
-    buffer = ""
-    for part in parts:
-        if re.match(pattern, part):
-            if buffer:
-                sections.append(buffer.strip())
-            buffer = part
-        else:
-            buffer += " " + part
-    if buffer:
-        sections.append(buffer.strip())
-    return [s for s in sections if len(s.strip()) > 30]
-
 def find_relevant_judgments(text, top_k=3):
     try:
-        embedding = model.encode([text], normalize_embeddings=True)[0]
+        embedding = model.encode([query_text(text)], normalize_embeddings=True)[0]
         results = judgment_index.query(vector=embedding.tolist(), top_k=top_k, include_metadata=True)
         explanations = []
         for match in results["matches"]:
@@ -154,7 +161,8 @@ def find_relevant_judgments(text, top_k=3):
 מדוע פסק הדין רלוונטי לסיטואציה? דרג מ-0 עד 10 בפורמט JSON:
 {{"advice": "הסבר", "score": 8}}"""
                 reply = client_openai.chat.completions.create(
-                    model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0.5
+                    model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0.5,
+                    priority=PRIORITY_BULK,
                 )
                 parsed = json.loads(reply.choices[0].message.content.strip())
                 explanations.append(f"פסק דין: {name}\nהסבר: {parsed['advice']} (ציון: {parsed['score']}/10)")
@@ -164,7 +172,7 @@ def find_relevant_judgments(text, top_k=3):
 
 def find_relevant_laws(text, top_k=3):
     try:
-        embedding = model.encode([text], normalize_embeddings=True)[0]
+        embedding = model.encode([query_text(text)], normalize_embeddings=True)[0]
         results = law_index.query(vector=embedding.tolist(), top_k=top_k, include_metadata=True)
         explanations = []
         for match in results["matches"]:
@@ -183,7 +191,8 @@ def find_relevant_laws(text, top_k=3):
 מדוע החוק רלוונטי לסיטואציה? החזר בפורמט JSON:
 {{"advice": "הסבר", "score": 8}}"""
                 reply = client_openai.chat.completions.create(
-                    model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0.5
+                    model="gpt-3.5-turbo", messages=[{"role": "user", "content": prompt}], temperature=0.5,
+                    priority=PRIORITY_BULK,
                 )
                 parsed = json.loads(reply.choices[0].message.content.strip())
                 explanations.append(f"חוק: {name}\nהסבר: {parsed['advice']} (ציון: {parsed['score']}/10)")
@@ -191,38 +200,115 @@ def find_relevant_laws(text, top_k=3):
     except Exception as e:
         return [f"שגיאה באחזור חוקים: {e}"]
 
-def export_pdf(filename="summary.pdf"):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    if "detected_doc_type" in st.session_state:
-        pdf.multi_cell(0, 10, f"סוג מסמך: {st.session_state['detected_doc_type']}\n\n")
-    if "doc_summary" in st.session_state:
-        pdf.multi_cell(0, 10, f"סיכום המסמך:\n{st.session_state['doc_summary']}\n\n")
-
-    pdf.cell(0, 10, "שאלות ותשובות:", ln=True)
-    for msg in st.session_state['messages']:
-        role = "👤 שאלה" if msg['role'] == "user" else "🤖 תשובה"
-        pdf.multi_cell(0, 10, f"{role}:\n{msg['content']}\n")
-
-    if "doc_judgments" in st.session_state:
-        pdf.cell(0, 10, "פסקי דין רלוונטיים:", ln=True)
-        for j in st.session_state["doc_judgments"]:
-            pdf.multi_cell(0, 10, f"- {j}")
-
-    if "doc_laws" in st.session_state:
-        pdf.cell(0, 10, "חוקים רלוונטיים:", ln=True)
-        for l in st.session_state["doc_laws"]:
-            pdf.multi_cell(0, 10, f"- {l}")
-
-    filepath = os.path.join("outputs", filename)
-    os.makedirs("outputs", exist_ok=True)
-    pdf.output(filepath)
-    return filepath
+# ===== Document analysis jobs =====
+# Run on job_queue workers, so a rerun or a reload doesn't cancel them; results are kept per chat_id and document
+
+def document_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+def summary_job(text, report):
+    return summarize_document(client_openai, text, on_progress=lambda done, total: report(progress=done / total))
+
+def references_job(summary, report):
+    judgments = find_relevant_judgments(summary)
+    report(progress=0.5, partial={"judgments": judgments})
+    return {"judgments": judgments, "laws": find_relevant_laws(summary)}
+
+def sections_job(text, report):
+    spans = section_spans(text)
+    results = retrieve_for_sections(text, spans, model, law_index, judgment_index, law_collection, judgment_collection)
+    return [
+        {"preview": text[start:min(end, start + 100)], "text": text[start:end],
+         "laws": result["laws"], "judgments": result["judgments"]}
+        for (start, end, _), result in zip(spans, results)
+    ]
+
+def apply_job_result(job):
+    if job["kind"] == "summary":
+        session_values["doc_summary"] = job["result"]
+    elif job["kind"] == "references":
+        session_values["doc_judgments"] = job["result"]["judgments"]
+        session_values["doc_laws"] = job["result"]["laws"]
+    elif job["kind"] == "sections":
+        session_values["doc_section_results"] = job["result"]
+
+def restore_analyses(chat_id, doc_key=None):
+    """Load finished analyses of this chat's document (default: the latest one analysed)."""
+    session_values.discard(*ANALYSIS_KEYS)
+    finished = job_queue.finished(chat_id, doc_key)
+    for job in finished.values():
+        apply_job_result(job)
+    if doc_key is None and finished:
+        doc_key = next(iter(finished.values()))["doc_key"]
+    st.session_state["analysis_doc_key"] = doc_key
+
+def submit_analysis(chat_id, kind, fn, *args):
+    job_queue.submit(chat_id, kind, st.session_state["analysis_doc_key"], fn, *args)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job(job_id, label):
+    job = job_queue.get(job_id)
+    if job is None or not in_progress(job):
+        st.rerun()
+    st.progress(job.get("progress") or 0.0, text=label)
+    for item in (job.get("partial") or {}).get("judgments", []):
+        st.markdown(f"- {item}")
+
+def track_analysis(chat_id, kind, label):
+    """Show a job's progress while it runs; copy its result into the session once it is done."""
+    if not st.session_state.get("analysis_doc_key"):
+        return
+    job = job_queue.get(job_id(chat_id, kind, st.session_state["analysis_doc_key"]))
+    if job is None:
+        return
+    if job["status"] == DONE:
+        apply_job_result(job)
+    elif job["status"] == FAILED:
+        st.error(f"הניתוח נכשל: {job['error']}")
+    elif in_progress(job):
+        poll_job(job["_id"], label)
+    else:
+        st.warning("הניתוח הופסק באמצע, נסה שוב.")
+
+def get_document_store():
+    """Per-session vector store for the uploaded document, built on first use."""
+    doc_id = session_values.get("uploaded_doc_id")
+    if doc_id is None:
+        return None
+    store = session_values.get("doc_vector_store")
+    if store is None or store.doc_id != doc_id:
+        with st.spinner("מאנדקס את המסמך..."):
+            store = DocumentVectorStore(model, doc_id, session_values["uploaded_doc_text"])
+        # Rebuilt from the text when needed, so memory pressure drops it instead of spilling it
+        session_values.set("doc_vector_store", store, droppable=True)
+    return store
+
+def build_document_context(question, top_k=4):
+    store = get_document_store()
+    if not store:
+        return None
+    offsets = session_values.get("uploaded_doc_page_offsets") or [0]
+    passages = []
+    for score, start, end in store.search(question, top_k=top_k):
+        page = bisect.bisect_right(offsets, start)
+        passages.append(f"[עמוד {page}]\n{store.text[start:end]}")
+    if not passages:
+        return None
+    return "קטעים רלוונטיים מהמסמך שהמשתמש העלה (השתמש בהם אם הם נוגעים לשאלה):\n\n" + "\n\n".join(passages)
+
+def get_export_pdf():
+    """PDF bytes for the current session, re-rendered only when the content changed."""
+    payload = build_export_payload(session_values)
+    content_hash = payload_hash(payload)
+    cached = session_values.get("export_pdf")
+    if cached and cached[0] == content_hash:
+        return cached[1]
+    pdf_bytes = render_pdf(payload)
+    session_values.set("export_pdf", (content_hash, pdf_bytes), droppable=True)
+    return pdf_bytes
 
 def display_messages():
-    for i, msg in enumerate(st.session_state['messages']):
+    for i, msg in enumerate(session_values['messages']):
         role = "user-message" if msg['role'] == "user" else "bot-message"
         st.markdown(
             f"<div class='{role}'>{msg['content']}<div class='timestamp'>{msg['timestamp']}</div></div>",
@@ -247,8 +333,10 @@ chat_id = get_or_create_chat_id()
 # Init session
 if "user_name" not in st.session_state:
     st.session_state["user_name"] = None
-if "messages" not in st.session_state:
-    st.session_state["messages"] = load_conversation(chat_id)
+if "messages" not in session_values:
+    session_values["messages"] = load_conversation(chat_id)
+if "analysis_doc_key" not in st.session_state:
+    restore_analyses(chat_id)
 
 # Login screen
 if not st.session_state["user_name"]:
@@ -257,7 +345,7 @@ if not st.session_state["user_name"]:
         if st.form_submit_button("התחל שיחה") and name:
             st.session_state["user_name"] = name
             add_message("assistant", f"שלום {name}, איך אפשר לעזור?")
-            save_conversation(chat_id, name, st.session_state["messages"])
+            save_conversation(chat_id, name, session_values["messages"])
             st.rerun()
 
 else:
@@ -267,89 +355,104 @@ else:
         st.markdown('</div>', unsafe_allow_html=True)
 
     uploaded_file = st.file_uploader("📄 העלה מסמך משפטי", type=["pdf", "docx"])
+    if uploaded_file and session_values.get("uploaded_doc_id") != uploaded_file.file_id:
+        try:
+            document = read_uploaded_document(uploaded_file)
+        except DocumentTooLarge as e:
+            st.error(str(e))
+            session_values.discard(*DOCUMENT_KEYS)
+            uploaded_file = None
+        else:
+            session_values["uploaded_doc_id"] = uploaded_file.file_id
+            session_values["uploaded_doc_text"] = document.text
+            session_values["uploaded_doc_page_offsets"] = document.page_offsets
+            restore_analyses(chat_id, document_key(document.text))
+            with st.spinner("GPT מזהה את סוג המסמך..."):
+                session_values["detected_doc_type"] = detect_document_type(document.text)
+
     if uploaded_file:
-        st.session_state["uploaded_doc_text"] = read_pdf(uploaded_file) if uploaded_file.type == "application/pdf" else read_docx(uploaded_file)
         st.success("המסמך נטען בהצלחה!")
-
-        with st.spinner("GPT מזהה את סוג המסמך..."):
-            st.session_state["detected_doc_type"] = detect_document_type(st.session_state["uploaded_doc_text"])
-
-        st.markdown(f"**סוג המסמך שהמערכת זיהתה:** `{st.session_state['detected_doc_type']}`")
+        st.markdown(f"**סוג המסמך שהמערכת זיהתה:** `{session_values['detected_doc_type']}`")
 
         col1, col2 = st.columns([1, 1])
         with col1:
             if st.button("✅ נכון"):
-                save_document_feedback(chat_id, st.session_state["detected_doc_type"], "correct")
+                save_document_feedback(chat_id, session_values["detected_doc_type"], "correct")
                 st.success("תודה על האישור!")
         with col2:
             if st.button("❌ שגוי"):
-                save_document_feedback(chat_id, st.session_state["detected_doc_type"], "incorrect")
+                save_document_feedback(chat_id, session_values["detected_doc_type"], "incorrect")
                 st.warning("תודה על הדיווח, נשפר!")
 
-    if "uploaded_doc_text" in st.session_state and st.button("📋 סכם את המסמך"):
-        with st.spinner("GPT מסכם את המסמך..."):
-            summary_prompt = f"""סכם את המסמך המשפטי הבא בקצרה:
----
-{st.session_state['uploaded_doc_text']}
-"""
-            response = client_openai.chat.completions.create(
-                model="gpt-4", messages=[{"role": "user", "content": summary_prompt}], temperature=0.5
-            )
-            st.session_state["doc_summary"] = response.choices[0].message.content.strip()
+    if "uploaded_doc_text" in session_values and st.button("📋 סכם את המסמך"):
+        submit_analysis(chat_id, "summary", summary_job, session_values["uploaded_doc_text"])
+    track_analysis(chat_id, "summary", "GPT מסכם את המסמך...")
 
-    if "doc_summary" in st.session_state:
+    if "doc_summary" in session_values:
         st.markdown("### סיכום המסמך:")
-        st.info(st.session_state["doc_summary"])
+        st.info(session_values["doc_summary"])
 
         if st.button("📚 הצג חוקים ופסקי דין למסמך"):
-            with st.spinner("מאחזר פסקי דין וחוקים למסמך..."):
-                st.session_state["doc_judgments"] = find_relevant_judgments(st.session_state["doc_summary"])
-                st.session_state["doc_laws"] = find_relevant_laws(st.session_state["doc_summary"])
-
+            submit_analysis(chat_id, "references", references_job, session_values["doc_summary"])
+        track_analysis(chat_id, "references", "מאחזר פסקי דין וחוקים למסמך...")
+        if "doc_judgments" in session_values:
             st.subheader("📚 פסקי דין שנמצאו:")
-            for j in st.session_state.get("doc_judgments", []):
+            for j in session_values.get("doc_judgments", []):
                 st.markdown(f"- {j}")
             st.subheader("⚖️ חוקים שנמצאו:")
-            for l in st.session_state.get("doc_laws", []):
+            for l in session_values.get("doc_laws", []):
                 st.markdown(f"- {l}")
 
-        if st.button("🔍 ניתוח לפי סעיפים"):
-            sections = split_into_sections(st.session_state["uploaded_doc_text"])
-            for i, sec in enumerate(sections):
-                st.markdown(f"#### סעיף {i+1}: {sec[:100]}...")
-                with st.expander("הצג סעיף"):
-                    st.write(sec)
+        if "uploaded_doc_text" in session_values and st.button("🔍 ניתוח לפי סעיפים"):
+            submit_analysis(chat_id, "sections", sections_job, session_values["uploaded_doc_text"])
+        track_analysis(chat_id, "sections", "מאחזר חוקים ופסקי דין לכל סעיף...")
+        for i, result in enumerate(session_values.get("doc_section_results", [])):
+            st.markdown(f"#### סעיף {i+1}: {result['preview']}...")
+            with st.expander("הצג סעיף"):
+                st.write(result["text"])
+            if result["laws"]:
+                st.markdown("⚖️ " + " | ".join(f"{l['Name']} ({l['IsraelLawID']})" for l in result["laws"]))
+            if result["judgments"]:
+                st.markdown("📚 " + " | ".join(f"{j['Name']} ({j['CaseNumber']})" for j in result["judgments"]))
 
         if st.button("📄 ייצא הכל כ-PDF"):
-            path = export_pdf()
-            with open(path, "rb") as f:
-                st.download_button("📅 הורד PDF", f, file_name="legal_summary.pdf")
+            st.download_button("📅 הורד PDF", get_export_pdf(), file_name="legal_summary.pdf", mime="application/pdf")
 
     # Chat with the bot
     with st.form("chat_form"):
         user_input = st.text_area("הכנס שאלה משפטית", height=100)
         if st.form_submit_button("שלח שאלה") and user_input.strip():
             add_message("user", user_input)
-            save_conversation(chat_id, st.session_state["user_name"], st.session_state["messages"])
+            save_conversation(chat_id, st.session_state["user_name"], session_values["messages"])
             st.rerun()
 
-    if st.session_state['messages'] and st.session_state['messages'][-1]['role'] == "user":
+    messages = session_values["messages"]
+    if messages and messages[-1]['role'] == "user":
         typing = show_typing_realtime()
-        response = client_openai.chat.completions.create(
-            model="gpt-4",
-            messages=[{"role": "system", "content": "אתה עוזר משפטי מקצועי בדין הישראלי. ענה בקצרה ומדויק."}] +
-                     [{"role": m["role"], "content": m["content"]} for m in st.session_state["messages"][-5:]] +
-                     [{"role": "user", "content": st.session_state['messages'][-1]['content']}],
-            max_tokens=700,
-            temperature=0.7
-        )
+        with trace_request("chat_turn") as trace:
+            document_context = build_document_context(messages[-1]['content'])
+            response = client_openai.chat.completions.create(
+                model="gpt-4",
+                messages=[{"role": "system", "content": "אתה עוזר משפטי מקצועי בדין הישראלי. ענה בקצרה ומדויק."}] +
+                         ([{"role": "system", "content": document_context}] if document_context else []) +
+                         [{"role": m["role"], "content": m["content"]} for m in messages[-5:]] +
+                         [{"role": "user", "content": messages[-1]['content']}],
+                max_tokens=700,
+                temperature=0.7
+            )
         typing.empty()
         add_message("assistant", response.choices[0].message.content.strip())
-        save_conversation(chat_id, st.session_state["user_name"], st.session_state["messages"])
+        save_conversation(chat_id, st.session_state["user_name"], session_values["messages"])
         st.rerun()
 
     if st.button("🗑 נקה שיחה"):
         delete_conversation(chat_id)
-        st.session_state["messages"] = []
+        session_values["messages"] = []
         st.session_state["user_name"] = None
+        session_values.discard("doc_vector_store", *ANALYSIS_KEYS)
+        st.session_state.pop("analysis_doc_key", None)
         st.rerun()
+
+if st.query_params.get("debug") == "trace":
+    st.sidebar.markdown("**Session store**")
+    st.sidebar.json(get_session_store().stats())
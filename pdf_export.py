@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import re
+
+from fpdf import FPDF
+
+# Any TTF with Hebrew glyphs; DejaVu ships with most Linux images
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf")
+
+# Emoji and other astral-plane symbols have no glyph in the text font
+_UNSUPPORTED_CHARS = re.compile(r"[\U00010000-\U0010FFFF\u2600-\u27BF\uFE0F]")
+
+
+def build_export_payload(session_state):
+    """Collect everything that goes into the export from the session state."""
+    return {
+        "doc_type": session_state.get("detected_doc_type"),
+        "summary": session_state.get("doc_summary"),
+        "messages": [
+            {"role": msg["role"], "content": msg["content"]} for msg in session_state.get("messages", [])
+        ],
+        "judgments": session_state.get("doc_judgments"),
+        "laws": session_state.get("doc_laws"),
+    }
+
+
+def payload_hash(payload):
+    serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def _clean(text):
+    return _UNSUPPORTED_CHARS.sub("", str(text)).strip()
+
+
+def _write(pdf, text):
+    pdf.multi_cell(0, 8, _clean(text), align="R", new_x="LMARGIN", new_y="NEXT")
+
+
+def _heading(pdf, text):
+    pdf.set_font("Hebrew", size=14)
+    _write(pdf, text)
+    pdf.set_font("Hebrew", size=12)
+    pdf.ln(2)
+
+
+def render_pdf(payload):
+    """Render the export payload to PDF bytes, entirely in memory."""
+    pdf = FPDF()
+    pdf.add_font("Hebrew", fname=PDF_FONT_PATH)
+    pdf.set_font("Hebrew", size=12)
+    pdf.set_text_shaping(use_shaping_engine=True, direction="rtl")
+    pdf.add_page()
+
+    if payload["doc_type"]:
+        _write(pdf, f"סוג מסמך: {payload['doc_type']}")
+        pdf.ln(4)
+    if payload["summary"]:
+        _heading(pdf, "סיכום המסמך:")
+        _write(pdf, payload["summary"])
+        pdf.ln(4)
+
+    _heading(pdf, "שאלות ותשובות:")
+    for msg in payload["messages"]:
+        role = "שאלה" if msg["role"] == "user" else "תשובה"
+        _write(pdf, f"{role}:")
+        _write(pdf, msg["content"])
+        pdf.ln(2)
+
+    if payload["judgments"]:
+        _heading(pdf, "פסקי דין רלוונטיים:")
+        for j in payload["judgments"]:
+            _write(pdf, f"- {j}")
+
+    if payload["laws"]:
+        _heading(pdf, "חוקים רלוונטיים:")
+        for l in payload["laws"]:
+            _write(pdf, f"- {l}")
+
+    return bytes(pdf.output())
@@ -0,0 +1,21 @@
+from concurrent.futures import as_completed
+
+from tracing import propagate
+
+
+def explain_results(executor, explain, scenario, results, on_ready=None):
+    """Fill results[i]["explanation"] = explain(scenario, card) concurrently on `executor`.
+
+    `on_ready(i, result)` runs on the calling thread as each explanation
+    lands, so a Streamlit page can update that result's placeholder without
+    touching Streamlit from a worker thread. Returns whether every
+    explanation succeeded (i.e. the results are cacheable).
+    """
+    futures = {executor.submit(propagate(explain), scenario, result["card"]): i
+               for i, result in enumerate(results) if result["card"]}
+    for future in as_completed(futures):
+        i = futures[future]
+        results[i]["explanation"] = future.result()
+        if on_ready:
+            on_ready(i, results[i])
+    return all(not (result["explanation"] or {}).get("error") for result in results)
@@ -0,0 +1,218 @@
+import numpy as np
+
+from indexing import matches_filter
+
+# Rows scored per step, so ADC never materializes a float copy of all codes
+SCORE_BLOCK = 8192
+RERANK_CANDIDATES = 100
+TRAIN_SAMPLE = 50000
+
+
+class ScalarQuantizer:
+    """Per-dimension int8 codebook: one byte per dimension, 4x smaller than float32."""
+
+    def __init__(self):
+        self.offset = None
+        self.scale = None
+
+    @property
+    def name(self):
+        return "int8"
+
+    @property
+    def nbytes(self):
+        return 0 if self.offset is None else self.offset.nbytes + self.scale.nbytes
+
+    def bytes_per_vector(self, dimension):
+        return dimension
+
+    def fit(self, vectors):
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self.offset = low.astype(np.float32)
+        self.scale = np.maximum((high - low) / 255.0, 1e-12).astype(np.float32)
+        return self
+
+    def encode(self, vectors):
+        return np.clip(np.rint((vectors - self.offset) / self.scale), 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return codes.astype(np.float32) * self.scale + self.offset
+
+    def scores(self, query, codes):
+        # q . (code * scale + offset) = (q * scale) . code + q . offset
+        weights = (query * self.scale).astype(np.float32)
+        bias = float(query @ self.offset)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK):
+            # Casting a block to float32 first lets the product run in BLAS
+            block = codes[start:start + SCORE_BLOCK].astype(np.float32)
+            out[start:start + len(block)] = block @ weights + bias
+        return out
+
+
+class ProductQuantizer:
+    """Splits vectors into `subspaces` chunks, each coded as one of 256 k-means centroids.
+
+    A 1024-dim vector with 64 subspaces is stored in 64 bytes. Scores are
+    asymmetric: the query stays float, and per query a (subspaces x 256)
+    table of partial dot products is summed over each vector's codes.
+    """
+
+    def __init__(self, subspaces=64, iterations=20, sample=TRAIN_SAMPLE, seed=0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.sample = sample
+        self.seed = seed
+        self.centroids = None  # (subspaces, 256, sub_dimension)
+
+    @property
+    def name(self):
+        return f"pq{self.subspaces}"
+
+    @property
+    def nbytes(self):
+        return 0 if self.centroids is None else self.centroids.nbytes
+
+    def bytes_per_vector(self, dimension):
+        return self.subspaces
+
+    def _split(self, vectors):
+        return vectors.reshape(len(vectors), self.subspaces, -1)
+
+    def fit(self, vectors):
+        if vectors.shape[1] % self.subspaces:
+            raise ValueError(f"Dimension {vectors.shape[1]} is not divisible by {self.subspaces} subspaces")
+        rng = np.random.default_rng(self.seed)
+        if len(vectors) > self.sample:
+            vectors = vectors[rng.choice(len(vectors), self.sample, replace=False)]
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        self.centroids = np.stack([_kmeans(parts[:, j], 256, self.iterations, rng)
+                                   for j in range(self.subspaces)])
+        return self
+
+    def encode(self, vectors):
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        squared = (self.centroids ** 2).sum(axis=2)
+        for start in range(0, len(vectors), SCORE_BLOCK):
+            parts = self._split(np.asarray(vectors[start:start + SCORE_BLOCK], dtype=np.float32))
+            for j in range(self.subspaces):
+                distances = squared[j] - 2 * parts[:, j] @ self.centroids[j].T
+                codes[start:start + len(parts), j] = distances.argmin(axis=1)
+        return codes
+
+    def decode(self, codes):
+        return self.centroids[np.arange(self.subspaces), codes].reshape(len(codes), -1)
+
+    def scores(self, query, codes):
+        table = np.einsum("jcd,jd->jc", self.centroids, self._split(query[None, :])[0])
+        columns = np.arange(self.subspaces)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BLOCK):
+            out[start:start + SCORE_BLOCK] = table[columns, codes[start:start + SCORE_BLOCK]].sum(axis=1)
+        return out
+
+
+def _kmeans(points, k, iterations, rng):
+    """Plain Lloyd's k-means; empty clusters are re-seeded from random points."""
+    if len(points) <= k:
+        centroids = np.zeros((k, points.shape[1]), dtype=np.float32)
+        centroids[:len(points)] = points
+        return centroids
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    for _ in range(iterations):
+        distances = (centroids ** 2).sum(axis=1) - 2 * points @ centroids.T
+        assignment = distances.argmin(axis=1)
+        counts = np.bincount(assignment, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, points)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = points[rng.choice(len(points), int(empty.sum()), replace=False)]
+    return centroids
+
+
+def make_quantizer(spec):
+    """"int8" or "pq<subspaces>", e.g. "pq64"."""
+    if spec == "int8":
+        return ScalarQuantizer()
+    if spec.startswith("pq") and spec[2:].isdigit():
+        return ProductQuantizer(int(spec[2:]))
+    raise ValueError(f"Unknown quantizer {spec!r}; use int8 or pq<subspaces>")
+
+
+class CompressedIndex:
+    """Search over quantized codes, with exact re-scoring of the best candidates.
+
+    Only the codes are held in RAM. Full-precision vectors, if given, are
+    read (normally from a disk-backed memmap) for just the `rerank`
+    candidates of each query.
+    """
+
+    def __init__(self, quantizer, ids, codes, metadata=None, full_vectors=None, rerank=RERANK_CANDIDATES):
+        self.quantizer = quantizer
+        self.ids = list(ids)
+        self.codes = codes
+        self.metadata = metadata
+        self.full_vectors = full_vectors
+        self.rerank = rerank
+
+    @classmethod
+    def build(cls, ids, vectors, quantizer, metadata=None, vectors_path=None, rerank=RERANK_CANDIDATES):
+        """Fit (if needed) and encode L2-normalized `vectors`; keep full vectors on disk at vectors_path."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if getattr(quantizer, "nbytes", 0) == 0:
+            quantizer.fit(vectors)
+        full_vectors = None
+        if vectors_path:
+            stored = np.memmap(vectors_path, dtype=np.float32, mode="w+", shape=vectors.shape)
+            stored[:] = vectors
+            stored.flush()
+            del stored
+            full_vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=vectors.shape)
+        return cls(quantizer, ids, quantizer.encode(vectors), metadata, full_vectors, rerank)
+
+    @property
+    def memory_bytes(self):
+        """Resident bytes of the search structure (codes + codebook), excluding ids and metadata."""
+        return self.codes.nbytes + self.quantizer.nbytes
+
+    def search(self, query, top_k=10, rerank=None, allowed=None):
+        """(positions, scores) of the top_k matches for one normalized query.
+
+        `allowed` optionally restricts the search to these positions.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        allowed = np.arange(len(self.codes)) if allowed is None else np.asarray(allowed, dtype=np.int64)
+        codes = self.codes if len(allowed) == len(self.codes) else self.codes[allowed]
+        approximate = self.quantizer.scores(query, codes)
+        rerank = self.rerank if rerank is None else rerank
+        keep = min(len(approximate), max(top_k, rerank) if self.full_vectors is not None else top_k)
+        if keep == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        best = np.argpartition(-approximate, keep - 1)[:keep]
+        candidates = allowed[best]
+        if self.full_vectors is not None and rerank:
+            candidates.sort()  # sequential reads from the memmap
+            scores = np.asarray(self.full_vectors[candidates]) @ query
+        else:
+            scores = approximate[best]
+        order = np.argsort(-scores)[:top_k]
+        return candidates[order], scores[order]
+
+    def query(self, vector, top_k=10, include_metadata=False, include_values=False, filter=None, **kwargs):
+        allowed = None
+        if filter and self.metadata is not None:
+            allowed = [i for i, item in enumerate(self.metadata) if matches_filter(item, filter)]
+        positions, scores = self.search(vector, top_k, allowed=allowed)
+        matches = []
+        for position, score in zip(positions, scores):
+            match = {"id": self.ids[position], "score": float(score)}
+            if include_metadata and self.metadata is not None:
+                match["metadata"] = dict(self.metadata[position])
+            if include_values:
+                values = (self.full_vectors[position] if self.full_vectors is not None
+                          else self.quantizer.decode(self.codes[position:position + 1])[0])
+                match["values"] = np.asarray(values).tolist()
+            matches.append(match)
+        return {"matches": matches}
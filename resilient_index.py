@@ -0,0 +1,125 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from tracing import LatencyHistogram, propagate, span
+
+QUERY_DEADLINE = float(os.getenv("PINECONE_QUERY_DEADLINE", "3.0"))
+MAX_ATTEMPTS = int(os.getenv("PINECONE_QUERY_ATTEMPTS", "3"))
+BASE_BACKOFF = 0.1
+HEDGE_QUANTILE = 0.95
+# Until enough latencies are observed, hedge after this long
+DEFAULT_HEDGE_DELAY = 0.5
+MIN_HEDGE_DELAY = 0.02
+MIN_HEDGE_SAMPLES = 20
+QUERY_WORKERS = 32
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="pinecone-query")
+        return _executor
+
+
+class QueryFailed(RuntimeError):
+    """The query did not succeed within its deadline and retry budget."""
+
+
+def is_retryable(error):
+    # Pinecone API errors carry the HTTP status; other 4xx responses will not get better on retry
+    status = getattr(error, "status", None)
+    return not (isinstance(status, int) and 400 <= status < 500 and status != 429)
+
+
+class ResilientIndex:
+    """Wrap a Pinecone index so `query` gets a deadline, jittered retries and hedging.
+
+    Each attempt waits the observed p95 latency; if no answer has arrived
+    by then, a duplicate request is sent and whichever finishes first wins.
+    Failed attempts are retried with full-jitter backoff while the deadline
+    allows. Everything else is forwarded to the wrapped index unchanged.
+    """
+
+    def __init__(self, index, deadline=QUERY_DEADLINE, max_attempts=MAX_ATTEMPTS, base_backoff=BASE_BACKOFF,
+                 hedge=True, hedge_quantile=HEDGE_QUANTILE, executor=None):
+        self._index = index
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self._executor = executor
+        self.latencies = LatencyHistogram()
+        self.stats = {"queries": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def hedge_delay(self):
+        if self.latencies.count < MIN_HEDGE_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return max(MIN_HEDGE_DELAY, self.latencies.quantiles()[self.hedge_quantile])
+
+    def _timed_query(self, args, kwargs):
+        started = time.perf_counter()
+        result = self._index.query(*args, **kwargs)
+        self.latencies.observe(time.perf_counter() - started)
+        return result
+
+    def _attempt(self, args, kwargs, until):
+        """One logical attempt: the request plus an optional hedge; returns (done, result_or_error)."""
+        executor = self._executor or _get_executor()
+        pending = {executor.submit(propagate(self._timed_query), args, kwargs)}
+        primary = next(iter(pending))
+        if self.hedge:
+            done, _ = wait(pending, timeout=min(self.hedge_delay(), max(0.0, until - time.monotonic())))
+            if not done and time.monotonic() < until:
+                self._count("hedges")
+                pending.add(executor.submit(propagate(self._timed_query), args, kwargs))
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, until - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return True, future.result()
+                error = future.exception()
+        # Abandoned requests finish in the background; their results are ignored
+        return False, error
+
+    def query(self, *args, deadline=None, **kwargs):
+        self._count("queries")
+        until = time.monotonic() + (deadline or self.deadline)
+        error = None
+        with span("pinecone.resilient_query"):
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    self._count("retries")
+                    backoff = random.uniform(0, self.base_backoff * 2 ** attempt)
+                    if time.monotonic() + backoff >= until:
+                        break
+                    time.sleep(backoff)
+                ok, outcome = self._attempt(args, kwargs, until)
+                if ok:
+                    return outcome
+                error = outcome
+                if error is None or not is_retryable(error) or time.monotonic() >= until:
+                    break
+        self._count("failures")
+        reason = f"{type(error).__name__}: {error}" if error else "deadline exceeded"
+        raise QueryFailed(f"Vector search failed ({reason})") from error
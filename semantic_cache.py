@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.96"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+# Serve hits older than this but recompute them in the background; unset disables refreshing
+SEMANTIC_CACHE_REFRESH_AFTER = (float(os.environ["SEMANTIC_CACHE_REFRESH_AFTER"])
+                                if os.getenv("SEMANTIC_CACHE_REFRESH_AFTER") else None)
+REFRESH_WORKERS = 2
+
+
+class CacheHit:
+    def __init__(self, value, similarity, scenario, age):
+        self.value = value
+        self.similarity = similarity
+        self.scenario = scenario
+        self.age = age
+
+
+class SemanticCache:
+    """LRU cache keyed by normalized scenario embeddings, matched by cosine similarity.
+
+    A lookup returns the entry most similar to the query embedding if it
+    clears `threshold`. Entries record how many LLM calls produced them,
+    so the stats show how many calls the cache saved.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                 refresh_after=SEMANTIC_CACHE_REFRESH_AFTER):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.refresh_after = refresh_after
+        self._lock = threading.Lock()
+        self._vectors = None
+        # slot -> entry dict, in least-recently-used order
+        self._entries = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+        self._refreshing = set()
+        self._refresh_executor = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "refreshes": 0, "llm_calls_saved": 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _best_slot(self, embedding, namespace=None):
+        slots = np.fromiter((slot for slot, entry in self._entries.items() if entry["namespace"] == namespace),
+                            dtype=np.int64)
+        if not len(slots):
+            return None, 0.0
+        scores = self._vectors[slots] @ embedding
+        best = int(np.argmax(scores))
+        return int(slots[best]), float(scores[best])
+
+    def lookup(self, embedding, namespace=None):
+        """CacheHit for the closest cached scenario above the threshold, else None.
+
+        Entries only match lookups with the same `namespace` (e.g. the search filters).
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            slot, similarity = self._best_slot(embedding, namespace)
+            if slot is None or similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(slot)
+            entry = self._entries[slot]
+            self._stats["hits"] += 1
+            self._stats["llm_calls_saved"] += entry["llm_calls"]
+            return CacheHit(entry["value"], similarity, entry["scenario"], time.time() - entry["stored_at"])
+
+    def store(self, embedding, value, scenario="", llm_calls=0, namespace=None):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, embedding.shape[0]), dtype=np.float32)
+            slot, similarity = self._best_slot(embedding, namespace)
+            if slot is None or similarity < self.threshold:
+                if self._free_slots:
+                    slot = self._free_slots.pop()
+                else:
+                    slot, _ = self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            self._vectors[slot] = embedding
+            self._entries[slot] = {
+                "value": value, "scenario": scenario, "llm_calls": llm_calls, "stored_at": time.time(),
+                "namespace": namespace,
+            }
+            self._entries.move_to_end(slot)
+
+    def get_or_compute(self, embedding, compute, scenario="", llm_calls=None, namespace=None):
+        """(value, hit) for embedding, running compute() on a miss.
+
+        compute must return (value, cacheable) and must not touch Streamlit,
+        since stale hits are recomputed on a background thread.
+        `llm_calls(value)` counts the LLM calls behind a value.
+        """
+        hit = self.lookup(embedding, namespace)
+        if hit is not None:
+            self.refresh_if_stale(hit, embedding, compute, scenario, llm_calls, namespace)
+            return hit.value, hit
+        value, cacheable = compute()
+        if cacheable:
+            self.store(embedding, value, scenario, llm_calls(value) if llm_calls else 0, namespace)
+        return value, None
+
+    def refresh_if_stale(self, hit, embedding, compute, scenario="", llm_calls=None, namespace=None):
+        """Recompute a hit older than refresh_after in the background; same contract as get_or_compute."""
+        if self.refresh_after is not None and hit.age > self.refresh_after:
+            self._refresh(embedding, compute, scenario, llm_calls, namespace)
+
+    def _refresh(self, embedding, compute, scenario, llm_calls, namespace):
+        key = (np.asarray(embedding, dtype=np.float32).tobytes(), namespace)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self._stats["refreshes"] += 1
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS,
+                                                            thread_name_prefix="semantic-cache-refresh")
+
+        def refresh():
+            try:
+                value, cacheable = compute()
+                if cacheable:
+                    self.store(embedding, value, scenario, llm_calls(value) if llm_calls else 0, namespace)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        self._refresh_executor.submit(refresh)
@@ -0,0 +1,374 @@
+import atexit
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections.abc import MutableMapping
+
+SESSION_BUDGET_BYTES = int(os.getenv("SESSION_BUDGET_MB", "64")) * 1024 * 1024
+GLOBAL_BUDGET_BYTES = int(os.getenv("SESSION_GLOBAL_BUDGET_MB", "1024")) * 1024 * 1024
+# Sessions untouched this long are spilled wholesale; after EXPIRE_AFTER their values are discarded
+IDLE_AFTER = float(os.getenv("SESSION_IDLE_AFTER", "300"))
+EXPIRE_AFTER = float(os.getenv("SESSION_EXPIRE_AFTER", str(24 * 60 * 60)))
+SPILL_BACKEND = os.getenv("SESSION_SPILL_BACKEND", "disk")
+SPILL_DIR = os.getenv("SESSION_SPILL_DIR", os.path.join(tempfile.gettempdir(), "mini_lawyer_sessions"))
+SPILL_BUCKET = "session_spill"
+# Smaller values stay resident: spilling them frees too little to be worth a reload
+MIN_SPILL_BYTES = 16 * 1024
+
+
+def approximate_size(value, _seen=None):
+    """Rough resident bytes of a value, following containers (shared objects are counted once)."""
+    _seen = set() if _seen is None else _seen
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    if isinstance(getattr(value, "nbytes", None), int):
+        # numpy arrays, and objects that report their own footprint (e.g. DocumentVectorStore)
+        return value.nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximate_size(k, _seen) + approximate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approximate_size(item, _seen) for item in value)
+    return size
+
+
+# === Spill backends ===
+class DiskSpill:
+    """Spilled values as files in a per-process directory, removed at exit."""
+
+    def __init__(self, directory=SPILL_DIR):
+        self._remove_orphans(directory)
+        self.directory = os.path.join(directory, str(os.getpid()))
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(shutil.rmtree, self.directory, True)
+
+    @staticmethod
+    def _remove_orphans(directory):
+        # Left behind by processes that were killed before their atexit ran
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if not name.isdigit() or int(name) == os.getpid():
+                continue
+            try:
+                os.kill(int(name), 0)
+            except ProcessLookupError:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+            except PermissionError:
+                pass
+
+    def write(self, ref, data):
+        path = os.path.join(self.directory, ref)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def read(self, ref):
+        with open(os.path.join(self.directory, ref), "rb") as f:
+            return f.read()
+
+    def delete(self, ref):
+        try:
+            os.unlink(os.path.join(self.directory, ref))
+        except FileNotFoundError:
+            pass
+
+
+class GridFSSpill:
+    """Spilled values in a GridFS bucket, for hosts without spare local disk."""
+
+    def __init__(self, database, bucket=SPILL_BUCKET):
+        import gridfs
+
+        self.fs = gridfs.GridFS(database, collection=bucket)
+
+    def write(self, ref, data):
+        self.fs.put(data, _id=ref)
+
+    def read(self, ref):
+        return self.fs.get(ref).read()
+
+    def delete(self, ref):
+        self.fs.delete(ref)
+
+
+# === Store ===
+class _Entry:
+    __slots__ = ("value", "size", "droppable", "ref", "busy")
+
+    def __init__(self, value, size, droppable):
+        self.value = value
+        self.size = size
+        self.droppable = droppable
+        self.ref = None  # set while the value lives in the spill backend
+        self.busy = False  # being spilled or reloaded outside the store lock
+
+    @property
+    def resident(self):
+        return self.ref is None
+
+
+class _Session:
+    def __init__(self):
+        self.entries = {}
+        self.last_access = time.time()
+
+    @property
+    def resident_bytes(self):
+        return sum(entry.size for entry in self.entries.values() if entry.resident)
+
+    @property
+    def staying_bytes(self):
+        """Resident bytes not already on their way to the spill backend."""
+        return sum(entry.size for entry in self.entries.values() if entry.resident and not entry.busy)
+
+
+class SessionStore:
+    """Process-wide home for large per-session values, kept within memory budgets.
+
+    Each value's approximate size is recorded when it is set. When a session
+    goes over `session_budget`, or all sessions together go over
+    `global_budget`, values are evicted: `droppable` ones (caches the page
+    can rebuild) are discarded, the rest are pickled to the spill backend and
+    reloaded on their next read. Global eviction starts with the session
+    that has been idle longest; sessions idle for `idle_after` are spilled
+    whole, and after `expire_after` their values are discarded. If given,
+    `is_alive(session_id)` reports whether a session still exists, and the
+    values of sessions that have ended are discarded on the next eviction
+    pass rather than after `expire_after`.
+
+    The lock only guards the bookkeeping: pickling and spill I/O happen
+    outside it, on entries marked busy, so a slow spill backend never
+    blocks other sessions' reads and writes.
+
+    A value changed in place should be set again, so its size stays current.
+    """
+
+    def __init__(self, spill, session_budget=SESSION_BUDGET_BYTES, global_budget=GLOBAL_BUDGET_BYTES,
+                 idle_after=IDLE_AFTER, expire_after=EXPIRE_AFTER, is_alive=None):
+        self.spill = spill
+        self.session_budget = session_budget
+        self.global_budget = global_budget
+        self.idle_after = idle_after
+        self.expire_after = expire_after
+        self.is_alive = is_alive
+        self._lock = threading.RLock()
+        self._reloaded = threading.Condition(self._lock)
+        self._sessions = {}
+        self._stats = {"spills": 0, "spilled_bytes_total": 0, "reloads": 0, "drops": 0, "expired_sessions": 0,
+                       "ended_sessions": 0}
+
+    def session(self, session_id):
+        return SessionValues(self, session_id)
+
+    def stats(self):
+        with self._lock:
+            resident = sum(session.resident_bytes for session in self._sessions.values())
+            spilled = sum(entry.size for session in self._sessions.values()
+                          for entry in session.entries.values() if not entry.resident)
+            return dict(self._stats, sessions=len(self._sessions), resident_bytes=resident, spilled_bytes=spilled)
+
+    # === Values ===
+    def _touch(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session()
+        session.last_access = time.time()
+        return session
+
+    def _current(self, session_id, key, entry):
+        session = self._sessions.get(session_id)
+        return session is not None and session.entries.get(key) is entry
+
+    def get(self, session_id, key):
+        """The value for key, reloading it if it was spilled; KeyError if absent."""
+        with self._lock:
+            while True:
+                entry = self._touch(session_id).entries[key]
+                if entry.resident:
+                    return entry.value
+                if not entry.busy:
+                    break
+                self._reloaded.wait()  # another script run is reloading it
+            entry.busy, ref = True, entry.ref
+        try:
+            value = pickle.loads(self.spill.read(ref))
+        except Exception as e:
+            with self._lock:
+                entry.busy = False
+                # Treated as never set, so callers fall back to rebuilding it
+                if self._current(session_id, key, entry):
+                    del self._sessions[session_id].entries[key]
+                self._reloaded.notify_all()
+            print(f"Session value {key!r} could not be reloaded: {e}")
+            raise KeyError(key) from e
+        with self._lock:
+            entry.value, entry.ref, entry.busy = value, None, False
+            self._stats["reloads"] += 1
+            self._reloaded.notify_all()
+            stale, spills = self._enforce(session_id, keep=key) if self._current(session_id, key, entry) else ([], [])
+        self._apply(stale + [ref], spills)
+        return value
+
+    def set(self, session_id, key, value, droppable=False):
+        with self._lock:
+            session = self._touch(session_id)
+            stale = self._discard(session.entries.pop(key, None))
+            session.entries[key] = _Entry(value, approximate_size(value), droppable)
+            more_stale, spills = self._enforce(session_id, keep=key)
+        self._apply(stale + more_stale, spills)
+
+    def delete(self, session_id, key):
+        with self._lock:
+            stale = self._discard(self._touch(session_id).entries.pop(key))
+        self._apply(stale)
+
+    def keys(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return list(session.entries) if session else []
+
+    def clear(self, session_id):
+        with self._lock:
+            stale = self._clear(session_id)
+        self._apply(stale)
+
+    def _clear(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        return [ref for entry in (session.entries.values() if session else ()) for ref in self._discard(entry)]
+
+    @staticmethod
+    def _discard(entry):
+        """Spill refs to delete for a removed entry; busy entries are cleaned up by their spill or reload."""
+        if entry is None or entry.resident or entry.busy:
+            return []
+        return [entry.ref]
+
+    # === Spill I/O (called without the lock) ===
+    def _apply(self, stale, spills=()):
+        for ref in stale:
+            try:
+                self.spill.delete(ref)
+            except Exception as e:
+                print(f"Spilled session value {ref} could not be deleted: {e}")
+        for session_id, key, entry in spills:
+            self._spill(session_id, key, entry)
+
+    def _spill(self, session_id, key, entry):
+        ref = uuid.uuid4().hex
+        try:
+            self.spill.write(ref, pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            # Over budget beats failing the script run; the value stays resident
+            print(f"Session value {key!r} could not be spilled: {e}")
+            with self._lock:
+                entry.busy = False
+            return
+        with self._lock:
+            entry.busy = False
+            current = self._current(session_id, key, entry)
+            if current:
+                entry.ref, entry.value = ref, None
+                self._stats["spills"] += 1
+                self._stats["spilled_bytes_total"] += entry.size
+        if not current:
+            # Replaced or deleted while it was being written
+            self.spill.delete(ref)
+
+    # === Eviction ===
+    def _evict(self, session_id, session, key, spills):
+        """Free one resident value, or mark it busy and queue its spill; returns the bytes it frees."""
+        entry = session.entries[key]
+        if entry.droppable:
+            del session.entries[key]
+            self._stats["drops"] += 1
+        else:
+            entry.busy = True
+            spills.append((session_id, key, entry))
+        return entry.size
+
+    def _evictable(self, session, keep=None):
+        """Resident keys worth evicting, rebuildable caches first and then largest first."""
+        keys = [key for key, entry in session.entries.items()
+                if entry.resident and not entry.busy and key != keep
+                and (entry.droppable or entry.size >= MIN_SPILL_BYTES)]
+        return sorted(keys, key=lambda key: (not session.entries[key].droppable, -session.entries[key].size))
+
+    def _enforce(self, session_id, keep=None):
+        """Apply the budgets under the lock; returns (spill refs to delete, spills to run) for after it."""
+        stale, spills = [], []
+        now = time.time()
+        for other_id, session in list(self._sessions.items()):
+            if other_id == session_id:
+                continue
+            if self.is_alive is not None and not self.is_alive(other_id):
+                stale += self._clear(other_id)
+                self._stats["ended_sessions"] += 1
+            elif now - session.last_access > self.expire_after:
+                stale += self._clear(other_id)
+                self._stats["expired_sessions"] += 1
+            elif now - session.last_access > self.idle_after:
+                for key in self._evictable(session):
+                    self._evict(other_id, session, key, spills)
+
+        current = self._sessions[session_id]
+        excess = current.staying_bytes - self.session_budget
+        for key in self._evictable(current, keep):
+            if excess <= 0:
+                break
+            excess -= self._evict(session_id, current, key, spills)
+
+        excess = sum(session.staying_bytes for session in self._sessions.values()) - self.global_budget
+        if excess <= 0:
+            return stale, spills
+        # Idlest sessions give up their values first; the active one goes last
+        for other_id, session in sorted(self._sessions.items(),
+                                        key=lambda item: (item[0] == session_id, item[1].last_access)):
+            for key in self._evictable(session, keep if other_id == session_id else None):
+                if excess <= 0:
+                    return stale, spills
+                excess -= self._evict(other_id, session, key, spills)
+        return stale, spills
+
+
+class SessionValues(MutableMapping):
+    """Dict-like view of one session's values in a SessionStore."""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    def __getitem__(self, key):
+        return self.store.get(self.session_id, key)
+
+    def __setitem__(self, key, value):
+        self.store.set(self.session_id, key, value)
+
+    def __delitem__(self, key):
+        self.store.delete(self.session_id, key)
+
+    def __contains__(self, key):
+        return key in self.store.keys(self.session_id)
+
+    def __iter__(self):
+        return iter(self.store.keys(self.session_id))
+
+    def __len__(self):
+        return len(self.store.keys(self.session_id))
+
+    def set(self, key, value, droppable=False):
+        """Set a value; droppable values are discarded rather than spilled under memory pressure."""
+        self.store.set(self.session_id, key, value, droppable)
+
+    def discard(self, *keys):
+        """Remove keys if present, without reloading spilled values just to throw them away."""
+        present = set(self)
+        for key in keys:
+            if key in present:
+                del self[key]
@@ -0,0 +1,199 @@
+import contextlib
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+
+import torch
+
+# Default location of the exported weights; keep it on a local disk or tmpfs
+WEIGHTS_DIR = os.getenv("EMBEDDING_WEIGHTS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mini-lawyer"))
+# Serve the app's embedding model from the shared mapping, so Streamlit processes on a host share one copy
+SHARED_WEIGHTS = os.getenv("EMBEDDING_SHARED_WEIGHTS", "0") == "1"
+MODEL_REVISION = os.getenv("EMBEDDING_MODEL_REVISION") or None
+# Part of the export file name; bumped when the export layout changes, so old exports are not reused
+EXPORT_FORMAT = 2
+
+DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16, "BF16": torch.bfloat16,
+    "I64": torch.int64, "I32": torch.int32, "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def model_revision(model_name, revision=None):
+    """Commit hash of a hub model (resolved through the local HF cache), or a fingerprint of a local model directory."""
+    if os.path.isdir(model_name):
+        digest = hashlib.sha1()
+        for root, _, files in sorted(os.walk(model_name)):
+            for name in sorted(files):
+                stat = os.stat(os.path.join(root, name))
+                digest.update(f"{os.path.relpath(os.path.join(root, name), model_name)}:{stat.st_size}:"
+                              f"{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()[:12]
+    from huggingface_hub import snapshot_download
+
+    # Only the small config files; the snapshot directory is named after the commit
+    return os.path.basename(snapshot_download(model_name, revision=revision, allow_patterns=["*.json"]))[:12]
+
+
+def default_weights_path(model_name, revision=None):
+    """Export location keyed on the model revision, so an updated model never reuses a stale export."""
+    name = model_name.strip("/").replace("/", "--")
+    return os.path.join(WEIGHTS_DIR, f"{name}@{model_revision(model_name, revision)}.v{EXPORT_FORMAT}.safetensors")
+
+
+def export_weights(build_model, path):
+    """Write build_model()'s state_dict and non-persistent buffers to `path` as safetensors, once per host.
+
+    Concurrent exporters serialize on a lock file, and only the first one
+    builds the model; the file appears atomically, so readers never see a
+    partial export.
+    """
+    import fcntl
+    from safetensors.torch import save_file
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return path
+        model = build_model()
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        tensors = dict(model.state_dict())
+        # e.g. position ids: not in the state_dict, but a model built on the meta device needs them too
+        tensors.update((name, buffer) for name, buffer in model.named_buffers() if name not in tensors)
+        save_file({name: tensor.detach().contiguous() for name, tensor in tensors.items()}, tmp_path)
+        os.replace(tmp_path, path)
+    del model
+    _release_freed_memory()
+    return path
+
+
+def mmap_state_dict(path):
+    """Tensors backed by a private (copy-on-write) mapping of a safetensors file.
+
+    Nothing is copied: every process mapping the same file shares its
+    pages through the page cache until one of them writes to a tensor.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    header_size = struct.unpack("<Q", mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_size])
+    base = 8 + header_size
+    state = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        dtype = DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        count = (end - start) // dtype.itemsize
+        tensor = (torch.frombuffer(mapped, dtype=dtype, count=count, offset=base + start) if count
+                  else torch.empty(0, dtype=dtype))
+        state[name] = tensor.reshape(info["shape"])
+    return state
+
+
+def _release_freed_memory():
+    # glibc keeps freed heap pages by default; hand the replaced private weights back to the OS
+    libc_name = ctypes.util.find_library("c")
+    try:
+        ctypes.CDLL(libc_name).malloc_trim(0)
+    except (OSError, AttributeError, TypeError):
+        pass
+
+
+_skeleton_lock = threading.Lock()
+_building = threading.local()
+
+
+def _assign(module, state, source):
+    """Point every parameter and buffer of `module` at the tensors in `state`; raise if any is left out.
+
+    Tensors go straight into each module's _parameters/_buffers rather than through load_state_dict,
+    which registers parameters via nn.Module.register_parameter; transformers' from_pretrained patches
+    that process-wide while it loads, and would send these onto the meta device.
+    """
+    missing = [name for name in module.state_dict() if name not in state]
+    if missing:
+        raise RuntimeError(f"{source} has no weights for {missing[:5]}; delete it to re-export")
+    for name, tensor in state.items():
+        owner_name, _, attribute = name.rpartition(".")
+        owner = module.get_submodule(owner_name)
+        if attribute in owner._parameters:
+            owner._parameters[attribute] = torch.nn.Parameter(tensor, requires_grad=False)
+        elif attribute in owner._buffers:
+            owner._buffers[attribute] = tensor
+        else:
+            raise RuntimeError(f"{source} has a tensor {name!r} the model does not; delete it to re-export")
+    leftover = [name for name, tensor in (*module.named_parameters(), *module.named_buffers()) if tensor.is_meta]
+    if leftover:
+        raise RuntimeError(f"{source} left {leftover[:5]} unset; delete it to re-export")
+
+
+@contextlib.contextmanager
+def _transformer_from(state, source):
+    """SentenceTransformer's Transformer modules built on this thread take their weights from `state`.
+
+    The architecture is built under a thread-local meta device context, so
+    it allocates nothing and other threads building modules are unaffected.
+    """
+    from sentence_transformers.models import Transformer
+    from transformers import AutoModel
+
+    load_model = Transformer._load_model
+
+    def load_from_state(self, model_name_or_path, config, *args, **kwargs):
+        if getattr(_building, "state", None) is None:
+            return load_model(self, model_name_or_path, config, *args, **kwargs)
+        with torch.device("meta"):
+            self.auto_model = AutoModel.from_config(config)
+        # Exported names look like "0.auto_model.encoder..."; any Transformer module index works
+        prefix = next(name[:name.index("auto_model.")] for name in state if "auto_model." in name)
+        _assign(self.auto_model, {name[len(prefix) + len("auto_model."):]: tensor
+                                  for name, tensor in state.items() if name.startswith(prefix + "auto_model.")}, source)
+
+    with _skeleton_lock:
+        Transformer._load_model = load_from_state
+        _building.state = state
+        try:
+            yield
+        finally:
+            _building.state = None
+            Transformer._load_model = load_model
+
+
+def load_shared_model(model_name, weights_path=None, revision=MODEL_REVISION):
+    """SentenceTransformer whose parameters live in a shared, memory-mapped weights file.
+
+    Only the first process on a host loads the model normally, to export the
+    weights file; every other load builds the architecture with empty
+    parameters and points them into the mapping, so no process ever holds a
+    private copy of the weights.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    weights_path = weights_path or default_weights_path(model_name, revision)
+    if not os.path.exists(weights_path):
+        export_weights(lambda: SentenceTransformer(model_name, device="cpu", revision=revision), weights_path)
+    state = mmap_state_dict(weights_path)
+    with _transformer_from(state, weights_path):
+        model = SentenceTransformer(model_name, device="cpu", revision=revision)
+    _assign(model, state, weights_path)
+    model.eval()
+    for parameter in model.parameters():
+        parameter.requires_grad_(False)
+    return model
+
+
+def load_model(model_name, shared=SHARED_WEIGHTS, weights_path=None):
+    """The embedding model, with its weights in the shared mapping if `shared`, else privately loaded."""
+    if shared:
+        return load_shared_model(model_name, weights_path or os.getenv("EMBEDDING_WEIGHTS_PATH"))
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(model_name)
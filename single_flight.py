@@ -0,0 +1,128 @@
+import functools
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+from tracing import span
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is in flight wait for it and get the same value, or the
+    same exception. Nothing is kept once the call completes, so this only
+    removes duplicate work that overlaps in time; caching is separate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"executed": 0, "shared": 0}
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["executed"] += 1
+            else:
+                self._stats["shared"] += 1
+        if not leader:
+            # Timed so a waiter's trace still shows where its time went
+            with span(f"{key[0]}.coalesced"):
+                call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn(*args, **kwargs)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+# Process-wide, so every Streamlit session shares in-flight work
+flights = SingleFlight()
+
+
+def normalize_text(text):
+    return " ".join(str(text).split())
+
+
+def vector_key(vector):
+    return hashlib.blake2b(np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16).hexdigest()
+
+
+def options_key(options):
+    return json.dumps(options, sort_keys=True, default=str)
+
+
+def coalesced(key, flight=flights):
+    """Decorator: concurrent calls with the same key(*args, **kwargs) share one execution.
+
+    Keys are tuples whose first item names the stage (it labels the wait span).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(key(*args, **kwargs), fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class CoalescingModel:
+    """Embedding model whose identical concurrent encode() calls run once."""
+
+    def __init__(self, model, flight=flights):
+        self._model = model
+        self._flight = flight
+
+    def encode(self, sentences, **kwargs):
+        texts = tuple(normalize_text(s) for s in ([sentences] if isinstance(sentences, str) else sentences))
+        key = ("embed", texts, options_key(kwargs))
+        return self._flight.do(key, self._model.encode, sentences, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class CoalescingIndex:
+    """Vector index whose identical concurrent query() and fetch() calls run once."""
+
+    def __init__(self, index, name, flight=flights):
+        self._index = index
+        self._name = name
+        self._flight = flight
+
+    def query(self, *args, vector=None, **kwargs):
+        if args or vector is None:
+            return self._index.query(*args, vector=vector, **kwargs)
+        key = ("pinecone.query", self._name, vector_key(vector), options_key(kwargs))
+        return self._flight.do(key, self._index.query, vector=vector, **kwargs)
+
+    def fetch(self, ids, **kwargs):
+        key = ("pinecone.fetch", self._name, tuple(sorted(map(str, ids))), options_key(kwargs))
+        return self._flight.do(key, self._index.fetch, ids=ids, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
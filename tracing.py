@@ -0,0 +1,440 @@
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prometheus-style latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR_SIZE = 2048
+RECENT_TRACES = 50
+
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_FILE = os.getenv("METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.getenv("METRICS_FILE_INTERVAL", "15"))
+TRACE_DEBUG = os.getenv("TRACE_DEBUG", "").lower() in ("1", "true", "yes")
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts plus a sliding reservoir for quantiles."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.samples = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, seconds):
+        with self._lock:
+            self.counts[bisect_left(BUCKETS, seconds)] += 1
+            self.total += seconds
+            self.count += 1
+            self.samples.append(seconds)
+
+    def quantiles(self):
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.total, self.count
+
+
+class Trace:
+    """Spans recorded for one user request, relative to its start."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, stage, start, duration, error=None):
+        with self._lock:
+            self.spans.append({
+                "stage": stage,
+                "start_ms": (start - self.started) * 1000,
+                "duration_ms": duration * 1000,
+                "error": error,
+            })
+
+    def stage_totals(self):
+        totals = {}
+        for span in self.spans:
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["duration_ms"]
+        return totals
+
+
+_registry_lock = threading.Lock()
+_stage_histograms = {}
+_request_histograms = {}
+recent_traces = deque(maxlen=RECENT_TRACES)
+
+
+def _histogram(registry, key):
+    with _registry_lock:
+        histogram = registry.get(key)
+        if histogram is None:
+            histogram = registry[key] = LatencyHistogram()
+        return histogram
+
+
+def stage_totals():
+    """{stage: (count, total_seconds)} summed over all requests."""
+    with _registry_lock:
+        items = list(_stage_histograms.items())
+    totals = {}
+    for (stage, _), histogram in items:
+        _, total, count = histogram.snapshot()
+        previous_count, previous_total = totals.get(stage, (0, 0.0))
+        totals[stage] = (previous_count + count, previous_total + total)
+    return totals
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request(name):
+    """Group every span recorded inside the block under one request."""
+    trace = Trace(name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.duration = time.perf_counter() - trace.started
+        _histogram(_request_histograms, name).observe(trace.duration)
+        recent_traces.append(trace)
+
+
+def _record(trace, stage, start, duration, error=None):
+    request = trace.name if trace else "background"
+    _histogram(_stage_histograms, (stage, request)).observe(duration)
+    if trace:
+        trace.add(stage, start, duration, error)
+
+
+@contextmanager
+def span(stage):
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _record(trace, stage, start, time.perf_counter() - start, error)
+
+
+def propagate(fn):
+    """Bind fn to the caller's trace so spans from executor threads are kept."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+# === Client wrappers ===
+class TracedProxy:
+    """Forward everything to target, timing the listed methods as `stage`."""
+
+    def __init__(self, target, stage, methods):
+        self._target = target
+        self._stage = stage
+        self._methods = methods
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if name not in self._methods:
+            return attribute
+        stage = self._stage(name) if callable(self._stage) else self._stage
+
+        def traced(*args, **kwargs):
+            with span(stage):
+                return attribute(*args, **kwargs)
+        return traced
+
+
+MONGO_METHODS = {
+    "find_one", "aggregate", "count_documents", "estimated_document_count", "distinct",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "bulk_write",
+}
+
+
+class _TracedCursor:
+    """Cursor proxy recording one `stage` span for the time spent fetching its results.
+
+    find() only builds a lazy cursor; the round-trips happen while it is
+    iterated, so the span covers the time inside next() (not the caller's
+    work between documents) and is recorded when the cursor is exhausted,
+    fails or is closed. Chained calls (sort, limit, ...) keep the proxy.
+    """
+
+    def __init__(self, cursor, stage):
+        self._cursor = cursor
+        self._stage = stage
+        self._trace = _current_trace.get()
+        self._start = None
+        self._elapsed = 0.0
+        self._recorded = False
+
+    def _finish(self, error=None):
+        if self._start is not None and not self._recorded:
+            self._recorded = True
+            _record(self._trace, self._stage, self._start, self._elapsed, error)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        begin = time.perf_counter()
+        if self._start is None:
+            self._start = begin
+        try:
+            document = next(self._cursor)
+        except StopIteration:
+            self._elapsed += time.perf_counter() - begin
+            self._finish()
+            raise
+        except Exception as e:
+            self._elapsed += time.perf_counter() - begin
+            self._finish(type(e).__name__)
+            raise
+        self._elapsed += time.perf_counter() - begin
+        return document
+
+    def close(self):
+        self._finish()
+        return self._cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            return self if result is self._cursor else result
+        return call
+
+
+class _TracedCollection(TracedProxy):
+    def __init__(self, collection):
+        super().__init__(collection, lambda method: f"mongo.{method}", MONGO_METHODS)
+
+    def find(self, *args, **kwargs):
+        return _TracedCursor(self._target.find(*args, **kwargs), "mongo.find")
+
+
+class _TracedMongoDatabase:
+    def __init__(self, database):
+        self._database = database
+
+    def __getitem__(self, name):
+        return _TracedCollection(self._database[name])
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+
+class _TracedMongoClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getitem__(self, name):
+        return _TracedMongoDatabase(self._client[name])
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _TracedPinecone:
+    def __init__(self, client):
+        self._client = client
+
+    def Index(self, *args, **kwargs):
+        return TracedProxy(self._client.Index(*args, **kwargs), lambda method: f"pinecone.{method}",
+                           {"query", "upsert", "fetch", "update", "delete"})
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _TracedCompletions:
+    def __init__(self, completions):
+        self._completions = completions
+
+    def create(self, *args, **kwargs):
+        with span(f"openai.{kwargs.get('model', 'chat')}"):
+            return self._completions.create(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._completions, name)
+
+
+class _TracedChat:
+    def __init__(self, chat):
+        self.completions = _TracedCompletions(chat.completions)
+        self._chat = chat
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class _TracedOpenAI:
+    def __init__(self, client):
+        self.chat = _TracedChat(client.chat)
+        self._client = client
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def traced_model(model):
+    return TracedProxy(model, "model.encode", {"encode"})
+
+
+def traced_mongo(client):
+    return _TracedMongoClient(client)
+
+
+def traced_pinecone(client):
+    return _TracedPinecone(client)
+
+
+def traced_openai(client):
+    return _TracedOpenAI(client)
+
+
+# === Export ===
+def _format_labels(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+def _histogram_lines(metric, labels, histogram):
+    counts, total, count = histogram.snapshot()
+    label_text = _format_labels(labels)
+    cumulative = 0
+    lines = []
+    for bound, bucket_count in zip(BUCKETS + (float("inf"),), counts):
+        cumulative += bucket_count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f'{metric}_bucket{{{label_text},le="{le}"}} {cumulative}')
+    lines.append(f"{metric}_sum{{{label_text}}} {total}")
+    lines.append(f"{metric}_count{{{label_text}}} {count}")
+    return lines
+
+
+def _quantile_lines(metric, labels, histogram):
+    label_text = _format_labels(labels)
+    _, total, count = histogram.snapshot()
+    lines = [
+        f'{metric}{{{label_text},quantile="{q}"}} {value}' for q, value in histogram.quantiles().items()
+    ]
+    lines.append(f"{metric}_sum{{{label_text}}} {total}")
+    lines.append(f"{metric}_count{{{label_text}}} {count}")
+    return lines
+
+
+def render_prometheus():
+    """All recorded latencies in Prometheus text exposition format."""
+    with _registry_lock:
+        stages = sorted(_stage_histograms.items())
+        requests = sorted(_request_histograms.items())
+    metrics = [
+        ("mini_lawyer_stage_latency_seconds", "histogram", _histogram_lines,
+         [({"stage": stage, "request": request}, h) for (stage, request), h in stages]),
+        ("mini_lawyer_stage_latency_quantiles_seconds", "summary", _quantile_lines,
+         [({"stage": stage, "request": request}, h) for (stage, request), h in stages]),
+        ("mini_lawyer_request_latency_seconds", "histogram", _histogram_lines,
+         [({"request": request}, h) for request, h in requests]),
+        ("mini_lawyer_request_latency_quantiles_seconds", "summary", _quantile_lines,
+         [({"request": request}, h) for request, h in requests]),
+    ]
+    lines = []
+    for metric, kind, render, series in metrics:
+        lines.append(f"# TYPE {metric} {kind}")
+        for labels, histogram in series:
+            lines.extend(render(metric, labels, histogram))
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_metrics_file(path, interval):
+    while True:
+        time.sleep(interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(render_prometheus())
+        os.replace(tmp_path, path)
+
+
+def start_metrics_exporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL):
+    """Serve /metrics on localhost:port and/or rewrite `path` periodically."""
+    if port:
+        server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    if path:
+        threading.Thread(target=_write_metrics_file, args=(path, interval), name="metrics-file",
+                         daemon=True).start()
+
+
+# === Debug view ===
+def show_waterfall(trace, force=False):
+    """Render a trace's spans as a waterfall in the sidebar (TRACE_DEBUG=1)."""
+    import altair as alt
+    import pandas as pd
+    import streamlit as st
+
+    if not (force or TRACE_DEBUG) or not trace or not trace.spans:
+        return
+    df = pd.DataFrame(trace.spans)
+    df["end_ms"] = df["start_ms"] + df["duration_ms"]
+    df["order"] = range(len(df))
+    chart = alt.Chart(df).mark_bar().encode(
+        x=alt.X("start_ms:Q", title="ms"),
+        x2="end_ms:Q",
+        y=alt.Y("order:O", title=None, axis=alt.Axis(labels=False)),
+        color=alt.Color("stage:N", legend=alt.Legend(title="Stage", orient="bottom")),
+        tooltip=["stage", alt.Tooltip("duration_ms:Q", format=".1f"), "error"],
+    )
+    with st.sidebar:
+        st.markdown(f"**Trace: {trace.name}** ({(trace.duration or 0) * 1000:.0f} ms)")
+        st.altair_chart(chart, use_container_width=True)
+        totals = trace.stage_totals()
+        st.table(pd.DataFrame({"stage": list(totals), "ms": [round(v, 1) for v in totals.values()]}))